@@ -0,0 +1,50 @@
+# compare peak memory and wall time of loading a whole upstream repodata.json
+# with json.load against the streaming filter_repodata, for a synthetic
+# channel of --entries packages of which --wanted are vendored
+#
+#   python benchmarks/bench_repodata_filter.py --entries 200000 --wanted 500
+import argparse
+import io
+import json
+import random
+import time
+import tracemalloc
+
+from conda_vendor.repodata import filter_repodata
+from fake_channel import synthetic_repodata
+
+
+def measure(label, fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed:8.2f} s {peak / 1024 ** 2:10.1f} MB peak  ({len(result['packages'])} entries kept)")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--wanted", type=int, default=500)
+    args = parser.parse_args()
+
+    repodata = synthetic_repodata(args.entries)
+    raw = json.dumps(repodata, indent=2).encode()
+    wanted = set(random.sample(sorted(repodata["packages"]), args.wanted))
+    del repodata
+    print(f"repodata.json: {len(raw) / 1024 ** 2:.1f} MB, {args.entries} entries, {len(wanted)} wanted")
+
+    def _json_load():
+        live_repodata_json = json.load(io.BytesIO(raw))
+        return {"packages": {fn: entry for fn, entry in live_repodata_json["packages"].items() if fn in wanted}}
+
+    full = measure("json.load + filter", _json_load)
+    streamed = measure("filter_repodata (streaming)", lambda: filter_repodata(io.BytesIO(raw), wanted))
+    assert full["packages"] == streamed["packages"]
+
+
+if __name__ == "__main__":
+    main()
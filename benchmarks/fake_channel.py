@@ -0,0 +1,127 @@
+# synthetic conda channel served from a local HTTP server, so benchmarks
+# never touch anaconda.org or run a real solver
+import hashlib
+import json
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+def synthetic_repodata(entries, subdir="linux-64"):
+    packages = {}
+    for i in range(entries):
+        fn = f"pkg{i}-1.0.{i % 97}-py_{i % 13}.tar.bz2"
+        packages[fn] = {
+            "build": f"py_{i % 13}",
+            "build_number": i % 13,
+            "depends": [f"dep{j} >=1.{j}" for j in range(i % 8)],
+            "license": "BSD-3-Clause",
+            "md5": f"{i:032x}",
+            "name": f"pkg{i}",
+            "sha256": f"{i:064x}",
+            "size": 1024 * (i % 5000),
+            "subdir": subdir,
+            "timestamp": 1600000000000 + i,
+            "version": f"1.0.{i % 97}",
+        }
+    return {"info": {"subdir": subdir}, "packages": packages, "packages.conda": {}, "repodata_version": 1}
+
+
+# write a package blob of size bytes without holding it in memory,
+# returns its sha256
+def _write_blob(path, size, seed, chunk_size=1024 * 1024):
+    hasher = hashlib.sha256()
+    pattern = hashlib.sha256(str(seed).encode()).digest() * (chunk_size // 32)
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            chunk = pattern[:min(chunk_size, remaining)]
+            f.write(chunk)
+            hasher.update(chunk)
+            remaining -= len(chunk)
+    return hasher.hexdigest()
+
+
+# synthetic channel on disk: <root>/<name>/<subdir>/repodata.json with
+# repodata_entries entries per subdir. In total `packages` of them, spread
+# over the subdirs, are backed by blobs of package_size bytes and carry their real
+# sha256, so downloads verify
+class FakeChannel:
+    def __init__(self, root, name="fake-forge", subdirs=("linux-64", "noarch"),
+                 repodata_entries=10000, packages=100, package_size=1024 * 1024):
+        self.root = Path(root)
+        self.name = name
+        self.subdirs = subdirs
+        self.repodata_entries = repodata_entries
+        self.packages = packages
+        self.package_size = package_size
+        self.fetch_actions = []
+
+    def build(self):
+        for subdir in self.subdirs:
+            subdir_path = self.root / self.name / subdir
+            subdir_path.mkdir(parents=True, exist_ok=True)
+            repodata = synthetic_repodata(max(self.repodata_entries, self.packages), subdir)
+            for i, (fn, entry) in enumerate(repodata["packages"].items()):
+                if i >= self.packages // len(self.subdirs):
+                    break
+                entry["sha256"] = _write_blob(subdir_path / fn, self.package_size, f"{subdir}/{fn}")
+                entry["size"] = self.package_size
+                self.fetch_actions.append({**entry, "fn": fn})
+            with open(subdir_path / "repodata.json", "w") as f:
+                json.dump(repodata, f, indent=2)
+        return self
+
+    # FETCH actions pointing at a server for root at base_url
+    def solved_fetch_actions(self, base_url):
+        return [
+            {**pkg,
+             "channel": f"{base_url}/{self.name}/{pkg['subdir']}",
+             "url": f"{base_url}/{self.name}/{pkg['subdir']}/{pkg['fn']}"}
+            for pkg in self.fetch_actions
+        ]
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+# serve a directory over HTTP on 127.0.0.1, on a free port
+class FakeChannelServer:
+    def __init__(self, directory):
+        handler = partial(_QuietHandler, directory=str(directory))
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# patch CondaLockWrapper so solve_environment/get_fetch_actions return
+# fetch_actions without running a solver
+def stub_conda_lock_wrapper(fetch_actions):
+    from unittest.mock import Mock
+    from conda_vendor.conda_lock_wrapper import CondaLockWrapper
+
+    virtual_package_repodata = Mock()
+    virtual_package_repodata.channel.url = "file:///virtual-packages"
+    CondaLockWrapper.default_virtual_package_repodata = staticmethod(lambda: virtual_package_repodata)
+    CondaLockWrapper.solve_specs_for_arch = staticmethod(
+        lambda solver, channels, specs, platform: {
+            "success": True,
+            "actions": {"FETCH": list(fetch_actions), "LINK": []},
+        })
+    CondaLockWrapper.reconstruct_fetch_actions = staticmethod(lambda solver, platform, dry_run_install: dry_run_install)
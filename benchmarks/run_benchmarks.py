@@ -0,0 +1,174 @@
+# hermetic benchmark of the vendor pipeline stages against a synthetic
+# channel served from 127.0.0.1, with a stubbed CondaLockWrapper instead of
+# a real solver. Every stage runs in a fresh process so its peak RSS is
+# its own. Reports wall time, peak RSS, RSS growth over the stage and MB/s
+#
+#   python benchmarks/run_benchmarks.py --entries 500000 --packages 200 --package-size 8M --json bench.json
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+from fake_channel import FakeChannel, FakeChannelServer, stub_conda_lock_wrapper
+
+STAGES = [
+    "solve_environment",
+    "compare_sha256",
+    "reconstruct_repodata_json",
+    "hotfix_vendored_repodata_json",
+    "download_solved_pkgs",
+]
+
+
+def _proc_status(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) * 1024
+    raise OSError(f"{field} not in /proc/self/status")
+
+
+# ru_maxrss survives exec() on Linux, so a spawned child would report the
+# parent's peak. Prefer the per process high water mark from /proc
+def _peak_rss():
+    try:
+        return _proc_status("VmHWM")
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _current_rss():
+    try:
+        return _proc_status("VmRSS")
+    except OSError:
+        return _peak_rss()
+
+
+# reset VmHWM to the current RSS, where supported
+def _reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+# run one stage in this (fresh) process, returns the bytes it processed
+def _stage(name, ctx, workdir):
+    from conda_vendor import conda_vendor
+
+    fetch_actions = ctx["fetch_actions"]
+    if name == "solve_environment":
+        stub_conda_lock_wrapper(fetch_actions)
+        lock_spec = SimpleNamespace(
+            channels=[f"{ctx['url']}/fake-forge"],
+            dependencies=[SimpleNamespace(name=pkg["name"], version=pkg["version"]) for pkg in fetch_actions],
+        )
+        conda_vendor.solve_fetch_actions(lock_spec, "conda", "linux-64", solve_cache_dir=None)
+        return 0
+
+    if name == "compare_sha256":
+        processed = 0
+        for pkg in fetch_actions[:10]:
+            content = (Path(ctx["channel_dir"]) / pkg["subdir"] / pkg["fn"]).read_bytes()
+            conda_vendor.compare_sha256(content, pkg["sha256"])
+            processed += len(content)
+        return processed
+
+    if name == "reconstruct_repodata_json":
+        subdir = fetch_actions[0]["subdir"]
+        dest_dir = workdir / subdir
+        dest_dir.mkdir()
+        conda_vendor.reconstruct_repodata_json(f"{fetch_actions[0]['channel']}/repodata.json", dest_dir, fetch_actions)
+        return (Path(ctx["channel_dir"]) / subdir / "repodata.json").stat().st_size
+
+    if name == "hotfix_vendored_repodata_json":
+        subdirs = {pkg["subdir"] for pkg in fetch_actions}
+        for subdir in subdirs:
+            (workdir / subdir).mkdir()
+        conda_vendor.hotfix_vendored_repodata_json(fetch_actions, workdir, jobs=ctx["jobs"])
+        return sum((Path(ctx["channel_dir"]) / subdir / "repodata.json").stat().st_size for subdir in subdirs)
+
+    if name == "download_solved_pkgs":
+        for subdir in {pkg["subdir"] for pkg in fetch_actions}:
+            (workdir / subdir).mkdir()
+        conda_vendor.download_solved_pkgs(fetch_actions, workdir, "linux-64", jobs=ctx["jobs"])
+        return sum(pkg["size"] for pkg in fetch_actions)
+
+    raise ValueError(f"Unknown stage {name}")
+
+
+def _run_stage(name, ctx):
+    # import outside of the measurement
+    import conda_vendor.conda_vendor  # noqa: F401
+
+    with tempfile.TemporaryDirectory() as workdir, open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            _reset_peak_rss()
+            baseline_rss = _current_rss()
+            start = time.perf_counter()
+            processed = _stage(name, ctx, Path(workdir))
+            seconds = time.perf_counter() - start
+    return {
+        "stage": name,
+        "seconds": seconds,
+        "bytes": processed,
+        "mb_per_s": processed / 1024 ** 2 / seconds if processed else None,
+        "peak_rss": _peak_rss(),
+        "rss_growth": _peak_rss() - baseline_rss,
+    }
+
+
+def main():
+    from conda_vendor.conda_vendor import ByteSize
+
+    parser = argparse.ArgumentParser(description="Benchmark conda-vendor stages against a local fake channel")
+    parser.add_argument("--entries", type=int, default=10000, help="repodata.json entries per subdir, e.g. 10000 to 500000")
+    parser.add_argument("--packages", type=int, default=50, help="packages to solve and download")
+    parser.add_argument("--package-size", default="1M", help="size of each package blob, e.g. 512K or 64M")
+    parser.add_argument("--jobs", type=int, default=4, help="download and repodata jobs")
+    parser.add_argument("--stage", action="append", choices=STAGES, help="only run these stages, can be repeated")
+    parser.add_argument("--json", dest="json_file", help="also write the results to this JSON file")
+    args = parser.parse_args()
+    package_size = ByteSize().convert(args.package_size, None, None)
+
+    with tempfile.TemporaryDirectory(prefix="conda-vendor-bench-") as root:
+        print(f"Building fake channel: {args.entries} entries per subdir, {args.packages} x {args.package_size} packages")
+        channel = FakeChannel(root, repodata_entries=args.entries, packages=args.packages, package_size=package_size).build()
+
+        with FakeChannelServer(root) as server:
+            ctx = {
+                "url": server.url,
+                "channel_dir": str(Path(root) / channel.name),
+                "fetch_actions": channel.solved_fetch_actions(server.url),
+                "jobs": args.jobs,
+            }
+            results = []
+            for name in args.stage or STAGES:
+                # a fresh process per stage, so peak RSS isn't carried over
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                    results.append(executor.submit(_run_stage, name, ctx).result())
+
+    print(f"{'stage':<32} {'wall time':>10} {'peak RSS':>10} {'RSS growth':>10} {'MB/s':>10}")
+    for result in results:
+        mb_per_s = f"{result['mb_per_s']:10.1f}" if result["mb_per_s"] else f"{'-':>10}"
+        print(f"{result['stage']:<32} {result['seconds']:9.3f}s {result['peak_rss'] / 1024 ** 2:8.1f}MB "
+              f"{result['rss_growth'] / 1024 ** 2:8.1f}MB {mb_per_s}")
+
+    if args.json_file:
+        with open(args.json_file, "w") as f:
+            json.dump({"parameters": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,6 @@
-import pkg_resources
-
 from conda_vendor.conda_vendor import main
+from conda_vendor.api import AsyncVendorer, Vendorer, VendorResult
+from conda_vendor.errors import CondaVendorError
+from conda_vendor.version import __version__
 
-__all__ = ["main"]
-
-try:
-    __version__ = pkg_resources.get_distribution("conda_vendor").version
-except Exception:
-    __version__ = "unknown"
+__all__ = ["main", "AsyncVendorer", "Vendorer", "VendorResult", "CondaVendorError"]
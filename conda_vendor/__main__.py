@@ -1,3 +1,10 @@
-from .conda_vendor import main
+from conda_vendor.conda_vendor import main
 
-main()
+
+# console_scripts entry point, see setup.py
+def cli() -> None:
+    main(prog_name="conda-vendor")
+
+
+if __name__ == "__main__":
+    cli()
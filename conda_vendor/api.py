@@ -0,0 +1,204 @@
+# Python API for long-running callers, e.g. a build service vendoring many
+# environments in one process. A Vendorer keeps its HTTP connection pool,
+# mirror health, repodata cache and solve cache warm across calls, raises
+# CondaVendorError (or the underlying error) instead of exiting and returns
+# results as objects. AsyncVendorer runs the same calls off the event loop
+#
+#   with Vendorer(platforms=["linux-64"], cache_dir="/srv/pkgs") as vendorer:
+#       result = vendorer.vendor(["environment.yaml"], dest_dir="/srv/channels")
+#       result.channel_dir, result.downloads
+#
+# A Vendorer keeps its session, mirror map and output settings in a Runtime
+# it hands down to every call instead of touching the process wide ones,
+# so Vendorers with different settings, and the calls of one Vendorer, run
+# concurrently
+from __future__ import annotations
+
+import functools
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional
+
+from conda_vendor.archive import ChannelArchiveWriter
+from conda_vendor.conda_vendor import (
+    archive_vendored_channel,
+    create_vendored_dir,
+    expand_environment_files,
+    get_conda_platform,
+    get_default_cache_dir,
+    get_environment_name,
+    get_lock_spec_for_environment_file,
+    solve_environments,
+    vendor_fetch_actions,
+)
+from conda_vendor.errors import CondaVendorError
+from conda_vendor.mirrors import MirrorMap, load_mirror_map
+from conda_vendor.output import Output
+from conda_vendor.package_cache import prune_cache
+from conda_vendor.runtime import Runtime
+from conda_vendor.session import DEFAULT_POOL_SIZE, create_session
+from conda_vendor.solve_cache import DEFAULT_SOLVE_CACHE_TTL
+from conda_vendor.verify import verify_channel
+
+if TYPE_CHECKING:
+    from conda_lock.conda_solver import FetchAction
+
+
+# a single environment file, directory or glob, or a list of them
+def _expand(environment_files):
+    if isinstance(environment_files, (str, Path)):
+        environment_files = [environment_files]
+    return expand_environment_files([str(environment_file) for environment_file in environment_files])
+
+
+@dataclass
+class VendorResult:
+    # the solved FETCH actions, one per package in the channel
+    fetch_actions: List[FetchAction]
+    platforms: List[str]
+    # the vendored channel directory, or the archive it was streamed into
+    channel_dir: Optional[Path] = None
+    archive: Optional[Path] = None
+    # number of packages by how they got into the channel: "downloaded",
+    # "cached", "linked" or "present"
+    downloads: dict = field(default_factory=dict)
+
+    @property
+    def packages(self) -> int:
+        return len(self.fetch_actions)
+
+
+class Vendorer:
+    def __init__(self, solver="conda", platforms=None, jobs=4, pool_size=None, host_pool_sizes=None, host_limits=None,
+                 bandwidth_limit=None, mirrors=None, cache_dir=None, cache_max_size=None, repodata_cache_dir=None,
+                 repodata_max_age=0, solve_cache_dir=None, solve_cache_ttl=DEFAULT_SOLVE_CACHE_TTL, quiet=True):
+        self.solver = solver
+        self.platforms = list(platforms or [get_conda_platform()])
+        self.jobs = jobs
+        self.host_limits = dict(host_limits or {})
+        self.bandwidth_limit = bandwidth_limit
+        self.cache_dir = cache_dir
+        self.cache_max_size = cache_max_size
+        self.repodata_max_age = repodata_max_age
+        self.solve_cache_dir = solve_cache_dir if solve_cache_dir is not None else get_default_cache_dir() / "solves"
+        self.solve_cache_ttl = solve_cache_ttl
+        self.quiet = quiet
+
+        # without a repodata cache directory upstream repodata.json is kept
+        # for the lifetime of the Vendorer and revalidated on every call
+        self._repodata_tmp_dir = None
+        if repodata_cache_dir is None:
+            self._repodata_tmp_dir = tempfile.TemporaryDirectory(prefix="conda-vendor-repodata-")
+            repodata_cache_dir = self._repodata_tmp_dir.name
+        self.repodata_cache_dir = repodata_cache_dir
+
+        # mirrors is a MirrorMap, {channel: [base URL, ...]} or a mirror map file
+        if isinstance(mirrors, (str, Path)):
+            mirrors = load_mirror_map(mirrors)
+        elif not isinstance(mirrors, MirrorMap):
+            mirrors = MirrorMap(mirrors)
+        self._session = create_session(
+            pool_size=pool_size or max(jobs, DEFAULT_POOL_SIZE),
+            host_pool_sizes={**self.host_limits, **(host_pool_sizes or {})})
+        self._runtime = Runtime(session=self._session, mirrors=mirrors, output=Output(quiet=quiet))
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # close the pooled connections and drop the temporary repodata cache
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._session.close()
+        if self._repodata_tmp_dir is not None:
+            self._repodata_tmp_dir.cleanup()
+
+    def _check_open(self):
+        if self._closed:
+            raise CondaVendorError("This Vendorer is closed")
+
+    def _solve(self, environment_yamls, platforms):
+        lock_specs = [get_lock_spec_for_environment_file(environment_yaml) for environment_yaml in environment_yamls]
+        return solve_environments(lock_specs, self.solver, list(platforms), solve_cache_dir=self.solve_cache_dir,
+                                  solve_cache_ttl=self.solve_cache_ttl, runtime=self._runtime)
+
+    # FETCH actions for environment_files (paths, directories or globs)
+    # on platforms, without downloading anything
+    def solve(self, environment_files, platforms=None) -> List[FetchAction]:
+        self._check_open()
+        return self._solve(_expand(environment_files), platforms or self.platforms)
+
+    # vendor environment_files into a channel directory below dest_dir (the
+    # current directory by default), or stream it into archive instead. An
+    # unsupported archive type raises ArchiveError before anything is solved
+    def vendor(self, environment_files, dest_dir=None, channel_name=None, platforms=None, resume=False, archive=None) -> VendorResult:
+        platforms = list(platforms or self.platforms)
+        if archive is not None:
+            if resume:
+                raise CondaVendorError("An archive can't be resumed")
+            ChannelArchiveWriter.check_archive_path(archive)
+        self._check_open()
+        environment_yamls = _expand(environment_files)
+        if channel_name is None:
+            channel_name = "vendored-channel" if len(environment_yamls) > 1 else get_environment_name(environment_yamls[0])
+
+        if archive is None:
+            channel_dir = create_vendored_dir(environment_yamls[0], platforms, desired_path=dest_dir,
+                                              exist_ok=resume, channel_name=channel_name)
+        fetch_actions = self._solve(environment_yamls, platforms)
+
+        downloads_kwargs = dict(jobs=self.jobs, cache_dir=self.cache_dir, repodata_cache_dir=self.repodata_cache_dir,
+                                repodata_max_age=self.repodata_max_age, host_limits=self.host_limits,
+                                bandwidth_limit=self.bandwidth_limit, runtime=self._runtime)
+        if archive is not None:
+            downloads = archive_vendored_channel(fetch_actions, archive, channel_name, **downloads_kwargs)
+            result = VendorResult(fetch_actions, platforms, archive=Path(archive), downloads=dict(downloads))
+        else:
+            downloads = vendor_fetch_actions(fetch_actions, channel_dir, skip_existing=resume, **downloads_kwargs)
+            result = VendorResult(fetch_actions, platforms, channel_dir=channel_dir, downloads=dict(downloads))
+
+        if self.cache_dir is not None and self.cache_max_size is not None:
+            prune_cache(self.cache_dir, self.cache_max_size)
+        return result
+
+    # re-verify a vendored channel, returns {status: [(subdir, fn), ...]},
+    # see conda_vendor.verify.verify_channel
+    def verify(self, channel_dir, jobs=None) -> dict:
+        return verify_channel(channel_dir, jobs=jobs)
+
+
+# asyncio front end of a Vendorer, every call runs in a worker thread so
+# the event loop keeps serving while a channel is solved and downloaded
+class AsyncVendorer:
+    def __init__(self, *args, **kwargs):
+        self.vendorer = Vendorer(*args, **kwargs)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _run(self, method, *args, **kwargs):
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(method, *args, **kwargs))
+
+    async def solve(self, environment_files, platforms=None) -> List[FetchAction]:
+        return await self._run(self.vendorer.solve, environment_files, platforms=platforms)
+
+    async def vendor(self, environment_files, **kwargs) -> VendorResult:
+        return await self._run(self.vendorer.vendor, environment_files, **kwargs)
+
+    async def verify(self, channel_dir, jobs=None) -> dict:
+        return await self._run(self.vendorer.verify, channel_dir, jobs=jobs)
+
+    async def close(self):
+        await self._run(self.vendorer.close)
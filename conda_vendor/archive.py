@@ -0,0 +1,253 @@
+# single-file export of a vendored channel for carrying it across an air
+# gap. The archive is a tar stream, compressed by file extension (.tar.zst
+# needs the zstandard package, .tar.gz, .tar.bz2, .tar.xz or plain
+# .tar), laid out as
+#
+#   <channel>/conda-vendor-manifest.json   path, size and sha256 of every file
+#   <channel>/<subdir>/repodata.json
+#   <channel>/<subdir>/<package>
+#
+# The manifest comes first, so an import verifies every file while it is
+# extracted, in one sequential pass and without seeking
+import contextlib
+import hashlib
+import io
+import json
+import os
+import tarfile
+import time
+from pathlib import Path, PurePosixPath
+
+from conda_vendor.compression import zstandard
+from conda_vendor.errors import CondaVendorError
+from conda_vendor.fileutils import hash_file
+
+MANIFEST_NAME = "conda-vendor-manifest.json"
+MANIFEST_FORMAT = 1
+
+
+class ArchiveError(CondaVendorError):
+    pass
+
+
+# the archive broke off after the manifest, channel_dir and results are
+# those of import_archive with every file that didn't make it as missing
+class ArchiveTruncatedError(ArchiveError):
+    def __init__(self, message, channel_dir, results):
+        super().__init__(message)
+        self.channel_dir = channel_dir
+        self.results = results
+
+
+# tarfile stream mode for the compression matching the archive's name
+def _tar_stream_mode(archive_path):
+    name = str(archive_path)
+    if name.endswith((".tar.gz", ".tgz")):
+        return "gz"
+    if name.endswith((".tar.bz2", ".tbz2")):
+        return "bz2"
+    if name.endswith((".tar.xz", ".txz")):
+        return "xz"
+    if name.endswith((".tar.zst", ".tzst")):
+        if zstandard is None:
+            raise ArchiveError(f"{name}: .tar.zst archives need the zstandard package, reinstall conda-vendor or pip install zstandard")
+        return "zst"
+    if name.endswith(".tar"):
+        return ""
+    raise ArchiveError(f"{name}: unknown archive type, use .tar.zst, .tar.gz, .tar.bz2, .tar.xz or .tar")
+
+
+def _check_member_path(path):
+    parts = PurePosixPath(path).parts
+    if not parts or PurePosixPath(path).is_absolute() or ".." in parts:
+        raise ArchiveError(f"Refusing to extract unsafe path {path!r}")
+
+
+# writes a channel archive member by member, files are streamed from disk
+# into the compressor and never held in memory. The archive is written to a
+# hidden .part file that only replaces archive_path once it is complete
+class ChannelArchiveWriter:
+    def __init__(self, archive_path, channel_name):
+        self.archive_path = Path(archive_path)
+        self.channel_name = channel_name
+        mode = _tar_stream_mode(self.archive_path)
+        self._part_path = self.archive_path.with_name(f".{self.archive_path.name}.part")
+        self._file = open(self._part_path, "wb")
+        self._compressor = None
+        if mode == "zst":
+            self._compressor = zstandard.ZstdCompressor(threads=-1).stream_writer(self._file, closefd=False)
+            self._tar = tarfile.open(fileobj=self._compressor, mode="w|", format=tarfile.PAX_FORMAT)
+        else:
+            self._tar = tarfile.open(fileobj=self._file, mode=f"w|{mode}", format=tarfile.PAX_FORMAT)
+
+    # raises ArchiveError unless the archive type is known and supported
+    @staticmethod
+    def check_archive_path(archive_path):
+        _tar_stream_mode(archive_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _tarinfo(self, path, size):
+        tarinfo = tarfile.TarInfo(f"{self.channel_name}/{path}")
+        tarinfo.size = size
+        tarinfo.mtime = int(time.time())
+        tarinfo.mode = 0o644
+        return tarinfo
+
+    # add the manifest for files, a list of {"path", "size", "sha256"}
+    # relative to the channel. Must be the first member
+    def add_manifest(self, files):
+        manifest = {"format": MANIFEST_FORMAT, "channel": self.channel_name, "files": files}
+        self.add_bytes(MANIFEST_NAME, json.dumps(manifest, indent=2).encode())
+
+    def add_bytes(self, path, data):
+        self._tar.addfile(self._tarinfo(path, len(data)), io.BytesIO(data))
+
+    def add_file(self, path, source):
+        with open(source, "rb") as f:
+            self._tar.addfile(self._tarinfo(path, os.fstat(f.fileno()).st_size), f)
+
+    def close(self):
+        self._tar.close()
+        if self._compressor is not None:
+            self._compressor.close()
+        self._file.close()
+        os.replace(self._part_path, self.archive_path)
+
+    # drop an incomplete archive. The tar stream and compressor are closed
+    # first, left open they would flush into the closed file once collected
+    def abort(self):
+        for closable in (self._tar, self._compressor):
+            if closable is not None:
+                with contextlib.suppress(Exception):
+                    closable.close()
+        self._file.close()
+        self._part_path.unlink()
+
+
+# manifest entry for a file on disk
+def manifest_entry(path, source) -> dict:
+    return {"path": path, "size": os.path.getsize(source), "sha256": hash_file(source)}
+
+
+def _open_archive_stream(archive_path):
+    mode = _tar_stream_mode(archive_path)
+    fileobj = open(archive_path, "rb")
+    stream = fileobj
+    try:
+        if mode == "zst":
+            stream = zstandard.ZstdDecompressor().stream_reader(fileobj, closefd=True)
+            return tarfile.open(fileobj=stream, mode="r|"), stream
+        return tarfile.open(fileobj=fileobj, mode=f"r|{mode}"), fileobj
+    except BaseException:
+        stream.close()
+        raise
+
+
+# errors of an archive that is truncated or corrupt below the tar level
+def _stream_errors() -> tuple:
+    errors = (tarfile.TarError, EOFError)
+    if zstandard is not None:
+        errors += (zstandard.ZstdError,)
+    return errors
+
+
+# extract a channel archive below dest_dir in one streaming pass, hashing
+# every file on the way and only renaming it into place once it matches
+# the manifest. on_file(path, status) is called for each file with status
+# "ok", "corrupt" or "extra". Returns (channel directory, results) where
+# results maps each status, plus "missing", to a list of paths.
+# An archive that breaks off raises ArchiveTruncatedError once every file
+# that didn't make it is recorded as missing
+def import_archive(archive_path, dest_dir, on_file=None, chunk_size=1024 * 1024):
+    results = {"ok": [], "corrupt": [], "extra": [], "missing": []}
+
+    def _record(path, status):
+        results[status].append(path)
+        if on_file is not None:
+            on_file(path, status)
+
+    try:
+        tar, stream = _open_archive_stream(archive_path)
+    except _stream_errors() as err:
+        raise ArchiveError(f"{archive_path} can't be read: {err}") from err
+    stream_error = None
+    try:
+        members = iter(tar)
+        try:
+            first = next(members, None)
+        except _stream_errors() as err:
+            raise ArchiveError(f"{archive_path} can't be read: {err}") from err
+        if first is None or PurePosixPath(first.name).name != MANIFEST_NAME:
+            raise ArchiveError(f"{archive_path} is not a conda-vendor archive, it doesn't start with {MANIFEST_NAME}")
+        try:
+            manifest = json.load(tar.extractfile(first))
+        except _stream_errors() as err:
+            raise ArchiveError(f"{archive_path} can't be read: {err}") from err
+        channel_name = manifest["channel"]
+        _check_member_path(channel_name)
+        expected = {entry["path"]: entry for entry in manifest["files"]}
+        channel_dir = Path(dest_dir) / channel_name
+        channel_dir.mkdir(parents=True, exist_ok=True)
+        (channel_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+
+        part_file = None
+        try:
+            for member in members:
+                if not member.isfile():
+                    continue
+                _check_member_path(member.name)
+                member_path = PurePosixPath(member.name)
+                if member_path.parts[0] != channel_name:
+                    _record(member.name, "extra")
+                    continue
+                path = member_path.relative_to(channel_name).as_posix()
+                entry = expected.pop(path, None)
+                if entry is None:
+                    _record(path, "extra")
+                    continue
+
+                dest_file = channel_dir / path
+                dest_file.parent.mkdir(parents=True, exist_ok=True)
+                part_file = dest_file.with_name(f".{dest_file.name}.part")
+                hasher = hashlib.sha256()
+                source = tar.extractfile(member)
+                try:
+                    with open(part_file, "wb") as f:
+                        for chunk in iter(lambda: source.read(chunk_size), b""):
+                            hasher.update(chunk)
+                            f.write(chunk)
+                except _stream_errors():
+                    # the file broke off, it's missing rather than corrupt
+                    expected[path] = entry
+                    raise
+                if hasher.hexdigest() != entry["sha256"]:
+                    part_file.unlink()
+                    _record(path, "corrupt")
+                    continue
+                os.replace(part_file, dest_file)
+                _record(path, "ok")
+        except _stream_errors() as err:
+            stream_error = err
+        finally:
+            if part_file is not None and part_file.exists():
+                part_file.unlink()
+    finally:
+        for closable in (tar, stream):
+            try:
+                closable.close()
+            except _stream_errors():
+                pass
+
+    for path in sorted(expected):
+        _record(path, "missing")
+    if stream_error is not None:
+        raise ArchiveTruncatedError(f"{archive_path} is truncated or corrupt: {stream_error}", channel_dir, results)
+    return channel_dir, results
@@ -0,0 +1,8 @@
+# zstandard, shared by the modules that read and write .zst files. It is a
+# dependency of conda-vendor, without it (e.g. a wheel missing for the
+# platform) repodata.json.zst is neither fetched nor written and .tar.zst
+# archives are refused, everything else keeps working
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
@@ -1,35 +1,84 @@
+from __future__ import annotations
+
 import click
-import yaml
+import functools
 import sys
 import struct
-import requests
+import glob
 import hashlib
 import json
+import os
+import tempfile
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from conda_vendor.version import __version__
+from conda_vendor.archive import ArchiveError, ArchiveTruncatedError, ChannelArchiveWriter, import_archive, manifest_entry
 from conda_vendor.conda_lock_wrapper import CondaLockWrapper
-from conda_lock.src_parser import LockSpecification
-from conda_lock.conda_solver import DryRunInstall, VersionedDependency, FetchAction
+from conda_vendor.errors import ChecksumError, CondaVendorError, SolveError
+from conda_vendor.fileutils import file_hasher, hash_file, link_or_copy, local_path_for_url, write_atomic
+from conda_vendor.index import write_channel_index
+from conda_vendor.mirrors import configure_mirrors, load_mirror_map
+from conda_vendor.output import OUTPUT_MODES, Output, configure_output, emit, is_ndjson, message, warning
+from conda_vendor.package_cache import add_to_cache, cache_stats, fetch_from_cache, prune_cache
+from conda_vendor.runtime import Runtime
+from conda_vendor.profiling import disable_profiling, enable_profiling, format_summary, get_tracer, span, summarize, write_chrome_trace
+from conda_vendor.repodata import filter_repodata, open_repodata
+from conda_vendor.scheduler import HostLimiter, ThroughputMeter, TokenBucket, host_of, run_scheduled
+from conda_vendor.verify import INDEX_FILES, verify_channel, verify_exit_code
+from conda_vendor.solve_cache import DEFAULT_SOLVE_CACHE_TTL, load_solve, solve_cache_key, store_solve
+from conda_vendor.session import DEFAULT_POOL_SIZE, configure_session, improved_download, resumable_download_errors
 from pathlib import Path
-from typing import List
-from requests.packages.urllib3.util.retry import Retry
-from requests.adapters import HTTPAdapter
-from conda_build import api
-from conda_vendor.iron_bank_generator import yaml_dump_ironbank_manifest
+from typing import TYPE_CHECKING, List
+from conda_vendor.iron_bank_generator import iter_channel_resources, iter_dry_run_resources, iter_lockfile_resources, yaml_dump_ironbank_manifest
+
+# conda-lock takes seconds to import, only load it for type checking. At
+# runtime CondaLockWrapper imports it on first use
+if TYPE_CHECKING:
+    from conda_lock.src_parser import LockSpecification
+    from conda_lock.conda_solver import DryRunInstall, FetchAction
 
 def get_lock_spec_for_environment_file(environment_file) -> LockSpecification:
-    lock_spec = CondaLockWrapper.parse_environment_file(environment_file)
+    with span("get_lock_spec_for_environment_file", file=str(environment_file)):
+        lock_spec = CondaLockWrapper.parse_environment_file(environment_file)
     return lock_spec
 
 
-# create the vendored channel directory, given the name in the environment.yaml
-def create_vendored_dir(environment_file, platform, desired_path=None) -> Path:
+# read the environment name from an environment.yaml
+def get_environment_name(environment_file) -> str:
+    import yaml
+
     with open(environment_file, 'r') as env_file:
         try:
             environment_yaml = yaml.safe_load(env_file)
-            environment_name = environment_yaml['name']
+            return environment_yaml['name']
         except yaml.YAMLError as err:
-            click.echo(err)
-            sys.exit(f"Failed to read environment name from {environment_file}")
+            raise CondaVendorError(f"Failed to read environment name from {environment_file}: {err}") from err
+
+
+# expand --file arguments into environment files, a directory stands for
+# every *.yaml/*.yml in it and other arguments may be glob patterns
+def expand_environment_files(file_args) -> List[Path]:
+    environment_files = []
+    for file_arg in file_args:
+        path = Path(file_arg)
+        if path.is_dir():
+            matches = sorted([*path.glob("*.yaml"), *path.glob("*.yml")])
+        elif path.exists():
+            matches = [path]
+        else:
+            matches = [Path(match) for match in sorted(glob.glob(file_arg))]
+        if not matches:
+            raise CondaVendorError(f"No environment files found for \"{file_arg}\"")
+        environment_files.extend(match for match in matches if match not in environment_files)
+    return environment_files
+
+
+# create the vendored channel directory, given the name in the environment.yaml
+# or an explicit channel_name, platform may be a single platform or a list
+# exist_ok=True reuses an existing vendored directory, e.g. to resume a run
+def create_vendored_dir(environment_file, platform, desired_path=None, exist_ok=False, channel_name=None) -> Path:
+    environment_name = channel_name or get_environment_name(environment_file)
 
     # use current working directory if no path specified
 
@@ -39,8 +88,9 @@ def create_vendored_dir(environment_file, platform, desired_path=None) -> Path:
             root_dir = Path(root_dir)
 
         path = root_dir / env_name
-        Path.mkdir(path)
-        create_platform_dir(path, platform)
+        Path.mkdir(path, exist_ok=exist_ok)
+        for platform in ([platform] if isinstance(platform, str) else platform):
+            create_platform_dir(path, platform)
         create_noarch_dir(path)
         return path
 
@@ -48,30 +98,26 @@ def create_vendored_dir(environment_file, platform, desired_path=None) -> Path:
         try:
             return _create_vendored_dir(Path.cwd(), environment_name, platform)
         except FileExistsError as err:
-            click.echo(err)
-            sys.exit(f"Directory \"{environment_name}\" already exists")
+            raise CondaVendorError(f"Directory \"{environment_name}\" already exists, use --resume to continue vendoring into it") from err
     else:
         try:
             return _create_vendored_dir(desired_path, environment_name, platform)
         except FileExistsError as err:
-            click.echo(err)
-            sys.exit(f"Directory \"{desired_path}/{environment_name}\" already exists")
+            raise CondaVendorError(f"Directory \"{desired_path}/{environment_name}\" already exists, use --resume to continue vendoring into it") from err
 
 def create_platform_dir(path, platform, overwrite=True):
     try:
         platform_path = path / platform
         Path.mkdir(platform_path, exist_ok=overwrite)
     except FileExistsError as err:
-        click.echo(err)
-        sys.exit(f"Directory \"{platform_path}\" already exists")
+        raise CondaVendorError(f"Directory \"{platform_path}\" already exists") from err
 
 def create_noarch_dir(path, overwrite=True):
     try:
         noarch_path = path / "noarch"
         Path.mkdir(noarch_path, exist_ok=overwrite)
     except FileExistsError as err:
-        click.echo(err)
-        sys.exit(f"Directory \"{noarch_path}\" already exists")
+        raise CondaVendorError(f"Directory \"{noarch_path}\" already exists") from err
 
 def _scrub_virtual_pkgs(dry_run_install, chan):
     fetch = []
@@ -91,28 +137,30 @@ def _scrub_virtual_pkgs(dry_run_install, chan):
     dry_run_install['actions']['LINK'] = link
     return dry_run_install
 
-def solve_environment(lock_spec, solver, platform) -> DryRunInstall:
+def solve_environment(lock_spec, solver, platform, runtime=None) -> DryRunInstall:
+    runtime = runtime or Runtime()
     specs = get_specs(lock_spec)
 
-    click.echo(click.style(f"Using Solver: {solver}", bold=True, bg='black', fg='cyan'))
-    click.echo(click.style(f"Solving for Platform: {platform}", bold=True, bg='black', fg='cyan'))
-    click.echo(click.style(f"Solving for Spec: {specs}", bold=True, bg='black', fg='cyan'))
+    runtime.output.message(f"Using Solver: {solver}", bold=True, bg='black', fg='cyan')
+    runtime.output.message(f"Solving for Platform: {platform}", bold=True, bg='black', fg='cyan')
+    runtime.output.message(f"Solving for Spec: {specs}", bold=True, bg='black', fg='cyan')
 
-    virtual_package_repodata = CondaLockWrapper.default_virtual_package_repodata()
-    virtual_package_chan = virtual_package_repodata.channel
-    channels = [*lock_spec.channels, virtual_package_chan]
-    dry_run_install = CondaLockWrapper.solve_specs_for_arch(
-            solver,
-            channels,
-            specs,
-            platform)
+    with span("solve_environment", solver=solver, platform=platform, specs=len(specs)):
+        virtual_package_repodata = CondaLockWrapper.default_virtual_package_repodata()
+        virtual_package_chan = virtual_package_repodata.channel
+        channels = [*lock_spec.channels, virtual_package_chan]
+        dry_run_install = CondaLockWrapper.solve_specs_for_arch(
+                solver,
+                channels,
+                specs,
+                platform)
 
     dry_run_install = _scrub_virtual_pkgs(dry_run_install,
                                           virtual_package_chan.url)
 
     if not dry_run_install['success']:
-        sys.exit("Failed to Solve for {specs}\n Using {solver} for {platform}")
-    click.echo(click.style("Successfull Solve", bold=True, fg='green', blink=True))
+        raise SolveError(f"Failed to Solve for {specs}\n Using {solver} for {platform}")
+    runtime.output.message("Successfull Solve", bold=True, fg='green', blink=True)
 
     return dry_run_install
 
@@ -132,81 +180,386 @@ def get_specs(lock_spec) -> List[str]:
 # Only return packages in the FETCH action, which
 # include all the entries form the packages repodata.json
 def get_fetch_actions(solver, platform, dry_run_install) -> List[FetchAction]:
-    patched_dry_run_install = patch_link_actions(solver, platform, dry_run_install)
-    fetch_actions = patched_dry_run_install["actions"]["FETCH"]
+    with span("get_fetch_actions", platform=platform) as span_args:
+        patched_dry_run_install = patch_link_actions(solver, platform, dry_run_install)
+        fetch_actions = patched_dry_run_install["actions"]["FETCH"]
+        span_args["packages"] = len(fetch_actions)
+    return fetch_actions
+
+
+# solve the environment and return its FETCH actions, reusing a cached solve
+# from solve_cache_dir when specs, channels, platform, solver and the
+# upstream repodata are unchanged. solve_cache_dir=None always solves.
+# runtime is the Runtime to run with, the process wide one by default
+def solve_fetch_actions(lock_spec, solver, platform, solve_cache_dir=None, solve_cache_ttl=DEFAULT_SOLVE_CACHE_TTL,
+                        runtime=None) -> List[FetchAction]:
+    runtime = runtime or Runtime()
+    cache_key = None
+    if solve_cache_dir is not None:
+        channels = [getattr(channel, "url", channel) for channel in lock_spec.channels]
+        with span("load_solve", platform=platform) as span_args:
+            cache_key = solve_cache_key(get_specs(lock_spec), channels, platform, solver, session=runtime.session)
+            fetch_actions = load_solve(solve_cache_dir, cache_key, solve_cache_ttl)
+            span_args["hit"] = fetch_actions is not None
+        if fetch_actions is not None:
+            runtime.output.message(f"Using Cached Solve for Platform: {platform}", bold=True, fg='green')
+            runtime.output.emit("solve", platform=platform, solver=solver, packages=len(fetch_actions), cached=True)
+            return fetch_actions
+
+    # generate DryRunInstall
+    dry_run_install = solve_environment(lock_spec, solver, platform, runtime=runtime)
+
+    # generate List[FetchAction]
+    # a FetchAction object includes all the entries from the corresponding
+    # package's repodata.json
+    fetch_actions = get_fetch_actions(solver, platform, dry_run_install)
+
+    if cache_key is not None:
+        store_solve(solve_cache_dir, cache_key, fetch_actions)
+    runtime.output.emit("solve", platform=platform, solver=solver, packages=len(fetch_actions), cached=False)
     return fetch_actions
 
 
+# solve every environment for every platform, each solve runs in its own
+# process. The FETCH actions are merged so a package shared by several
+# environments or platforms (e.g. noarch) is only vendored once
+def solve_environments(lock_specs, solver, platforms, solve_cache_dir=None, solve_cache_ttl=DEFAULT_SOLVE_CACHE_TTL,
+                       runtime=None) -> List[FetchAction]:
+    runtime = runtime or Runtime()
+    solves = [(lock_spec, platform) for lock_spec in lock_specs for platform in platforms]
+    if len(solves) == 1:
+        return solve_fetch_actions(solves[0][0], solver, solves[0][1], solve_cache_dir, solve_cache_ttl, runtime=runtime)
+
+    tracer = get_tracer()
+    with ProcessPoolExecutor(max_workers=min(len(solves), os.cpu_count() or 1)) as executor:
+        futures = [
+            executor.submit(_solve_fetch_actions_worker, tracer is not None, runtime.output.config(),
+                            lock_spec, solver, platform, solve_cache_dir, solve_cache_ttl)
+            for lock_spec, platform in solves
+        ]
+        fetch_action_lists = []
+        for future in futures:
+            fetch_actions, events = future.result()
+            fetch_action_lists.append(fetch_actions)
+            if tracer is not None:
+                tracer.extend(events)
+        return merge_fetch_actions(*fetch_action_lists, runtime=runtime)
+
+
+# solve_fetch_actions in a worker process, also returns the spans it
+# recorded when profiling so the parent can add them to its trace
+def _solve_fetch_actions_worker(profile, output_config, lock_spec, solver, platform, solve_cache_dir, solve_cache_ttl):
+    runtime = Runtime(output=Output(**output_config))
+    if not profile:
+        return solve_fetch_actions(lock_spec, solver, platform, solve_cache_dir, solve_cache_ttl, runtime=runtime), []
+    tracer = enable_profiling()
+    fetch_actions = solve_fetch_actions(lock_spec, solver, platform, solve_cache_dir, solve_cache_ttl, runtime=runtime)
+    return fetch_actions, tracer.events
+
+
+# solve one environment for several platforms, see solve_environments
+def solve_platforms(lock_spec, solver, platforms, solve_cache_dir=None, solve_cache_ttl=DEFAULT_SOLVE_CACHE_TTL,
+                    runtime=None) -> List[FetchAction]:
+    return solve_environments([lock_spec], solver, platforms, solve_cache_dir, solve_cache_ttl, runtime=runtime)
+
+
+# one "fetch_action" record per solved package in ndjson mode
+def emit_fetch_actions(fetch_actions):
+    for pkg in fetch_actions:
+        emit("fetch_action", **pkg)
+
+
+# union of lists of FETCH actions. Identical artifacts (same sha256) share
+# their subdir and filename and are kept once, two different artifacts
+# competing for the same subdir/filename can't both live in one channel,
+# the first one wins
+def merge_fetch_actions(*fetch_action_lists, runtime=None) -> List[FetchAction]:
+    runtime = runtime or Runtime()
+    merged = {}
+    for fetch_actions in fetch_action_lists:
+        for pkg in fetch_actions:
+            kept = merged.setdefault((pkg["subdir"], pkg["fn"]), pkg)
+            if kept.get("sha256") != pkg.get("sha256"):
+                runtime.output.warning(f"{pkg['subdir']}/{pkg['fn']} from {pkg['channel']} conflicts with {kept['channel']}, keeping {kept['channel']}",
+                        subdir=pkg['subdir'], fn=pkg['fn'])
+    return list(merged.values())
+
+
 # append DryRunInstall witn LINK action items
 def patch_link_actions(solver, platform, dry_run_install) -> DryRunInstall:
     patched_dry_run_install = CondaLockWrapper.reconstruct_fetch_actions(solver, platform, dry_run_install)
     return patched_dry_run_install
 
 
-# reconstruct repodata.json for subdirs
-def reconstruct_repodata_json(repodata_url, dest_dir, fetch_actions):
-    if isinstance(dest_dir, str):
-        dest_dir = Path(dest_dir)
+# fetch {channel}/{subdir}/repodata.json and keep only the entries in wanted_fns,
+# returns the "packages" and "packages.conda" dicts
+def fetch_filtered_repodata(repodata_url, wanted_fns, repodata_cache_dir=None, repodata_max_age=0, progress=True, runtime=None):
+    runtime = runtime or Runtime()
+    with span("fetch_filtered_repodata", url=repodata_url, bytes=0) as span_args, \
+            open_repodata(repodata_url, repodata_cache_dir, repodata_max_age, runtime=runtime) as f:
+        def _count_bytes(size):
+            span_args["bytes"] += size
+
+        if progress:
+            # stream the upstream repodata.json, keeping only the solved packages
+            repodata_size = os.fstat(f.fileno()).st_size
+            with runtime.output.progressbar(length=repodata_size, label="Hotfix Patching repodata.json") as progress:
+                def _on_read(size):
+                    _count_bytes(size)
+                    progress.update(size)
+                live_repodata_json = filter_repodata(f, wanted_fns, on_read=_on_read)
+        else:
+            live_repodata_json = filter_repodata(f, wanted_fns, on_read=_count_bytes)
+    return live_repodata_json.get("packages", {}), live_repodata_json.get("packages.conda", {})
 
+# write repodata.json into dest_dir, replacing any repodata.json of a previous run
+def write_repodata_json(dest_dir, packages, packages_conda):
+    dest_dir = Path(dest_dir)
     repo_data = {
         "info": {"subdir": dest_dir.name},
-        "packages": {},
-        "packages.conda": {},
+        "packages": packages,
+        "packages.conda": packages_conda,
     }
 
-    valid_names = [pkg["fn"] for pkg in fetch_actions]
-
-    live_repodata_json = improved_download(repodata_url).json()
-    with click.progressbar(live_repodata_json["packages"].items(), label="Hotfix Patching repodata.json") as repodata_packages:
-        if live_repodata_json.get("packages"):
-            for name, entry in repodata_packages:
-                if name in valid_names:
-                    repo_data["packages"][name] = entry
-
-        if live_repodata_json.get("packages.conda"):
-            for name, entry in repodata_packages:
-                if name in valid_names:
-                    repo_data["packages.conda"][name] = entry
-
-        # write to destination
-        dest_file = Path(f"{dest_dir}/repodata.json")
-        with dest_file.open("w") as f:
-            json.dump(repo_data, f)
-
-# see https://stackoverflow.com/questions/21371809/cleanly-setting-max-retries-on-python-requests-get-or-post-method
-def improved_download(url):
-    session = requests.Session()
-    retry = Retry(connect=5, backoff_factor=0.5)
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    return session.get(url)
-
-def download_solved_pkgs(fetch_action_pkgs, vendored_path, platform):
-    click.echo(click.style("Downloading and Verifying SHA256 Checksums for Solved Packages", bold=True, fg='green'))
+    data = json.dumps(repo_data).encode()
+    with span("write_repodata_json", subdir=dest_dir.name, bytes=len(data)):
+        write_atomic(dest_dir / "repodata.json", lambda f: f.write(data))
+
+# reconstruct repodata.json for subdirs
+# repodata_cache_dir keeps upstream repodata.json between runs, see conda_vendor.repodata
+def reconstruct_repodata_json(repodata_url, dest_dir, fetch_actions, repodata_cache_dir=None, repodata_max_age=0, runtime=None):
+    valid_names = {pkg["fn"] for pkg in fetch_actions}
+    with span("reconstruct_repodata_json", url=repodata_url, packages=len(valid_names)):
+        packages, packages_conda = fetch_filtered_repodata(repodata_url, valid_names, repodata_cache_dir, repodata_max_age, runtime=runtime)
+        write_repodata_json(dest_dir, packages, packages_conda)
+
+# hash a file in chunks without reading it into memory
+def sha256_file(path) -> str:
+    with span("sha256_file", file=Path(path).name) as span_args:
+        span_args["bytes"] = os.path.getsize(path)
+        return hash_file(path)
+
+# stream url into dest_file chunk by chunk while updating the SHA256, so
+# memory stays bounded by chunk_size. The chunks land in "<fn>.part" next
+# to dest_file which is only renamed into place once the checksum matches,
+# an interrupted download never leaves a truncated package behind.
+# A transfer that breaks off, in this run or a previous one, continues from
+# the end of the .part file with an HTTP Range request. The ETag (or
+# Last-Modified) seen when the transfer started is sent as If-Range, so the
+# server answers with the full file if the upstream artifact changed
+# on_chunk(size) is called from the downloading thread for every chunk
+# received, e.g. to meter or throttle the transfer. session defaults to the
+# shared session
+def stream_download(url, dest_file, sha256, chunk_size=1024 * 1024, max_attempts=5, on_chunk=None, session=None):
+    dest_file = Path(dest_file)
+    part_file = dest_file.with_name(f"{dest_file.name}.part")
+    validator_file = dest_file.with_name(f"{dest_file.name}.part.validator")
+
+    # bytes already in the .part file, and the SHA256 over them
+    offset = 0
+    hasher = hashlib.sha256()
+    if part_file.exists() and validator_file.exists():
+        offset = part_file.stat().st_size
+        hasher = file_hasher(part_file)
+
+    for attempt in range(1, max_attempts + 1):
+        try:
+            offset, hasher = _fetch_part(url, part_file, validator_file, offset, hasher, chunk_size, on_chunk, session)
+            break
+        except resumable_download_errors():
+            if attempt == max_attempts:
+                raise
+            # keep whatever made it to disk, the next attempt resumes from there
+            offset, hasher = 0, hashlib.sha256()
+            if part_file.exists():
+                offset = part_file.stat().st_size
+                hasher = file_hasher(part_file)
+            time.sleep(0.5 * 2 ** (attempt - 1))
 
+    try:
+        compare_sha256_hexdigest(hasher.hexdigest(), sha256)
+    except ChecksumError:
+        # never resume from bytes that don't hash correctly
+        part_file.unlink()
+        raise
+    finally:
+        if validator_file.exists():
+            validator_file.unlink()
+    os.replace(part_file, dest_file)
+
+# append the rest of url to part_file, returns the new offset and hasher
+def _fetch_part(url, part_file, validator_file, offset, hasher, chunk_size, on_chunk=None, session=None):
+    headers = {}
+    if offset > 0 and validator_file.exists():
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = validator_file.read_text()
+
+    response = improved_download(url, stream=True, headers=headers, session=session)
+    try:
+        if response.status_code == 416:
+            # the .part file is no prefix of the current artifact, start over
+            response.close()
+            part_file.unlink()
+            return _fetch_part(url, part_file, validator_file, 0, hashlib.sha256(), chunk_size, on_chunk, session)
+        response.raise_for_status()
+
+        if response.status_code == 206 and response.headers.get("Content-Range", "").startswith(f"bytes {offset}-"):
+            mode = "ab"
+        else:
+            # full content, either a fresh transfer or the artifact changed
+            offset, hasher, mode = 0, hashlib.sha256(), "wb"
+            validator = _strong_validator(response.headers)
+            if validator is not None:
+                validator_file.write_text(validator)
+            elif validator_file.exists():
+                validator_file.unlink()
+
+        with open(part_file, mode) as f:
+            f.truncate(offset)
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+                hasher.update(chunk)
+                offset += len(chunk)
+                if on_chunk is not None:
+                    on_chunk(len(chunk))
+        return offset, hasher
+    finally:
+        response.close()
+
+# If-Range needs a strong ETag or a Last-Modified date
+def _strong_validator(headers):
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+# each package goes to the subdir of its FETCH action, platform is unused and
+# only kept for backwards compatibility
+# skip_existing=True keeps packages already in the vendored directory whose
+# sha256 matches the solve, so an interrupted run only fetches what's missing
+# packages from file:// or plain-path channels are verified in place and then
+# hardlinked (or reflinked/copied) instead of downloaded
+# on_package(pkg, dest_file) is called from the calling thread as each
+# package is in place, in order of completion
+# downloads start largest first, host_limits caps the parallel downloads per
+# host and bandwidth_limit the aggregate bytes/second, see conda_vendor.scheduler.
+# With mirrors the limits apply to the mirror host serving each download.
+# runtime is the Runtime to download with, the process wide one by default
+def download_solved_pkgs(fetch_action_pkgs, vendored_path, platform, jobs=4, cache_dir=None, skip_existing=False, on_package=None,
+                         host_limits=None, bandwidth_limit=None, runtime=None):
+    runtime = runtime or Runtime()
+    runtime.output.message(f"Downloading and Verifying SHA256 Checksums for Solved Packages using {jobs} Jobs", bold=True, fg='green')
+    meter = ThroughputMeter()
+    bucket = TokenBucket(bandwidth_limit) if bandwidth_limit else None
+    host_limiter = HostLimiter(host_limits)
+    # bytes received so far by downloads that are still running, by filename
+    in_flight = {}
+
+    # returns how the package ended up in the vendored directory
     def _download_solved_pkgs(pkg, vendored_path, platform):
-        platform_path = vendored_path / platform
-        response = improved_download(pkg['url'])
-        content = response.content
-
-        # verify checksum
-        compare_sha256(content, pkg['sha256'])
-        with open(platform_path / pkg['fn'], "wb") as conda_pkg:
-            conda_pkg.write(content)
-
-    with click.progressbar(fetch_action_pkgs, label="Downloading Progress") as pkgs:
-        for pkg in pkgs:
-            if pkg['subdir'] == 'noarch':
-                _download_solved_pkgs(pkg, vendored_path, "noarch")
-            else:
-                _download_solved_pkgs(pkg, vendored_path, platform)
+        with span("download_package", fn=pkg['fn'], subdir=platform) as span_args:
+            span_args["source"] = _place_solved_pkg(pkg, vendored_path / platform / pkg['fn'])
+            if span_args["source"] in ("downloaded", "linked"):
+                span_args["bytes"] = pkg.get('size')
+            return span_args["source"]
+
+    def _place_solved_pkg(pkg, dest_file):
+        if skip_existing and dest_file.exists() and sha256_file(dest_file) == pkg['sha256']:
+            return "present"
+        if cache_dir is not None and fetch_from_cache(cache_dir, pkg['sha256'], dest_file, size=pkg.get('size')):
+            return "cached"
+
+        local_path = local_path_for_url(pkg['url'])
+        if local_path is not None:
+            # verify the mirror's copy before sharing its bytes
+            compare_sha256_hexdigest(sha256_file(local_path), pkg['sha256'])
+            link_or_copy(local_path, dest_file)
+            source = "linked"
+        else:
+            def _on_chunk(size):
+                meter.add(size)
+                in_flight[dest_file] = in_flight.get(dest_file, 0) + size
+                if bucket is not None:
+                    bucket.consume(size)
+
+            def _fetch(url):
+                with host_limiter.slot(url):
+                    stream_download(url, dest_file, pkg['sha256'], on_chunk=_on_chunk, session=runtime.session)
+
+            # download from the fastest healthy mirror and verify checksum
+            runtime.failover(pkg['url'], _fetch)
+            source = "downloaded"
+        if cache_dir is not None:
+            add_to_cache(cache_dir, pkg['sha256'], dest_file)
+        return source
+
+    if skip_existing:
+        # temporary files left behind by an interrupted run
+        for stale_file in Path(vendored_path).glob("*/.*.part"):
+            stale_file.unlink()
+
+    # progress is measured in bytes, a package without a size counts as one
+    def _weight(pkg):
+        return pkg.get('size') or 1
+
+    results = Counter()
+    completed = {"bytes": 0, "packages": 0}
+    total = {"bytes": sum(_weight(pkg) for pkg in fetch_action_pkgs), "packages": len(fetch_action_pkgs)}
+    last_report = {"position": 0, "emitted": 0.0}
+
+    def _status(_):
+        return f"{completed['packages']}/{total['packages']} Packages, {format_byte_size(meter.rate())}/s"
+
+    # downloads run on a thread pool, the progress bar is only advanced
+    # from this thread, on every completion and on every scheduler tick
+    with runtime.output.progressbar(length=total["bytes"], label="Downloading Progress", item_show_func=_status) as progress:
+        def _report_progress():
+            position = completed["bytes"] + sum(in_flight.values())
+            progress.update(max(0, position - last_report["position"]))
+            last_report["position"] = max(position, last_report["position"])
+            if time.monotonic() - last_report["emitted"] >= 1:
+                last_report["emitted"] = time.monotonic()
+                runtime.output.emit("progress", packages=completed["packages"], total_packages=total["packages"],
+                     bytes=meter.total, bytes_per_s=round(meter.rate()))
+
+        def _on_done(pkg, source):
+            dest_file = Path(vendored_path) / pkg['subdir'] / pkg['fn']
+            in_flight.pop(dest_file, None)
+            completed["bytes"] += _weight(pkg)
+            completed["packages"] += 1
+            results[source] += 1
+            runtime.output.emit("package", fn=pkg['fn'], subdir=pkg['subdir'], sha256=pkg['sha256'], source=source)
+            if on_package is not None:
+                on_package(pkg, dest_file)
+            _report_progress()
+
+        run_scheduled(
+            fetch_action_pkgs,
+            lambda pkg: _download_solved_pkgs(pkg, vendored_path, pkg['subdir']),
+            jobs,
+            size=_weight,
+            # the host of the mirror the download goes to first
+            host=lambda pkg: host_of(runtime.candidates(pkg['url'])[0]),
+            host_limits=host_limits,
+            on_done=_on_done,
+            on_tick=_report_progress)
+
+    if skip_existing:
+        runtime.output.message(f"Kept {results['present']} of {total['packages']} Packages Already Vendored", fg='green')
+    if cache_dir is not None:
+        runtime.output.message(f"Reused {results['cached']} of {total['packages']} Packages from Cache {cache_dir}", fg='green')
+    if results['linked']:
+        runtime.output.message(f"Linked {results['linked']} of {total['packages']} Packages from Local Channels", fg='green')
+    if results['downloaded']:
+        runtime.output.message(f"Downloaded {format_byte_size(meter.total)} at {format_byte_size(meter.average())}/s", fg='green')
+    return results
 
 def compare_sha256(byte_array, fetch_action_sha256):
-    calculated_sha256 = hashlib.sha256(byte_array).hexdigest()
+    compare_sha256_hexdigest(hashlib.sha256(byte_array).hexdigest(), fetch_action_sha256)
+
+def compare_sha256_hexdigest(calculated_sha256, fetch_action_sha256):
     if calculated_sha256 != fetch_action_sha256:
-        raise RuntimeError(f"Calculated SHA256 does not match repodata.json SHA256")
-        sys.exit("SHA256 Checksum Validation Failed")
+        raise ChecksumError("SHA256 Checksum Validation Failed, Calculated SHA256 does not match repodata.json SHA256")
 
 #see https://github.com/conda/conda/blob/248741a843e8ce9283fa94e6e4ec9c2fafeb76fd/conda/base/context.py#L51
 def get_conda_platform(platform=sys.platform, custom_platform=None) -> str:
@@ -225,26 +578,357 @@ def get_conda_platform(platform=sys.platform, custom_platform=None) -> str:
     bits = struct.calcsize("P") * 8
     return f"{_platform_map[platform]}-{bits}"
 
+# per-user cache directory for conda-vendor, e.g. ~/.cache/conda-vendor
+def get_default_cache_dir() -> Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "conda-vendor"
+
 # hotfix vendored repodata.json given the input of FETCH action packages
 # from conda-lock's solve results
-def hotfix_vendored_repodata_json(fetch_action_packages, vendored_dir_path):
-    channels = []
-    subdirs = []
+def hotfix_vendored_repodata_json(fetch_action_packages, vendored_dir_path, repodata_cache_dir=None, repodata_max_age=0, jobs=4,
+                                  runtime=None):
+    runtime = runtime or Runtime()
+    # index the solved filenames by upstream (channel, subdir)
+    wanted_fns = defaultdict(set)
     for pkg in fetch_action_packages:
-        channels.append(pkg["channel"])
-        subdirs.append(pkg["subdir"])
-        click.echo(click.style("========================================================================", fg='blue', bold=True))
-        click.echo(click.style(f"Channel: {pkg['channel']}\nPackage: {pkg['fn']}\nURL: {pkg['url']}\nSHA256: {pkg['sha256']}\nSubdirectory: {pkg['subdir']}\nTimestamp: {pkg['timestamp']}", fg='yellow'))
-        click.echo(click.style("========================================================================", fg='blue', bold=True))
-
-    # patch repodata.json for each channel + subdir
-    channels = list(set(channels))
-    subdirs = list(set(subdirs))
-    for channel in channels:
-        for subdir in subdirs:
-            if subdir in channel:
-                click.echo(click.style(f"Reconstructing repodata.json with Hotfix for {subdir} using {channel}/repodata.json", bold=True, fg='red'))
-                reconstruct_repodata_json(f"{channel}/repodata.json", vendored_dir_path / subdir, fetch_action_packages)
+        wanted_fns[(pkg["channel"], pkg["subdir"])].add(pkg["fn"])
+
+    # fetch and filter each upstream repodata.json exactly once, in parallel
+    # across channel and subdir pairs, then merge all channels per subdir
+    subdir_packages = defaultdict(dict)
+    subdir_packages_conda = defaultdict(dict)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {}
+        for (channel, subdir), fns in wanted_fns.items():
+            runtime.output.message(f"Reconstructing repodata.json with Hotfix for {subdir} using {channel}/repodata.json ({len(fns)} Packages)", bold=True, fg='red')
+            future = executor.submit(fetch_filtered_repodata, f"{channel}/repodata.json", fns,
+                                     repodata_cache_dir, repodata_max_age, progress=False, runtime=runtime)
+            futures[future] = (channel, subdir)
+
+        with runtime.output.progressbar(length=len(futures), label="Hotfix Patching repodata.json") as progress:
+            for future in as_completed(futures):
+                channel, subdir = futures[future]
+                packages, packages_conda = future.result()
+                subdir_packages[subdir].update(packages)
+                subdir_packages_conda[subdir].update(packages_conda)
+
+                missing_fns = wanted_fns[(channel, subdir)] - packages.keys() - packages_conda.keys()
+                if missing_fns:
+                    runtime.output.warning(f"{len(missing_fns)} Packages not found in {channel}/repodata.json: {sorted(missing_fns)}",
+                            channel=channel, subdir=subdir, missing=sorted(missing_fns))
+                progress.update(1)
+
+    for subdir in {subdir for _, subdir in wanted_fns}:
+        write_repodata_json(vendored_dir_path / subdir, subdir_packages[subdir], subdir_packages_conda[subdir])
+        runtime.output.emit("repodata", subdir=subdir, path=str(vendored_dir_path / subdir / "repodata.json"),
+             packages=len(subdir_packages[subdir]) + len(subdir_packages_conda[subdir]))
+
+# write compressed repodata.json, current_repodata.json and channeldata.json
+# next to the repodata.json files, see conda_vendor.index
+def index_vendored_channel(vendored_dir_path, runtime=None):
+    runtime = runtime or Runtime()
+    subdirs = write_channel_index(vendored_dir_path)
+    runtime.output.message(f"Indexed Subdirs {', '.join(subdirs)} of {vendored_dir_path}", fg='green')
+    runtime.output.emit("index", channel=str(vendored_dir_path), subdirs=subdirs)
+
+# download and verify the packages into their subdirs of vendored_dir_path,
+# then write repodata.json and the index files. Returns the number of
+# packages by how they got into the channel, see download_solved_pkgs
+def vendor_fetch_actions(fetch_action_packages, vendored_dir_path, jobs=4, cache_dir=None, skip_existing=False,
+                         repodata_cache_dir=None, repodata_max_age=0, host_limits=None, bandwidth_limit=None, runtime=None) -> Counter:
+    runtime = runtime or Runtime()
+    results = download_solved_pkgs(fetch_action_packages, vendored_dir_path, None, jobs=jobs, cache_dir=cache_dir,
+                                   skip_existing=skip_existing, host_limits=host_limits, bandwidth_limit=bandwidth_limit,
+                                   runtime=runtime)
+    runtime.output.message(f"SHA256 Checksum Validation and Solved Packages Downloads Complete for {vendored_dir_path}", bold=True, fg='green')
+
+    # generate hotfix repodata.json for each channel and subdir once all
+    # packages are in place, so an interrupted run never leaves a
+    # repodata.json pointing at missing packages
+    hotfix_vendored_repodata_json(fetch_action_packages, vendored_dir_path,
+                                  repodata_cache_dir=repodata_cache_dir, repodata_max_age=repodata_max_age, jobs=jobs,
+                                  runtime=runtime)
+    index_vendored_channel(vendored_dir_path, runtime=runtime)
+    return results
+
+# vendor straight into a channel archive, see conda_vendor.archive. The
+# repodata.json files are built first so the manifest with every checksum
+# leads the archive, then each package is appended as soon as its download
+# is verified and removed from the staging directory next to the archive.
+# Returns the download results, see download_solved_pkgs
+def archive_vendored_channel(fetch_action_packages, archive_path, channel_name, jobs=4, cache_dir=None,
+                             repodata_cache_dir=None, repodata_max_age=0, host_limits=None, bandwidth_limit=None, runtime=None):
+    archive_path = Path(archive_path)
+    with tempfile.TemporaryDirectory(prefix=".conda-vendor-", dir=archive_path.parent) as staging_dir:
+        staging_path = Path(staging_dir)
+        for subdir in {pkg["subdir"] for pkg in fetch_action_packages}:
+            (staging_path / subdir).mkdir()
+        hotfix_vendored_repodata_json(fetch_action_packages, staging_path,
+                                      repodata_cache_dir=repodata_cache_dir, repodata_max_age=repodata_max_age, jobs=jobs,
+                                      runtime=runtime)
+        index_vendored_channel(staging_path, runtime=runtime)
+
+        index_files = [
+            manifest_entry(index_file.relative_to(staging_path).as_posix(), index_file)
+            for index_file in [staging_path / "channeldata.json", *sorted(staging_path.glob("*/*"))]
+            if index_file.name == "channeldata.json" or index_file.name in INDEX_FILES
+        ]
+        package_files = [
+            {"path": f"{pkg['subdir']}/{pkg['fn']}", "size": pkg.get("size"), "sha256": pkg["sha256"]}
+            for pkg in fetch_action_packages
+        ]
+        with ChannelArchiveWriter(archive_path, channel_name) as writer:
+            writer.add_manifest(index_files + package_files)
+            for entry in index_files:
+                writer.add_file(entry["path"], staging_path / entry["path"])
+
+            def _add_package(pkg, dest_file):
+                writer.add_file(f"{pkg['subdir']}/{pkg['fn']}", dest_file)
+                dest_file.unlink()
+
+            return download_solved_pkgs(fetch_action_packages, staging_path, None, jobs=jobs, cache_dir=cache_dir, on_package=_add_package,
+                                        host_limits=host_limits, bandwidth_limit=bandwidth_limit, runtime=runtime)
+
+# {(subdir, fn): repodata entry} of every package listed in the
+# repodata.json files of an existing vendored channel
+def read_vendored_packages(vendored_dir_path) -> dict:
+    vendored = {}
+    for repodata_file in sorted(Path(vendored_dir_path).glob("*/repodata.json")):
+        with open(repodata_file) as f:
+            repodata = json.load(f)
+        subdir = repodata_file.parent.name
+        for key in ("packages", "packages.conda"):
+            for fn, entry in repodata.get(key, {}).items():
+                vendored[(subdir, fn)] = entry
+    return vendored
+
+# compare a new solve with an existing vendored channel, returns the FETCH
+# actions to download as "added" (new, or listed but gone from disk) and
+# "changed" (same filename, different sha256), the "unchanged" FETCH
+# actions and the "removed" (subdir, fn) no longer in the solve
+def diff_fetch_actions(fetch_actions, vendored_dir_path, vendored=None) -> dict:
+    if vendored is None:
+        vendored = read_vendored_packages(vendored_dir_path)
+    diff = {"added": [], "changed": [], "unchanged": [], "removed": []}
+    for pkg in fetch_actions:
+        entry = vendored.get((pkg["subdir"], pkg["fn"]))
+        if entry is None or not (Path(vendored_dir_path) / pkg["subdir"] / pkg["fn"]).exists():
+            diff["added"].append(pkg)
+        elif entry.get("sha256") != pkg["sha256"]:
+            diff["changed"].append(pkg)
+        else:
+            diff["unchanged"].append(pkg)
+    solved = {(pkg["subdir"], pkg["fn"]) for pkg in fetch_actions}
+    diff["removed"] = sorted(vendored.keys() - solved)
+    return diff
+
+# add the repodata entries of packages that were kept although they are
+# no longer solved for, keyed (subdir, fn), back into the regenerated
+# repodata.json files of the channel
+def restore_vendored_entries(vendored_dir_path, entries):
+    by_subdir = defaultdict(dict)
+    for (subdir, fn), entry in entries.items():
+        by_subdir[subdir][fn] = entry
+    for subdir, subdir_entries in by_subdir.items():
+        repodata_file = Path(vendored_dir_path) / subdir / "repodata.json"
+        repodata = {}
+        if repodata_file.exists():
+            with open(repodata_file) as f:
+                repodata = json.load(f)
+        packages = repodata.get("packages", {})
+        packages_conda = repodata.get("packages.conda", {})
+        for fn, entry in subdir_entries.items():
+            (packages_conda if fn.endswith(".conda") else packages).setdefault(fn, entry)
+        write_repodata_json(repodata_file.parent, packages, packages_conda)
+
+# click parameter type for sizes like 512M or 50G, converted to bytes
+class ByteSize(click.ParamType):
+    name = "size"
+    units = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, int):
+            return value
+        text = str(value).strip().upper().rstrip("B").rstrip("I")
+        number, unit = text.rstrip("KMGT"), text[len(text.rstrip("KMGT")):]
+        try:
+            return int(float(number) * self.units[unit])
+        except (ValueError, KeyError):
+            self.fail(f"{value!r} is not a valid size, use e.g. 512M or 50G", param, ctx)
+
+def format_byte_size(size) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+# parse repeated HOST=SIZE options into {host: size}
+def parse_host_pool_sizes(host_pool_size_options, param_hint="--host-pool-size") -> dict:
+    host_pool_sizes = {}
+    for option in host_pool_size_options:
+        host, _, size = option.partition("=")
+        if not host or not size.isdigit() or int(size) < 1:
+            raise click.BadParameter(f"Expected HOST=SIZE, got \"{option}\"", param_hint=param_hint)
+        host_pool_sizes[host] = int(size)
+    return host_pool_sizes
+
+# the MirrorMap of a --mirrors file, None without one
+def read_mirror_map(mirrors_file):
+    if mirrors_file is None:
+        return None
+    try:
+        return load_mirror_map(mirrors_file)
+    except ValueError as err:
+        raise click.BadParameter(str(err), param_hint="--mirrors")
+
+# download, connection pool, mirror and cache options shared by the vendor
+# and update commands
+def download_options(command):
+    command = click.option(
+        "--repodata-max-age",
+        default=0,
+        type=click.IntRange(min=0),
+        help="Seconds a cached upstream repodata.json is used without revalidating it.")(command)
+    command = click.option(
+        "--repodata-cache-dir",
+        default=None,
+        envvar="CONDA_VENDOR_REPODATA_CACHE_DIR",
+        type=click.Path(file_okay=False),
+        help="Keep upstream repodata.json between runs and revalidate it with conditional requests.")(command)
+    command = click.option(
+        "--cache-dir",
+        default=None,
+        envvar="CONDA_VENDOR_CACHE_DIR",
+        type=click.Path(file_okay=False),
+        help="Content-addressed package cache shared across vendor runs.")(command)
+    command = click.option(
+        "--mirrors",
+        default=None,
+        envvar="CONDA_VENDOR_MIRRORS",
+        type=click.Path(exists=True, dir_okay=False),
+        help="YAML or JSON file mapping channel URLs to mirror base URLs. Downloads use the fastest healthy mirror and fail over on errors.")(command)
+    command = click.option(
+        "--bandwidth-limit",
+        default=None,
+        type=ByteSize(),
+        help="Cap the aggregate download bandwidth, in bytes per second, e.g. 50M.")(command)
+    command = click.option(
+        "--host-limit",
+        multiple=True,
+        metavar="HOST=N",
+        help="Download at most N packages in parallel from a single host, can be repeated.")(command)
+    command = click.option(
+        "--host-pool-size",
+        multiple=True,
+        metavar="HOST=SIZE",
+        help="Override the HTTP connection pool size for a single host, can be repeated.")(command)
+    command = click.option(
+        "--pool-size",
+        default=None,
+        type=click.IntRange(min=1),
+        help=f"HTTP connections kept alive per host. Defaults to --jobs, but at least {DEFAULT_POOL_SIZE}.")(command)
+    command = click.option(
+        "--jobs",
+        "--concurrency",
+        "-j",
+        default=4,
+        type=click.IntRange(min=1),
+        help="Number of packages to download in parallel.")(command)
+    return command
+
+# solve cache options shared by the vendor and ironbank-gen commands
+def solve_cache_options(command):
+    command = click.option(
+        "--no-solve-cache",
+        is_flag=True,
+        default=False,
+        help="Always run the solver, don't read or write the solve cache.")(command)
+    command = click.option(
+        "--solve-cache-ttl",
+        default=DEFAULT_SOLVE_CACHE_TTL,
+        type=click.IntRange(min=0),
+        show_default=True,
+        help="Seconds a cached solve is reused.")(command)
+    command = click.option(
+        "--solve-cache-dir",
+        default=lambda: str(get_default_cache_dir() / "solves"),
+        envvar="CONDA_VENDOR_SOLVE_CACHE_DIR",
+        type=click.Path(file_okay=False),
+        help="Directory of cached solve results.  [default: ~/.cache/conda-vendor/solves]")(command)
+    return command
+
+# --profile and --trace-file options shared by the vendor and ironbank-gen
+# commands. With either of them the command runs with profiling enabled and
+# prints a per-span summary at the end, also when it fails
+def profile_options(command):
+    @functools.wraps(command)
+    def _profiled_command(*args, profile, trace_file, **kwargs):
+        if not profile and trace_file is None:
+            return command(*args, **kwargs)
+
+        tracer = enable_profiling()
+        try:
+            with span(command.__name__):
+                return command(*args, **kwargs)
+        finally:
+            disable_profiling()
+            events = tracer.events
+            message("Profile Summary:", bold=True, fg='cyan')
+            message(format_summary(events))
+            emit("profile", spans=summarize(events))
+            if trace_file is not None:
+                write_chrome_trace(events, trace_file)
+                message(f"Trace written to {trace_file}", fg='cyan')
+
+    _profiled_command = click.option(
+        "--trace-file",
+        default=None,
+        type=click.Path(dir_okay=False, writable=True),
+        help="Write a Chrome trace-event JSON of the profiled spans to this file, implies --profile.")(_profiled_command)
+    _profiled_command = click.option(
+        "--profile",
+        is_flag=True,
+        default=False,
+        help="Time the solve, repodata and download stages and print a summary at the end.")(_profiled_command)
+    return _profiled_command
+
+# --quiet and --output options shared by the vendor and ironbank-gen commands
+def output_options(command):
+    @functools.wraps(command)
+    def _command_with_output(*args, quiet, output, **kwargs):
+        configure_output(mode=output, quiet=quiet)
+        try:
+            return command(*args, **kwargs)
+        finally:
+            configure_output()
+
+    _command_with_output = click.option(
+        "--output",
+        default="text",
+        show_default=True,
+        type=click.Choice(OUTPUT_MODES),
+        help="ndjson streams one compact JSON record per solved package, downloaded package and repodata.json to stdout, messages go to stderr.")(_command_with_output)
+    _command_with_output = click.option(
+        "--quiet",
+        "-q",
+        is_flag=True,
+        default=False,
+        help="Only print warnings and errors, no progress messages or progress bars.")(_command_with_output)
+    return _command_with_output
+
+# CondaVendorError is a plain exception for callers of the Python API, the
+# commands turn it into a click exception, so the CLI prints the message
+# and exits with 1
+def cli_errors(command):
+    @functools.wraps(command)
+    def _command_with_cli_errors(*args, **kwargs):
+        try:
+            return command(*args, **kwargs)
+        except CondaVendorError as err:
+            raise click.ClickException(str(err)) from err
+
+    return _command_with_cli_errors
 
 @click.group()
 @click.version_option(__version__)
@@ -255,8 +939,14 @@ def main() -> None:
 @click.command("vendor", help="Vendor dependencies into a local channel, given an environment file")
 @click.option(
     "--file",
+    "files",
+    multiple=True,
+    required=True,
+    help="Path to environment.yaml, a directory of them or a glob. Can be repeated to vendor several environments into one channel.")
+@click.option(
+    "--channel-name",
     default=None,
-    help="Path to environment.yaml")
+    help="Name of the vendored channel directory. Defaults to the environment name, or 'vendored-channel' for several environments.")
 @click.option(
     "--solver",
     default="conda",
@@ -264,8 +954,10 @@ def main() -> None:
 @click.option(
     "--platform",
     "-p",
-    default=get_conda_platform(),
-    help="Platform to solve for.")
+    "platforms",
+    multiple=True,
+    default=[get_conda_platform()],
+    help="Platform to solve for, can be repeated to vendor several platforms into one channel.")
 @click.option(
     "--dry-run",
     default=False,
@@ -274,53 +966,123 @@ def main() -> None:
     "--ironbank-gen",
     default=False,
     help="Save IronBank Resources 'ib_manifest.yaml' in current directory")
-def vendor(file,solver, platform, dry_run, ironbank_gen):
-
-    click.echo(click.style(f"Vendoring Local Channel for file: {file}", fg='green'))
-
-    # handle environment.yaml
-    environment_yaml = Path(file)
+@click.option(
+    "--cache-max-size",
+    default=None,
+    type=ByteSize(),
+    help="Evict least recently used packages after vendoring until the cache fits, e.g. 50G.")
+@click.option(
+    "--resume",
+    is_flag=True,
+    default=False,
+    help="Continue vendoring into an existing channel directory, only downloading missing or mismatched packages.")
+@click.option(
+    "--archive",
+    default=None,
+    type=click.Path(dir_okay=False, writable=True),
+    help="Stream the vendored channel into this archive instead of a directory, e.g. channel.tar.zst. See `conda-vendor import`.")
+@download_options
+@solve_cache_options
+@output_options
+@profile_options
+@cli_errors
+def vendor(files, channel_name, solver, platforms, dry_run, ironbank_gen, jobs, pool_size, host_pool_size, host_limit, bandwidth_limit,
+           mirrors, cache_dir, cache_max_size, resume, repodata_cache_dir, repodata_max_age, archive, solve_cache_dir, solve_cache_ttl, no_solve_cache):
+
+    # handle environment.yaml files
+    environment_yamls = expand_environment_files(files)
+    for environment_yaml in environment_yamls:
+        message(f"Vendoring Local Channel for file: {environment_yaml}", fg='green')
+    if channel_name is None and len(environment_yamls) > 1:
+        channel_name = "vendored-channel"
+
+    # share one connection pool between repodata.json and package downloads,
+    # a host limited to fewer downloads doesn't need more connections either
+    host_limits = parse_host_pool_sizes(host_limit, param_hint="--host-limit")
+    configure_session(
+        pool_size=pool_size or max(jobs, DEFAULT_POOL_SIZE),
+        host_pool_sizes={**host_limits, **parse_host_pool_sizes(host_pool_size)})
+    configure_mirrors(read_mirror_map(mirrors))
+
+    if archive is not None:
+        if resume:
+            raise click.BadParameter("can't be combined with --resume", param_hint="--archive")
+        try:
+            ChannelArchiveWriter.check_archive_path(archive)
+        except ArchiveError as err:
+            raise click.BadParameter(str(err), param_hint="--archive")
 
     # create vendored channel directory if dry_run=False
-    if not dry_run:
-        vendored_dir_path = create_vendored_dir(environment_yaml, platform)
-    else:
-        click.echo(click.style("Dry Run - Will Not Download Files", bold=True, fg='red'))
+    if dry_run:
+        message("Dry Run - Will Not Download Files", bold=True, fg='red')
+    elif archive is None:
+        vendored_dir_path = create_vendored_dir(environment_yamls[0], platforms, exist_ok=resume, channel_name=channel_name)
 
     # generate conda-locks LockSpecification
-    lock_spec = get_lock_spec_for_environment_file(environment_yaml)
-
-    # generate DryRunInstall
-    dry_run_install = solve_environment(lock_spec, solver, platform)
-
-    # generate List[FetchAction]
-    # a FetchAction object includes all the entries from the corresponding
-    # package's repodata.json
-    fetch_action_packages = get_fetch_actions(solver, platform, dry_run_install)
-
-    # generate hotfix repodata.json for each channel and subdir
-    if not dry_run:
-        hotfix_vendored_repodata_json(fetch_action_packages, vendored_dir_path)
-
-        # download and verify packages to appropriate subdir
-        download_solved_pkgs(fetch_action_packages, vendored_dir_path, platform)
-        click.echo(click.style(f"SHA256 Checksum Validation and Solved Packages Downloads Complete for {vendored_dir_path}", bold=True, fg='green'))
-
-        click.echo(click.style(f"Vendoring Complete!\nVendored Channel: {vendored_dir_path}", bold=True, fg='green'))
+    lock_specs = [get_lock_spec_for_environment_file(environment_yaml) for environment_yaml in environment_yamls]
+
+    # generate List[FetchAction] for all environments and platforms, solving
+    # in parallel unless a cached solve is still valid
+    fetch_action_packages = solve_environments(lock_specs, solver, list(platforms),
+                                               solve_cache_dir=None if no_solve_cache else solve_cache_dir,
+                                               solve_cache_ttl=solve_cache_ttl)
+    emit_fetch_actions(fetch_action_packages)
+
+    if not dry_run and archive is not None:
+        archive_vendored_channel(fetch_action_packages, archive, channel_name or get_environment_name(environment_yamls[0]),
+                                 jobs=jobs, cache_dir=cache_dir, repodata_cache_dir=repodata_cache_dir, repodata_max_age=repodata_max_age,
+                                 host_limits=host_limits, bandwidth_limit=bandwidth_limit)
+        if cache_dir is not None and cache_max_size is not None:
+            _prune_package_cache(cache_dir, cache_max_size)
+
+        message(f"Vendoring Complete!\nChannel Archive: {archive}", bold=True, fg='green')
+        emit("done", archive=str(archive), packages=len(fetch_action_packages))
+    elif not dry_run:
+        vendor_fetch_actions(fetch_action_packages, vendored_dir_path, jobs=jobs, cache_dir=cache_dir, skip_existing=resume,
+                             repodata_cache_dir=repodata_cache_dir, repodata_max_age=repodata_max_age,
+                             host_limits=host_limits, bandwidth_limit=bandwidth_limit)
+
+        if cache_dir is not None and cache_max_size is not None:
+            _prune_package_cache(cache_dir, cache_max_size)
+
+        message(f"Vendoring Complete!\nVendored Channel: {vendored_dir_path}", bold=True, fg='green')
+        emit("done", channel=str(vendored_dir_path), packages=len(fetch_action_packages))
     else:
-        click.echo(click.style("Dry Run Complete!", bold=True, fg='red'))
-        json_formatted_packages = json.dumps(fetch_action_packages, indent=4)
-        click.echo(click.style(json_formatted_packages, fg='green'))
+        message("Dry Run Complete!", bold=True, fg='red')
+        # the FETCH actions are the result of a dry run, ndjson already streamed them
+        if not is_ndjson():
+            click.echo(json.dumps(fetch_action_packages, indent=4))
+        emit("done", channel=None, packages=len(fetch_action_packages))
 
     if ironbank_gen:
-        click.echo(click.style("Generating IronBank Resources Formatted Text Below:", bold=True, fg='cyan'))
+        message("Generating IronBank Resources Formatted Text Below:", bold=True, fg='cyan')
         yaml_dump_ironbank_manifest(fetch_action_packages)
 
-@click.command("ironbank-gen", help="Generate Formatted Text to use in IronBank's Hardening Manifest")
+@click.command("ironbank-gen", help="Generate Formatted Text to use in IronBank's Hardening Manifest. "
+                                     "Solves --file, or reads the packages of a vendored channel, a saved dry run or a lockfile without solving")
 @click.option(
     "--file",
     default=None,
     help="Path to environment.yaml")
+@click.option(
+    "--channel-dir",
+    default=None,
+    type=click.Path(exists=True, file_okay=False),
+    help="Vendored channel to read the packages from, together with --channel-url.")
+@click.option(
+    "--channel-url",
+    default=None,
+    help="Upstream channel the --channel-dir packages were vendored from, e.g. https://conda.anaconda.org/conda-forge")
+@click.option(
+    "--dry-run-json",
+    default=None,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Saved output of `conda-vendor vendor --dry-run True`, text or ndjson.")
+@click.option(
+    "--lockfile",
+    default=None,
+    type=click.Path(exists=True, dir_okay=False),
+    help="conda-lock.yml lockfile to read the packages from.")
 @click.option(
     "--solver",
     default="conda",
@@ -330,26 +1092,270 @@ def vendor(file,solver, platform, dry_run, ironbank_gen):
     "-p",
     default=get_conda_platform(),
     help="Platform to solve for.")
-def ironbank_gen(file, solver, platform):
-    click.echo(click.style("Generating Formatted Text for IronBank Hardening Manifest", bold=True, fg='green'))
+@solve_cache_options
+@output_options
+@profile_options
+@cli_errors
+def ironbank_gen(file, channel_dir, channel_url, dry_run_json, lockfile, solver, platform, solve_cache_dir, solve_cache_ttl, no_solve_cache):
+    sources = {"--file": file, "--channel-dir": channel_dir, "--dry-run-json": dry_run_json, "--lockfile": lockfile}
+    given = [option for option, value in sources.items() if value is not None]
+    if len(given) != 1:
+        raise click.UsageError(f"Give exactly one of {', '.join(sources)}")
+    if (channel_dir is None) != (channel_url is None):
+        raise click.UsageError("--channel-dir and --channel-url go together, repodata.json doesn't record the upstream channel")
+
+    message("Generating Formatted Text for IronBank Hardening Manifest", bold=True, fg='green')
+    if file is None:
+        import yaml
+
+        # no solve, the resources are written as they are read
+        if channel_dir is not None:
+            resources = iter_channel_resources(channel_dir, channel_url)
+        elif dry_run_json is not None:
+            resources = iter_dry_run_resources(dry_run_json)
+        else:
+            resources = iter_lockfile_resources(lockfile)
+        try:
+            count = yaml_dump_ironbank_manifest(resources)
+        except (ValueError, KeyError, yaml.YAMLError) as err:
+            raise click.BadParameter(f"Can't read packages: {err}", param_hint=given[0])
+        message(f"Wrote {count} Resources to ib_manifest.yaml", fg='green')
+        return
+
      # handle environment.yaml
     environment_yaml = Path(file)
 
     # generate conda-locks LockSpecification
     lock_spec = get_lock_spec_for_environment_file(environment_yaml)
 
-    # generate DryRunInstall
-    dry_run_install = solve_environment(lock_spec, solver, platform)
-
-    # generate List[FetchAction]
-    # a FetchAction object includes all the entries from the corresponding
-    # package's repodata.json
-    fetch_action_packages = get_fetch_actions(solver, platform, dry_run_install)
+    # generate List[FetchAction], solving unless a cached solve is still valid
+    fetch_action_packages = solve_fetch_actions(lock_spec, solver, platform,
+                                                solve_cache_dir=None if no_solve_cache else solve_cache_dir,
+                                                solve_cache_ttl=solve_cache_ttl)
+    emit_fetch_actions(fetch_action_packages)
 
     yaml_dump_ironbank_manifest(fetch_action_packages)
 
+def _prune_package_cache(cache_dir, max_size):
+    removed, freed = prune_cache(cache_dir, max_size)
+    message(f"Evicted {removed} Packages ({format_byte_size(freed)}) from Cache {cache_dir}", fg='green')
+
+@click.group("cache", help="Manage the content-addressed package cache")
+def cache():
+    pass
+
+@cache.command("stats", help="Show the number of cached packages and their total size")
+@click.option(
+    "--cache-dir",
+    required=True,
+    envvar="CONDA_VENDOR_CACHE_DIR",
+    type=click.Path(file_okay=False),
+    help="Package cache directory.")
+@cli_errors
+def cache_stats_command(cache_dir):
+    stats = cache_stats(cache_dir)
+    click.echo(f"Cache Directory: {stats['cache_dir']}")
+    click.echo(f"Packages: {stats['entries']}")
+    click.echo(f"Size: {format_byte_size(stats['size'])}")
+    if stats['entries']:
+        click.echo(f"Least Recently Used: {time.ctime(stats['oldest'])}")
+        click.echo(f"Most Recently Used: {time.ctime(stats['newest'])}")
+
+@cache.command("prune", help="Evict least recently used packages until the cache fits in --max-size")
+@click.option(
+    "--cache-dir",
+    required=True,
+    envvar="CONDA_VENDOR_CACHE_DIR",
+    type=click.Path(file_okay=False),
+    help="Package cache directory.")
+@click.option(
+    "--max-size",
+    required=True,
+    type=ByteSize(),
+    help="Maximum cache size, e.g. 50G. Use 0 to empty the cache.")
+@cli_errors
+def cache_prune_command(cache_dir, max_size):
+    _prune_package_cache(cache_dir, max_size)
+
+@click.command("verify", help="Verify every package of a vendored channel against its repodata.json. "
+                                "Exits with 4 for missing, 8 for extra and 16 for corrupt packages, or'ed together")
+@click.option(
+    "--channel-dir",
+    required=True,
+    type=click.Path(exists=True, file_okay=False),
+    help="Path to the vendored channel, the directory holding the <platform>/ and noarch/ subdirs.")
+@click.option(
+    "--jobs",
+    "-j",
+    default=None,
+    type=click.IntRange(min=1),
+    help="Number of processes hashing packages in parallel.  [default: number of CPUs]")
+@output_options
+@cli_errors
+def verify(channel_dir, jobs):
+    message(f"Verifying Vendored Channel: {channel_dir}", bold=True, fg='green')
+
+    def _on_result(subdir, fn, status):
+        emit("verify", subdir=subdir, fn=fn, status=status)
+        if status != "ok":
+            warning(f"{status.capitalize()} Package: {subdir}/{fn}", subdir=subdir, fn=fn, status=status)
+
+    results = verify_channel(channel_dir, jobs=jobs, on_result=_on_result)
+    message(f"Verified {len(results['ok'])} Packages, {len(results['missing'])} Missing, {len(results['extra'])} Extra, {len(results['corrupt'])} Corrupt",
+            bold=True, fg='green' if verify_exit_code(results) == 0 else 'red')
+    emit("done", **{status: len(packages) for status, packages in results.items()})
+    sys.exit(verify_exit_code(results))
+
+@click.command("update", help="Update an existing vendored channel after the environment file changed, only downloading added or changed packages")
+@click.option(
+    "--file",
+    "files",
+    multiple=True,
+    required=True,
+    help="Path to environment.yaml, a directory of them or a glob. Can be repeated.")
+@click.option(
+    "--channel-dir",
+    required=True,
+    type=click.Path(exists=True, file_okay=False),
+    help="Path to the vendored channel to update.")
+@click.option(
+    "--solver",
+    default="conda",
+    help="Solver to use. conda, mamba, micromamba")
+@click.option(
+    "--platform",
+    "-p",
+    "platforms",
+    multiple=True,
+    help="Platform to solve for, can be repeated. Defaults to the platforms already in the channel.")
+@click.option(
+    "--prune",
+    is_flag=True,
+    default=False,
+    help="Delete packages that are no longer solved for. By default they are kept and stay in repodata.json.")
+@click.option(
+    "--report",
+    default=None,
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write the change report to this JSON file.  [default: <channel-dir>/update-report.json]")
+@download_options
+@solve_cache_options
+@output_options
+@profile_options
+@cli_errors
+def update(files, channel_dir, solver, platforms, prune, report, jobs, pool_size, host_pool_size, host_limit, bandwidth_limit, mirrors, cache_dir, repodata_cache_dir, repodata_max_age,
+           solve_cache_dir, solve_cache_ttl, no_solve_cache):
+    channel_dir = Path(channel_dir)
+    environment_yamls = expand_environment_files(files)
+    if not platforms:
+        platforms = [path.parent.name for path in sorted(channel_dir.glob("*/repodata.json")) if path.parent.name != "noarch"]
+        platforms = platforms or [get_conda_platform()]
+    message(f"Updating Vendored Channel {channel_dir} for Platforms: {', '.join(platforms)}", bold=True, fg='green')
+
+    host_limits = parse_host_pool_sizes(host_limit, param_hint="--host-limit")
+    configure_session(
+        pool_size=pool_size or max(jobs, DEFAULT_POOL_SIZE),
+        host_pool_sizes={**host_limits, **parse_host_pool_sizes(host_pool_size)})
+    configure_mirrors(read_mirror_map(mirrors))
+    lock_specs = [get_lock_spec_for_environment_file(environment_yaml) for environment_yaml in environment_yamls]
+    fetch_action_packages = solve_environments(lock_specs, solver, list(platforms),
+                                               solve_cache_dir=None if no_solve_cache else solve_cache_dir,
+                                               solve_cache_ttl=solve_cache_ttl)
+    emit_fetch_actions(fetch_action_packages)
+
+    vendored = read_vendored_packages(channel_dir)
+    diff = diff_fetch_actions(fetch_action_packages, channel_dir, vendored)
+    message(f"{len(diff['added'])} Added, {len(diff['changed'])} Changed, {len(diff['unchanged'])} Unchanged and {len(diff['removed'])} Removed Packages",
+            bold=True, fg='cyan')
+
+    to_download = diff["added"] + diff["changed"]
+    for subdir in {pkg["subdir"] for pkg in fetch_action_packages}:
+        (channel_dir / subdir).mkdir(exist_ok=True)
+    if to_download:
+        download_solved_pkgs(to_download, channel_dir, platforms, jobs=jobs, cache_dir=cache_dir,
+                             host_limits=host_limits, bandwidth_limit=bandwidth_limit)
+
+    hotfix_vendored_repodata_json(fetch_action_packages, channel_dir,
+                                  repodata_cache_dir=repodata_cache_dir, repodata_max_age=repodata_max_age, jobs=jobs)
+
+    if prune:
+        for subdir, fn in diff["removed"]:
+            pkg_file = channel_dir / subdir / fn
+            if pkg_file.exists():
+                pkg_file.unlink()
+        # subdirs left without any solved package still need a valid repodata.json
+        solved_subdirs = {pkg["subdir"] for pkg in fetch_action_packages}
+        for subdir in {subdir for subdir, _ in diff["removed"]} - solved_subdirs:
+            write_repodata_json(channel_dir / subdir, {}, {})
+    else:
+        restore_vendored_entries(channel_dir, {key: vendored[key] for key in diff["removed"]})
+    index_vendored_channel(channel_dir)
+
+    change_report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment_files": [str(environment_yaml) for environment_yaml in environment_yamls],
+        "platforms": list(platforms),
+        "added": [{"subdir": pkg["subdir"], "fn": pkg["fn"], "size": pkg.get("size")} for pkg in diff["added"]],
+        "changed": [{"subdir": pkg["subdir"], "fn": pkg["fn"], "size": pkg.get("size")} for pkg in diff["changed"]],
+        "removed": [{"subdir": subdir, "fn": fn} for subdir, fn in diff["removed"]],
+        "unchanged": len(diff["unchanged"]),
+        "pruned": prune,
+        "download_size": sum(pkg.get("size") or 0 for pkg in to_download),
+    }
+    report = Path(report) if report is not None else channel_dir / "update-report.json"
+    with open(report, "w") as f:
+        json.dump(change_report, f, indent=2)
+
+    message(f"Update Complete! Downloaded {len(to_download)} Packages ({format_byte_size(change_report['download_size'])}), Report: {report}",
+            bold=True, fg='green')
+    emit("done", channel=str(channel_dir), report=str(report), added=len(diff["added"]), changed=len(diff["changed"]),
+         removed=len(diff["removed"]), unchanged=len(diff["unchanged"]))
+
+@click.command("import", help="Extract a channel archive written by `conda-vendor vendor --archive`, verifying every file on the way. "
+                                "Exits with 4 for missing, 8 for extra and 16 for corrupt files, or'ed together")
+@click.option(
+    "--archive",
+    required=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Channel archive, e.g. channel.tar.zst")
+@click.option(
+    "--dest",
+    default=".",
+    show_default=True,
+    type=click.Path(file_okay=False),
+    help="Directory to extract the vendored channel into.")
+@output_options
+@cli_errors
+def import_command(archive, dest):
+    message(f"Importing Channel Archive: {archive}", bold=True, fg='green')
+
+    def _on_file(path, status):
+        emit("import", path=path, status=status)
+        if status != "ok":
+            warning(f"{status.capitalize()} File: {path}", path=path, status=status)
+
+    try:
+        channel_dir, results = import_archive(archive, dest, on_file=_on_file)
+    except ArchiveTruncatedError as err:
+        # what was extracted is verified, the rest is reported missing
+        warning(str(err), archive=str(archive))
+        channel_dir, results = err.channel_dir, err.results
+    except ArchiveError as err:
+        sys.exit(str(err))
+    for path in results["missing"]:
+        warning(f"Missing File: {path}", path=path, status="missing")
+
+    message(f"Imported {len(results['ok'])} Files into {channel_dir}, {len(results['missing'])} Missing, {len(results['extra'])} Extra, {len(results['corrupt'])} Corrupt",
+            bold=True, fg='green' if verify_exit_code(results) == 0 else 'red')
+    emit("done", channel=str(channel_dir), **{status: len(paths) for status, paths in results.items()})
+    sys.exit(verify_exit_code(results))
+
 main.add_command(vendor)
 main.add_command(ironbank_gen)
+main.add_command(import_command)
+main.add_command(update)
+main.add_command(verify)
+main.add_command(cache)
 
 if __name__ == "main":
     main()
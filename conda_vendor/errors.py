@@ -0,0 +1,16 @@
+# errors raised by conda-vendor. Callers of the Python API (see
+# conda_vendor.api) catch them like any other exception, the CLI commands
+# turn them into a click exception (see cli_errors in conda_vendor.py)
+
+
+class CondaVendorError(Exception):
+    pass
+
+
+class SolveError(CondaVendorError):
+    pass
+
+
+# also a RuntimeError, which a checksum mismatch raised before
+class ChecksumError(CondaVendorError, RuntimeError):
+    pass
@@ -0,0 +1,132 @@
+# placing files without copying their bytes when the filesystem allows it,
+# writing them atomically, hashing them, and resolving file:// and
+# plain-path channel URLs to local paths
+import errno
+import hashlib
+import mmap
+import os
+import shutil
+import sys
+import uuid
+from pathlib import Path
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+# ioctl(dst, FICLONE, src) shares the extents of src with dst on
+# copy-on-write filesystems (btrfs, XFS with reflink=1, ...), see ioctl_ficlone(2)
+FICLONE = 0x40049409
+
+# errors that mean "not supported here", try the next strategy
+_UNSUPPORTED = {errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS, errno.EMLINK}
+
+
+# write path through write(f) into a uniquely named temporary file next to
+# it, which replaces path once complete and is removed on any error
+def write_atomic(path, write):
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+    try:
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+
+
+# hashlib object over the contents of path, read through a memory map: the
+# kernel pages the file in with read-ahead and no bytes are copied into
+# Python objects. Callers can keep updating it, e.g. to resume a download
+def file_hasher(path, algorithm="sha256", chunk_size=16 * 1024 * 1024):
+    hasher = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        # an empty file can't be mapped
+        if size == 0:
+            return hasher
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, size, chunk_size):
+                    hasher.update(view[offset:offset + chunk_size])
+            finally:
+                view.release()
+    return hasher
+
+
+# hex digest of the contents of path, sha256 unless algorithm says otherwise
+def hash_file(path, algorithm="sha256", chunk_size=16 * 1024 * 1024) -> str:
+    return file_hasher(path, algorithm, chunk_size).hexdigest()
+
+
+# local path of a file:// URL or a plain path, None for remote URLs
+def local_path_for_url(url):
+    if url.startswith("file://"):
+        return Path(url2pathname(urlparse(url).path))
+    if "://" not in url and (url.startswith(("/", "~", ".")) or Path(url).drive):
+        return Path(url).expanduser()
+    return None
+
+
+# file:// URL of a plain-path channel, any other URL is returned unchanged
+def normalize_channel_url(channel):
+    path = local_path_for_url(channel)
+    if path is None or channel.startswith("file://"):
+        return channel
+    return path.resolve().as_uri()
+
+
+def _reflink(src, dst):
+    import fcntl
+
+    with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+        fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+
+
+# in-kernel copy, the bytes never pass through user space
+def _copy_file_range(src, dst, chunk_size=1024 ** 3):
+    with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+        size = os.fstat(src_file.fileno()).st_size
+        copied = 0
+        while copied < size:
+            copied += os.copy_file_range(src_file.fileno(), dst_file.fileno(), min(chunk_size, size - copied))
+
+
+# copy src to dst as cheaply as the platform allows: reflink, then
+# copy_file_range, then shutil.copyfile (which uses sendfile on Linux),
+# returns the strategy used
+def clone_or_copy(src, dst) -> str:
+    strategies = []
+    if sys.platform.startswith("linux"):
+        strategies.append(("reflink", _reflink))
+    if hasattr(os, "copy_file_range"):
+        strategies.append(("copy_file_range", _copy_file_range))
+    for name, strategy in strategies:
+        try:
+            strategy(src, dst)
+            return name
+        except OSError as err:
+            if err.errno not in _UNSUPPORTED:
+                raise
+    shutil.copyfile(src, dst)
+    return "copy"
+
+
+# hardlink src to dst, cloning or copying instead when a hardlink is not
+# possible (e.g. on different filesystems), returns the strategy used.
+# dst only appears under its final name once it is complete
+def link_or_copy(src, dst) -> str:
+    dst = Path(dst)
+    tmp_dst = dst.with_name(f".{dst.name}.{uuid.uuid4().hex}.part")
+    try:
+        try:
+            os.link(src, tmp_dst)
+            strategy = "hardlink"
+        except OSError:
+            strategy = clone_or_copy(src, tmp_dst)
+        os.replace(tmp_dst, dst)
+    except BaseException:
+        if tmp_dst.exists():
+            tmp_dst.unlink()
+        raise
+    return strategy
@@ -0,0 +1,213 @@
+# index files of a vendored channel next to each subdir's repodata.json, so
+# conda and mamba clients take their fast paths against it:
+#
+#   <subdir>/repodata.json.zst    compressed copies, mamba and conda >= 23
+#   <subdir>/repodata.json.bz2    prefer them over the plain repodata.json
+#   <subdir>/current_repodata.json  only the newest version of each package,
+#                                 conda tries it before the full repodata.json
+#   channeldata.json              per package summary across all subdirs
+#
+# noarch/repodata.json is always written, conda expects it even when no
+# package is noarch
+import bz2
+import json
+import re
+from pathlib import Path
+
+from conda_vendor.compression import zstandard
+from conda_vendor.fileutils import write_atomic
+from conda_vendor.profiling import span
+
+# zstd level used by conda-index for repodata.json.zst
+ZSTD_LEVEL = 16
+
+_VERSION_PART = re.compile(r"\d+|[A-Za-z]+")
+
+# version constraint of a dependency, e.g. >=1.2 or 1.2.*
+_CONSTRAINT = re.compile(r"(==|!=|<=|>=|~=|<|>|=)?(.*)")
+
+_COMPARISONS = {
+    "==": lambda key, other: key == other,
+    "!=": lambda key, other: key != other,
+    "<=": lambda key, other: key <= other,
+    ">=": lambda key, other: key >= other,
+    "<": lambda key, other: key < other,
+    ">": lambda key, other: key > other,
+}
+
+
+# parts of a version without epoch and local version, numbers rank above
+# letters, "dev" below and "post" above everything else
+def _version_parts(version) -> list:
+    parts = []
+    for component in re.split(r"[._-]", version):
+        for part in _VERSION_PART.findall(component):
+            if part.isdigit():
+                parts.append((2, int(part), ""))
+            elif part == "dev":
+                parts.append((0, 0, part))
+            elif part == "post":
+                parts.append((3, 0, part))
+            else:
+                parts.append((1, 0, part))
+    return parts
+
+
+def _pad(parts, length) -> tuple:
+    return tuple(parts + [(2, 0, "")] * (length - len(parts)))
+
+
+# (epoch, parts, local version parts) of [<epoch>!]<version>[+<local>]
+def _split_version(version):
+    epoch, _, version = str(version).strip().lower().rpartition("!")
+    version, _, local = version.partition("+")
+    return int(epoch) if epoch.isdigit() else 0, _version_parts(version), _version_parts(local)
+
+
+# sort key approximating conda's VersionOrder. The epoch compares first,
+# the local version after "+" only breaks ties. Missing parts count as 0,
+# so 1.0 == 1.0.0 and 1.0.dev1 < 1.0
+def version_key(version, parts=16):
+    epoch, main, local = _split_version(version)
+    return epoch, _pad(main, parts), _pad(local, parts)
+
+
+# whether version is prefix, or prefix.* as conda writes it
+def _version_startswith(version, prefix) -> bool:
+    epoch, main, _ = _split_version(version)
+    prefix_epoch, prefix_main, _ = _split_version(prefix)
+    return epoch == prefix_epoch and _pad(main, len(prefix_main))[:len(prefix_main)] == tuple(prefix_main)
+
+
+def _matches_constraint(version, constraint) -> bool:
+    operator, other = _CONSTRAINT.fullmatch(constraint).groups()
+    if other.rstrip(".*") == "":
+        return True
+    if other.endswith("*"):
+        other = other.rstrip("*").rstrip(".")
+        if operator == "!=":
+            return not _version_startswith(version, other)
+        if operator in (None, "=", "=="):
+            return _version_startswith(version, other)
+    elif operator in (None, "="):
+        # a version without operator matches every version it starts
+        return _version_startswith(version, other)
+    if operator == "~=":
+        return version_key(version) >= version_key(other) and _version_startswith(version, other.rsplit(".", 1)[0])
+    return _COMPARISONS[operator](version_key(version), version_key(other))
+
+
+# whether version satisfies the version spec of a dependency, e.g.
+# ">=3.8,<3.9.0a0" or "1.2.*|1.3.*". Specs this doesn't understand match
+# any version
+def version_matches(version, spec) -> bool:
+    if "(" in spec:
+        return True
+    return any(all(_matches_constraint(version, constraint) for constraint in alternative.split(","))
+               for alternative in spec.split("|"))
+
+
+def _write_bytes_atomic(path, data):
+    write_atomic(path, lambda f: f.write(data))
+
+
+# (packages key, filename, package name, record) of every package, the name
+# falls back to the one in the <name>-<version>-<build> filename
+def _records(repodata):
+    for key in ("packages", "packages.conda"):
+        for fn, record in repodata.get(key, {}).items():
+            yield key, fn, record.get("name") or fn.rsplit("-", 2)[0], record
+
+
+# repodata with only the newest version of each package name, every build
+# of that version is kept. Like conda-index, a dependency the newest
+# versions don't satisfy keeps the newest version of it that does, so
+# conda can still solve against current_repodata.json. Build string
+# constraints are not checked
+def current_repodata(repodata) -> dict:
+    versions = {}
+    by_name = {}
+    for packages_key, fn, name, record in _records(repodata):
+        versions[packages_key, fn] = version_key(record.get("version", ""))
+        by_name.setdefault(name, []).append((packages_key, fn, record))
+
+    kept = set()
+    pending = []
+
+    # every build of the newest version among entries
+    def _keep_newest(entries):
+        newest = max(versions[packages_key, fn] for packages_key, fn, _ in entries)
+        for packages_key, fn, record in entries:
+            if versions[packages_key, fn] == newest and (packages_key, fn) not in kept:
+                kept.add((packages_key, fn))
+                pending.append(record)
+
+    for entries in by_name.values():
+        _keep_newest(entries)
+    while pending:
+        for dependency in pending.pop().get("depends", []):
+            name, _, spec = dependency.strip().partition(" ")
+            spec = spec.strip().split(" ", 1)[0] or "*"
+            candidates = [entry for entry in by_name.get(name, []) if version_matches(entry[2].get("version", ""), spec)]
+            if candidates and not any((packages_key, fn) in kept for packages_key, fn, _ in candidates):
+                _keep_newest(candidates)
+
+    current = {"info": repodata.get("info", {}), "packages": {}, "packages.conda": {}}
+    for packages_key, fn, _, record in _records(repodata):
+        if (packages_key, fn) in kept:
+            current[packages_key][fn] = record
+    return current
+
+
+# write the compressed copies and current_repodata.json of subdir_dir's
+# repodata.json
+def write_subdir_index(subdir_dir):
+    subdir_dir = Path(subdir_dir)
+    with span("write_subdir_index", subdir=subdir_dir.name) as span_args:
+        data = (subdir_dir / "repodata.json").read_bytes()
+        span_args["bytes"] = len(data)
+        _write_bytes_atomic(subdir_dir / "repodata.json.bz2", bz2.compress(data, 9))
+        if zstandard is not None:
+            _write_bytes_atomic(subdir_dir / "repodata.json.zst", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data))
+        elif (subdir_dir / "repodata.json.zst").exists():
+            # clients prefer .zst, a stale copy of an earlier run must go
+            (subdir_dir / "repodata.json.zst").unlink()
+        repodata = json.loads(data)
+        _write_bytes_atomic(subdir_dir / "current_repodata.json", json.dumps(current_repodata(repodata)).encode())
+    return repodata
+
+
+# channeldata.json of the {subdir: repodata} of a channel
+def channeldata(subdir_repodata) -> dict:
+    packages = {}
+    for subdir, repodata in sorted(subdir_repodata.items()):
+        for _, _, name, record in _records(repodata):
+            entry = packages.setdefault(name, {"subdirs": [], "version": None, "timestamp": 0})
+            if subdir not in entry["subdirs"]:
+                entry["subdirs"].append(subdir)
+            if entry["version"] is None or version_key(record.get("version", "")) > version_key(entry["version"]):
+                entry["version"] = record.get("version")
+                for field in ("license", "license_family"):
+                    if record.get(field):
+                        entry[field] = record[field]
+            entry["timestamp"] = max(entry["timestamp"], record.get("timestamp", 0))
+    return {
+        "channeldata_version": 1,
+        "subdirs": sorted(subdir_repodata),
+        "packages": dict(sorted(packages.items())),
+    }
+
+
+# index every subdir directory of channel_dir, noarch and any subdir
+# without a repodata.json get an empty one. Returns the indexed subdirs
+def write_channel_index(channel_dir):
+    channel_dir = Path(channel_dir)
+    (channel_dir / "noarch").mkdir(exist_ok=True)
+    subdir_repodata = {}
+    for subdir_dir in sorted(path for path in channel_dir.iterdir() if path.is_dir() and not path.name.startswith(".")):
+        if not (subdir_dir / "repodata.json").exists():
+            empty = {"info": {"subdir": subdir_dir.name}, "packages": {}, "packages.conda": {}}
+            _write_bytes_atomic(subdir_dir / "repodata.json", json.dumps(empty).encode())
+        subdir_repodata[subdir_dir.name] = write_subdir_index(subdir_dir)
+    _write_bytes_atomic(channel_dir / "channeldata.json", json.dumps(channeldata(subdir_repodata), indent=2).encode())
+    return sorted(subdir_repodata)
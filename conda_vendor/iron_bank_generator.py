@@ -1,29 +1,139 @@
-# this generates formatted text to insert into the DoD IronBank's 
+# this generates formatted text to insert into the DoD IronBank's
 # hardening_manifest.yaml "resources" block
-import click
-import sys
-from ruamel.yaml import YAML
-
-# dump ironbank resources yaml block to stdout
-def yaml_dump_ironbank_manifest(fetch_action_packages):
-    click.echo(click.style("You can copy this text below to your IronBank Hardening Manifest", bold=True, fg='cyan'))
-    # IronBank formatted 'resources' block
-    resources = {
-        "resources": [],
+# resources come from a fresh solve, or without solving from a vendored
+# channel's repodata.json files, a saved dry run or a conda-lock lockfile.
+# Entries are written to ib_manifest.yaml one by one as they are read
+import json
+from pathlib import Path
+from conda_vendor.fileutils import write_atomic
+from conda_vendor.output import message
+
+# resources dumped to the manifest at a time, bounding memory for large channels
+RESOURCES_PER_DUMP = 1000
+
+
+# IronBank resource entry of a FETCH action (or any dict with url, fn and sha256)
+def _resource(pkg) -> dict:
+    return {
+        "url": pkg["url"],
+        "filename": pkg["fn"],
+        "validation": {"type": "sha256", "value": pkg["sha256"]},
     }
-    
-    for pkg in fetch_action_packages:
-        validation = {
-            "type": "sha256",
-            "value": pkg["sha256"]
-        }
-        resource = {
-            "url": pkg["url"],
-            "filename": pkg["fn"],
-            "validation": validation
-        }
-
-        resources["resources"].append(resource)
-    yaml = YAML()
-    with open("ib_manifest.yaml", 'w') as f:
-        ironbank_resources = yaml.dump(resources, f)
+
+
+# the safe dumper runs on ruamel.yaml.clib's emitter when it is installed
+def _manifest_yaml():
+    from ruamel.yaml import YAML
+
+    yaml = YAML(typ="safe")
+    yaml.default_flow_style = False
+    # url, filename, validation, in the order of IronBank's documentation
+    yaml.sort_base_mapping_type_on_output = False
+    return yaml
+
+
+# dump ironbank resources yaml block to ib_manifest.yaml, fetch_action_packages
+# may be any iterable and is consumed as it is written. The manifest only
+# replaces a previous one once every entry is written
+def yaml_dump_ironbank_manifest(fetch_action_packages, manifest_file="ib_manifest.yaml") -> int:
+    message("You can copy this text below to your IronBank Hardening Manifest", bold=True, fg='cyan')
+    yaml = _manifest_yaml()
+    # IronBank formatted 'resources' block, the entries of each dump
+    # continue the list under it
+    count = 0
+    seen_urls = set()
+
+    def _write(f):
+        nonlocal count
+        resources = []
+
+        def _dump():
+            nonlocal count
+            if resources:
+                if count == 0:
+                    f.write(b"resources:\n")
+                yaml.dump(resources, f)
+                count += len(resources)
+                resources.clear()
+
+        for pkg in fetch_action_packages:
+            # noarch packages show up once per platform
+            if pkg["url"] in seen_urls:
+                continue
+            seen_urls.add(pkg["url"])
+            resources.append(_resource(pkg))
+            if len(resources) == RESOURCES_PER_DUMP:
+                _dump()
+        _dump()
+        if count == 0:
+            f.write(b"resources: []\n")
+
+    write_atomic(Path(manifest_file), _write)
+    return count
+
+
+# packages listed in the repodata.json files of a vendored channel, with
+# their URLs below channel_url, the channel they were vendored from
+def iter_channel_resources(channel_dir, channel_url):
+    repodata_files = sorted(Path(channel_dir).glob("*/repodata.json"))
+    if not repodata_files:
+        raise ValueError(f"{channel_dir} has no <subdir>/repodata.json, is it a vendored channel?")
+    for repodata_file in repodata_files:
+        subdir = repodata_file.parent.name
+        with open(repodata_file, "rb") as f:
+            repodata = json.load(f)
+        for key in ("packages", "packages.conda"):
+            for fn, entry in repodata.get(key, {}).items():
+                if not entry.get("sha256"):
+                    raise ValueError(f"{subdir}/{fn} has no sha256 in {repodata_file}")
+                yield {"url": f"{channel_url.rstrip('/')}/{subdir}/{fn}", "fn": fn, "sha256": entry["sha256"]}
+
+
+# FETCH actions saved from `conda-vendor vendor --dry-run True`, the JSON
+# list of the text output, with or without the progress messages before
+# it, or the fetch_action events of --output ndjson
+def iter_dry_run_resources(dry_run_file):
+    with open(dry_run_file) as f:
+        text = f.read()
+    text = text.lstrip()
+    start = 0 if text.startswith("[") else text.find("\n[") + 1
+    fetch_actions = None
+    if text[start:].startswith("["):
+        try:
+            # ignore any messages after the list as well
+            fetch_actions, _ = json.JSONDecoder().raw_decode(text, start)
+        except ValueError:
+            pass
+    if isinstance(fetch_actions, list):
+        yield from fetch_actions
+        return
+
+    found = False
+    for line in text.splitlines():
+        if not line.startswith("{"):
+            continue
+        event = json.loads(line)
+        if event.get("event") == "fetch_action":
+            found = True
+            yield event
+    if not found:
+        raise ValueError(f"{dry_run_file} holds neither a JSON list of FETCH actions nor fetch_action events")
+
+
+# conda packages of a conda-lock lockfile (the conda-lock.yml format),
+# pip packages aren't part of a vendored channel and are left out
+def iter_lockfile_resources(lockfile):
+    import yaml
+
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with open(lockfile) as f:
+        lock = yaml.load(f, Loader=loader)
+    if not isinstance(lock, dict) or "package" not in lock:
+        raise ValueError(f"{lockfile} is not a conda-lock.yml lockfile, explicit and env lockfiles carry no sha256")
+    for pkg in lock["package"]:
+        if pkg.get("manager", "conda") != "conda":
+            continue
+        sha256 = (pkg.get("hash") or {}).get("sha256")
+        if not sha256:
+            raise ValueError(f"{pkg['name']} ({pkg.get('platform')}) has no sha256 in {lockfile}")
+        yield {"url": pkg["url"], "fn": pkg["url"].rsplit("/", 1)[-1], "sha256": sha256}
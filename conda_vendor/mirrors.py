@@ -0,0 +1,168 @@
+# mirrors of upstream channels. A mirror map lists, per channel, the base
+# URLs that serve the same files, e.g.
+#
+#   https://conda.anaconda.org/conda-forge:
+#     - https://proxy-a.example.com/conda-forge
+#     - https://proxy-b.example.com/conda-forge
+#
+# The channel itself is always a candidate. The first request to a channel
+# races a HEAD request for noarch/repodata.json, which every channel has,
+# against all of its base URLs. Requests go to the fastest healthy one
+# first, failing over to the next one on errors. A failed mirror sits out
+# a cooldown before it is probed again. Packages are still verified
+# against the solved sha256, whichever mirror served them
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from conda_vendor.errors import ChecksumError
+from conda_vendor.output import get_output
+from conda_vendor.session import get_session
+
+# seconds a probe may take before the mirror counts as unhealthy
+DEFAULT_PROBE_TIMEOUT = 5
+
+# seconds a failed mirror is skipped before it is probed again
+DEFAULT_COOLDOWN = 60
+
+_mirror_map = None
+_mirror_map_lock = threading.Lock()
+
+
+# errors after which the next mirror is tried, after a checksum mismatch
+# another mirror may well serve an intact copy
+def failover_errors() -> tuple:
+    import requests
+
+    return (requests.exceptions.RequestException, ChecksumError)
+
+
+class MirrorMap:
+    def __init__(self, mirrors=None, probe_timeout=DEFAULT_PROBE_TIMEOUT, cooldown=DEFAULT_COOLDOWN):
+        self.probe_timeout = probe_timeout
+        self.cooldown = cooldown
+        # every base URL of a channel maps to the group of all its base URLs
+        self._groups = {}
+        for channel, bases in (mirrors or {}).items():
+            group = list(dict.fromkeys(base.rstrip("/") for base in [channel, *bases]))
+            for base in group:
+                self._groups[base] = group
+        # {base: probed latency in seconds}, and {base: time it failed}
+        self._latency = {}
+        self._failed = {}
+        self._lock = threading.Lock()
+        self._probe_locks = {}
+
+    # (base URL, path below it) of the longest base URL url starts with
+    def _split(self, url):
+        for base in sorted(self._groups, key=len, reverse=True):
+            if url == base or url.startswith(base + "/"):
+                return base, url[len(base):]
+        return None, url
+
+    def _is_healthy(self, base):
+        failed = self._failed.get(base)
+        return failed is None or time.monotonic() - failed >= self.cooldown
+
+    # HEAD noarch/repodata.json on every base at once, recording how long
+    # each takes to answer, over session. Only one thread probes a group,
+    # the others wait
+    def _probe(self, group, session, output):
+        import requests
+
+        with self._lock:
+            probe_lock = self._probe_locks.setdefault(group[0], threading.Lock())
+        with probe_lock:
+            with self._lock:
+                unprobed = [base for base in group if base not in self._latency and self._is_healthy(base)]
+            if not unprobed:
+                return
+
+            def _head(base):
+                started = time.monotonic()
+                try:
+                    response = session.head(f"{base}/noarch/repodata.json", allow_redirects=True, timeout=self.probe_timeout)
+                except requests.exceptions.RequestException:
+                    return base, None
+                return base, time.monotonic() - started if response.ok else None
+
+            with ThreadPoolExecutor(max_workers=len(unprobed)) as executor:
+                probes = list(executor.map(_head, unprobed))
+            with self._lock:
+                for base, latency in probes:
+                    if latency is None:
+                        self._failed[base] = time.monotonic()
+                    else:
+                        self._latency[base] = latency
+                        self._failed.pop(base, None)
+            ranked = sorted((latency, base) for base, latency in probes if latency is not None)
+            output.message(f"Mirror Latency for {group[0]}: " + ", ".join(f"{base} {latency * 1000:.0f}ms" for latency, base in ranked) if ranked
+                    else f"No Mirror of {group[0]} Answered", fg='cyan')
+
+    # url on every mirror of its channel, the fastest healthy mirror first
+    # and the unhealthy ones last. Just [url] for channels without mirrors.
+    # Probes go over session, the shared one by default
+    def candidates(self, url, session=None, output=None) -> list:
+        base, path = self._split(url)
+        if base is None:
+            return [url]
+        group = self._groups[base]
+        self._probe(group, session if session is not None else get_session(), output or get_output())
+        with self._lock:
+            ranked = sorted(group, key=lambda base: (not self._is_healthy(base), self._latency.get(base, float("inf"))))
+        return [base + path for base in ranked]
+
+    def record_failure(self, url):
+        base, _ = self._split(url)
+        if base is not None:
+            with self._lock:
+                self._failed[base] = time.monotonic()
+                self._latency.pop(base, None)
+
+    # call fetch(candidate) for the candidates of url until one succeeds,
+    # re-raising the last error when every mirror failed
+    def failover(self, url, fetch, session=None, output=None):
+        output = output or get_output()
+        candidates = self.candidates(url, session=session, output=output)
+        for index, candidate in enumerate(candidates):
+            try:
+                return fetch(candidate)
+            except failover_errors() as err:
+                if index == len(candidates) - 1:
+                    raise
+                self.record_failure(candidate)
+                output.warning(f"{candidate} failed ({err}), failing over to {candidates[index + 1]}",
+                        url=candidate, failover=candidates[index + 1])
+
+
+# read a mirror map file, YAML or JSON, of {channel: [base URL, ...]}
+def load_mirror_map(path, **kwargs) -> MirrorMap:
+    import yaml
+
+    with open(path) as f:
+        try:
+            mirrors = yaml.safe_load(f) or {}
+        except yaml.YAMLError as err:
+            raise ValueError(f"{path}: {err}")
+    if not isinstance(mirrors, dict) or not all(isinstance(bases, list) for bases in mirrors.values()):
+        raise ValueError(f"{path}: expected a mapping of channel URL to a list of mirror base URLs")
+    return MirrorMap(mirrors, **kwargs)
+
+
+# replace the mirror map used by every download, None for no mirrors
+def configure_mirrors(mirror_map=None) -> MirrorMap:
+    global _mirror_map
+    with _mirror_map_lock:
+        _mirror_map = mirror_map if mirror_map is not None else MirrorMap()
+        return _mirror_map
+
+
+def get_mirrors() -> MirrorMap:
+    global _mirror_map
+    with _mirror_map_lock:
+        if _mirror_map is None:
+            _mirror_map = MirrorMap()
+        return _mirror_map
+
@@ -0,0 +1,105 @@
+# console output of the CLI. In the default "text" mode progress messages
+# and progress bars are styled for a terminal, --quiet drops them and only
+# keeps warnings. In "ndjson" mode stdout carries one compact JSON record
+# per event (solved package, downloaded package, written repodata.json,
+# ...) as it happens, and human readable messages move to stderr.
+# The module level functions write through the process wide Output the CLI
+# configures, a Vendorer keeps an Output of its own
+import json
+import sys
+import threading
+from contextlib import contextmanager
+
+import click
+
+OUTPUT_MODES = ["text", "ndjson"]
+
+# one lock for every Output, they all share stdout
+_emit_lock = threading.Lock()
+
+
+class _NullProgressBar:
+    def update(self, n_steps):
+        pass
+
+
+class Output:
+    def __init__(self, mode="text", quiet=False):
+        if mode not in OUTPUT_MODES:
+            raise ValueError(f"Unknown output mode {mode!r}, expected one of {OUTPUT_MODES}")
+        self.mode = mode
+        self.quiet = quiet
+
+    # the settings, to rebuild this Output in a worker process
+    def config(self) -> dict:
+        return {"mode": self.mode, "quiet": self.quiet}
+
+    def is_ndjson(self) -> bool:
+        return self.mode == "ndjson"
+
+    # a progress message, styled with click.style keyword arguments
+    def message(self, text, **style):
+        if self.quiet:
+            return
+        click.echo(click.style(text, **style), err=self.is_ndjson())
+
+    # a warning is shown even with --quiet, and is also an event in ndjson mode
+    def warning(self, text, **fields):
+        click.echo(click.style(f"Warning: {text}", fg='red'), err=self.quiet or self.is_ndjson())
+        self.emit("warning", message=text, **fields)
+
+    # write one event record in ndjson mode, a no-op otherwise
+    def emit(self, event, **fields):
+        if not self.is_ndjson():
+            return
+        line = json.dumps({"event": event, **fields}, separators=(",", ":"), default=str)
+        with _emit_lock:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+
+    # click.progressbar for the terminal, nothing with --quiet or ndjson
+    @contextmanager
+    def progressbar(self, length, label, item_show_func=None):
+        if self.quiet or self.is_ndjson():
+            yield _NullProgressBar()
+            return
+        with click.progressbar(length=length, label=label, item_show_func=item_show_func) as bar:
+            yield bar
+
+
+_output = Output()
+
+
+def configure_output(mode="text", quiet=False) -> Output:
+    global _output
+    _output = Output(mode, quiet)
+    return _output
+
+
+def get_output() -> Output:
+    return _output
+
+
+# current settings, to hand on to worker processes
+def get_output_config() -> dict:
+    return _output.config()
+
+
+def is_ndjson() -> bool:
+    return _output.is_ndjson()
+
+
+def message(text, **style):
+    _output.message(text, **style)
+
+
+def warning(text, **fields):
+    _output.warning(text, **fields)
+
+
+def emit(event, **fields):
+    _output.emit(event, **fields)
+
+
+def progressbar(length, label, item_show_func=None):
+    return _output.progressbar(length, label, item_show_func=item_show_func)
@@ -0,0 +1,95 @@
+# persistent, content-addressed package cache shared across vendor runs.
+# packages are stored as <cache_dir>/<sha256[:2]>/<sha256>, since the
+# sha256 comes from the solved FETCH actions an entry is valid for every
+# environment and channel that resolves to the same artifact. The mtime
+# of an entry records when it was last used and drives LRU eviction
+import os
+import time
+from pathlib import Path
+from conda_vendor.fileutils import hash_file, link_or_copy
+
+
+def cache_entry_path(cache_dir, sha256) -> Path:
+    return Path(cache_dir) / sha256[:2] / sha256
+
+
+def _entry_matches(entry, sha256, size):
+    if size is not None and entry.stat().st_size != size:
+        return False
+    return hash_file(entry) == sha256
+
+
+# link a cached package into dest, returns False on a cache miss. Entries
+# are hardlinked into vendored channels and may have been changed through
+# one since, so an entry whose size or sha256 no longer matches is evicted
+# and counts as a miss
+def fetch_from_cache(cache_dir, sha256, dest, size=None) -> bool:
+    entry = cache_entry_path(cache_dir, sha256)
+    try:
+        if not _entry_matches(entry, sha256, size):
+            entry.unlink()
+            return False
+        link_or_copy(entry, dest)
+    except FileNotFoundError:
+        return False
+    # mark as recently used
+    os.utime(entry)
+    return True
+
+
+# store a verified package in the cache
+def add_to_cache(cache_dir, sha256, src):
+    entry = cache_entry_path(cache_dir, sha256)
+    if entry.exists():
+        os.utime(entry)
+        return
+    entry.parent.mkdir(parents=True, exist_ok=True)
+    link_or_copy(src, entry)
+
+
+# list (path, size, last_used) for every complete cache entry
+def _cache_entries(cache_dir):
+    entries = []
+    cache_dir = Path(cache_dir)
+    if not cache_dir.is_dir():
+        return entries
+    for entry in cache_dir.glob("??/*"):
+        if entry.name.startswith("."):
+            continue
+        stat = entry.stat()
+        entries.append((entry, stat.st_size, stat.st_mtime))
+    return entries
+
+
+def cache_stats(cache_dir) -> dict:
+    entries = _cache_entries(cache_dir)
+    last_used = [mtime for _, _, mtime in entries]
+    return {
+        "cache_dir": str(cache_dir),
+        "entries": len(entries),
+        "size": sum(size for _, size, _ in entries),
+        "oldest": min(last_used) if last_used else None,
+        "newest": max(last_used) if last_used else None,
+    }
+
+
+# evict least recently used entries until the cache fits in max_size bytes,
+# returns the number of entries removed and the bytes freed
+def prune_cache(cache_dir, max_size):
+    entries = sorted(_cache_entries(cache_dir), key=lambda entry: entry[2])
+    total_size = sum(size for _, size, _ in entries)
+    removed = 0
+    freed = 0
+    for entry, size, _ in entries:
+        if total_size <= max_size:
+            break
+        entry.unlink()
+        total_size -= size
+        removed += 1
+        freed += size
+
+    # leftovers from interrupted runs, recent ones may belong to a running vendor
+    for stale in Path(cache_dir).glob("??/.*.part"):
+        if time.time() - stale.stat().st_mtime > 3600:
+            stale.unlink()
+    return removed, freed
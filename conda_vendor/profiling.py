@@ -0,0 +1,109 @@
+# opt-in tracing of the vendor pipeline. Stages wrap their work in span(),
+# which is a no-op unless profiling was enabled with enable_profiling().
+# Recorded spans carry their duration plus whatever the stage attaches
+# (bytes, package counts, ...) and are written as a Chrome trace-event JSON
+# file, viewable in chrome://tracing or https://ui.perfetto.dev
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+_tracer = None
+
+
+class Tracer:
+    def __init__(self):
+        self._events = []
+        self._lock = threading.Lock()
+
+    def record(self, name, start, duration, args):
+        event = {
+            "name": name,
+            "cat": "conda-vendor",
+            "ph": "X",
+            # trace-event timestamps and durations are in microseconds
+            "ts": int(start * 1e6),
+            "dur": int(duration * 1e6),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        with self._lock:
+            self._events.append(event)
+
+    # add events recorded by another tracer, e.g. in a worker process
+    def extend(self, events):
+        with self._lock:
+            self._events.extend(events)
+
+    @property
+    def events(self):
+        with self._lock:
+            return list(self._events)
+
+
+def enable_profiling() -> Tracer:
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def disable_profiling():
+    global _tracer
+    _tracer = None
+
+
+def get_tracer():
+    return _tracer
+
+
+# time the body of the with block as a span called name. The yielded dict
+# becomes the span's args, set "bytes" on it to get a throughput
+@contextmanager
+def span(name, **args):
+    tracer = _tracer
+    if tracer is None:
+        yield args
+        return
+
+    start = time.time()
+    start_counter = time.perf_counter()
+    try:
+        yield args
+    finally:
+        duration = time.perf_counter() - start_counter
+        if args.get("bytes") and duration > 0:
+            args["mb_per_s"] = round(args["bytes"] / 1024 ** 2 / duration, 2)
+        tracer.record(name, start, duration, args)
+
+
+def write_chrome_trace(events, trace_file):
+    with open(trace_file, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+# per span name: count, total and max seconds, bytes and throughput, in the
+# order the names were first seen
+def summarize(events) -> list:
+    rows = OrderedDict()
+    for event in sorted(events, key=lambda event: event["ts"]):
+        row = rows.setdefault(event["name"], {"name": event["name"], "count": 0, "seconds": 0.0, "max_seconds": 0.0, "bytes": 0})
+        seconds = event["dur"] / 1e6
+        row["count"] += 1
+        row["seconds"] += seconds
+        row["max_seconds"] = max(row["max_seconds"], seconds)
+        row["bytes"] += event["args"].get("bytes") or 0
+    for row in rows.values():
+        row["mb_per_s"] = row["bytes"] / 1024 ** 2 / row["seconds"] if row["bytes"] and row["seconds"] else None
+    return list(rows.values())
+
+
+def format_summary(events) -> str:
+    lines = [f"{'span':<36} {'count':>7} {'total':>10} {'max':>10} {'MB':>10} {'MB/s':>9}"]
+    for row in summarize(events):
+        megabytes = f"{row['bytes'] / 1024 ** 2:10.1f}" if row["bytes"] else f"{'-':>10}"
+        mb_per_s = f"{row['mb_per_s']:9.1f}" if row["mb_per_s"] else f"{'-':>9}"
+        lines.append(f"{row['name']:<36} {row['count']:>7} {row['seconds']:9.2f}s {row['max_seconds']:9.2f}s {megabytes} {mb_per_s}")
+    return "\n".join(lines)
@@ -0,0 +1,236 @@
+# fetch upstream repodata.json files. The compressed repodata.json.zst or
+# repodata.json.bz2 is preferred when a channel offers it, and with a cache
+# directory the decompressed repodata.json is kept on disk together with its
+# ETag/Last-Modified, so later runs only send a conditional request and
+# reuse the cached copy on "304 Not Modified"
+import bz2
+import codecs
+import hashlib
+import json
+import re
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from conda_vendor.compression import zstandard
+from conda_vendor.fileutils import local_path_for_url, write_atomic
+from conda_vendor.runtime import Runtime
+from conda_vendor.session import improved_download
+
+
+# (suffix, decompressor factory) in order of preference
+def _repodata_variants():
+    variants = []
+    if zstandard is not None:
+        variants.append((".zst", lambda: zstandard.ZstdDecompressor().decompressobj()))
+    variants.append((".bz2", bz2.BZ2Decompressor))
+    variants.append(("", None))
+    return variants
+
+
+def _decompressor_for(variant_url):
+    for suffix, decompressor in _repodata_variants():
+        if suffix and variant_url.endswith(suffix):
+            return decompressor
+    return None
+
+
+def _read_state(state_file):
+    try:
+        with open(state_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# stream the response body into data_file, decompressing on the fly
+def _write_decompressed(response, data_file, decompressor_factory, chunk_size=1024 * 1024):
+    def _write(f):
+        decompressor = decompressor_factory() if decompressor_factory else None
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            f.write(decompressor.decompress(chunk) if decompressor else chunk)
+    write_atomic(data_file, _write)
+
+
+# fail over to the next mirror on server errors, client errors such as a
+# 404 for a variant the channel doesn't offer are left to the caller
+def _download_or_raise_server_error(url, headers, session):
+    response = improved_download(url, stream=True, headers=headers, session=session)
+    if response.status_code >= 500:
+        response.close()
+        response.raise_for_status()
+    return response
+
+
+# fetch repodata_url into cache_dir and return the path of the decompressed
+# repodata.json. A cached copy younger than max_age seconds is used without
+# touching the network, an older one is revalidated with a conditional GET.
+# runtime is the Runtime to download with, the process wide one by default
+def fetch_repodata(repodata_url, cache_dir, max_age=0, runtime=None) -> Path:
+    runtime = runtime or Runtime()
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    key = hashlib.sha256(repodata_url.encode()).hexdigest()[:16]
+    data_file = cache_dir / f"{key}.json"
+    state_file = cache_dir / f"{key}.state.json"
+
+    state = _read_state(state_file) if data_file.exists() else None
+    if state is not None and time.time() - state["fetched"] < max_age:
+        return data_file
+
+    # revalidate the variant that worked last time before probing again
+    candidates = [repodata_url + suffix for suffix, _ in _repodata_variants()]
+    if state is not None:
+        candidates = [state["variant_url"]] + [url for url in candidates if url != state["variant_url"]]
+
+    for variant_url in candidates:
+        headers = {}
+        if state is not None and state["variant_url"] == variant_url:
+            if state.get("etag"):
+                headers["If-None-Match"] = state["etag"]
+            if state.get("last_modified"):
+                headers["If-Modified-Since"] = state["last_modified"]
+
+        response = runtime.failover(variant_url, lambda url: _download_or_raise_server_error(url, headers, runtime.session))
+        try:
+            if response.status_code == 304:
+                state["fetched"] = time.time()
+                write_atomic(state_file, lambda f: f.write(json.dumps(state).encode()))
+                return data_file
+            # channel doesn't offer this variant, try the next one
+            if response.status_code in (403, 404) and variant_url != repodata_url:
+                continue
+            response.raise_for_status()
+            _write_decompressed(response, data_file, _decompressor_for(variant_url))
+        finally:
+            response.close()
+
+        state = {
+            "url": repodata_url,
+            "variant_url": variant_url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched": time.time(),
+        }
+        write_atomic(state_file, lambda f: f.write(json.dumps(state).encode()))
+        return data_file
+
+
+# yield the decompressed repodata.json of repodata_url as a binary file,
+# without a cache_dir it's fetched into a temporary directory. The
+# repodata.json of a file:// or plain-path channel is read in place
+@contextmanager
+def open_repodata(repodata_url, cache_dir=None, max_age=0, runtime=None):
+    local_path = local_path_for_url(repodata_url)
+    if local_path is not None:
+        with open(local_path, "rb") as f:
+            yield f
+        return
+
+    if cache_dir is not None:
+        with open(fetch_repodata(repodata_url, cache_dir, max_age, runtime=runtime), "rb") as f:
+            yield f
+        return
+
+    with tempfile.TemporaryDirectory(prefix="conda-vendor-repodata-") as tmp_dir:
+        with open(fetch_repodata(repodata_url, tmp_dir, runtime=runtime), "rb") as f:
+            yield f
+
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# characters a JSON number may continue with
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+
+
+# incremental reader for a JSON document in a binary file. Values are
+# decoded one at a time with json's C scanner, only the yet unparsed tail
+# of the document is held in memory
+class _JSONStream:
+    def __init__(self, fileobj, chunk_size=1024 * 1024, on_read=None):
+        self._fileobj = fileobj
+        self._chunk_size = chunk_size
+        self._on_read = on_read
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    # append at least size bytes to the buffer, returns False at EOF
+    def _fill(self, size):
+        if self._eof:
+            return False
+        chunk = self._fileobj.read(size)
+        if self._on_read is not None:
+            self._on_read(len(chunk))
+        self._eof = not chunk
+        self._buffer = self._buffer[self._pos:] + self._decoder.decode(chunk, final=self._eof)
+        self._pos = 0
+        return not self._eof
+
+    # next non-whitespace character, without consuming it
+    def peek(self) -> str:
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer) or not self._fill(self._chunk_size):
+                return self._buffer[self._pos:self._pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} in JSON document at {self._buffer[self._pos:self._pos + 20]!r}")
+        self._pos += 1
+
+    def decode_value(self):
+        self.peek()
+        size = self._chunk_size
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self._buffer, self._pos)
+                # a number running up to the end of the buffer may continue in
+                # the next chunk, also when the buffer ends in "." or "e" and
+                # only a prefix of it decoded
+                if self._eof or not isinstance(value, (int, float)) or \
+                        _NUMBER_TAIL.match(self._buffer, end).end() < len(self._buffer):
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            # value spans past the buffer, read more, growing geometrically
+            self._fill(size)
+            size *= 2
+
+    # yield the keys of the next JSON object, the caller must consume each value
+    def iter_object_keys(self):
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.decode_value()
+            self.expect(":")
+            yield key
+            if self.peek() == "}":
+                self._pos += 1
+                return
+            self.expect(",")
+
+
+# walk a repodata.json file and keep only the entries of "packages" and
+# "packages.conda" whose filename is in wanted_fns. Entries are decoded one
+# at a time and dropped unless wanted, so peak memory scales with the number
+# of kept entries instead of the size of the upstream channel
+def filter_repodata(fileobj, wanted_fns, on_read=None, chunk_size=1024 * 1024) -> dict:
+    stream = _JSONStream(fileobj, chunk_size, on_read)
+    repodata = {}
+    for key in stream.iter_object_keys():
+        if key in ("packages", "packages.conda"):
+            entries = {}
+            for fn in stream.iter_object_keys():
+                entry = stream.decode_value()
+                if fn in wanted_fns:
+                    entries[fn] = entry
+            repodata[key] = entries
+        else:
+            repodata[key] = stream.decode_value()
+    return repodata
@@ -0,0 +1,43 @@
+# what a call into conda-vendor runs with: the pooled HTTP session, the
+# mirror map and the console output. Runtime() follows the process wide
+# ones the CLI sets up with configure_session, configure_mirrors and
+# configure_output. A Vendorer builds a Runtime of its own and hands it
+# down to every function it calls, so Vendorers with different settings
+# run side by side
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from conda_vendor.mirrors import MirrorMap, get_mirrors
+from conda_vendor.output import Output, get_output
+from conda_vendor.session import get_session
+
+if TYPE_CHECKING:
+    import requests
+
+
+class Runtime:
+    def __init__(self, session=None, mirrors=None, output=None):
+        self._session = session
+        self._mirrors = mirrors
+        self._output = output
+
+    @property
+    def session(self) -> requests.Session:
+        return self._session if self._session is not None else get_session()
+
+    @property
+    def mirrors(self) -> MirrorMap:
+        return self._mirrors if self._mirrors is not None else get_mirrors()
+
+    @property
+    def output(self) -> Output:
+        return self._output if self._output is not None else get_output()
+
+    # MirrorMap.failover over this runtime's session and output
+    def failover(self, url, fetch):
+        return self.mirrors.failover(url, fetch, session=self.session, output=self.output)
+
+    # the candidates of url, see MirrorMap.candidates
+    def candidates(self, url) -> list:
+        return self.mirrors.candidates(url, session=self.session, output=self.output)
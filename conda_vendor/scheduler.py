@@ -0,0 +1,133 @@
+# download scheduling. Packages start largest first, so a multi-GB artifact
+# doesn't start last and dominate the wall-clock time, at most `jobs` run at
+# once and at most the configured number per host (e.g. fewer against an
+# internal Artifactory than against conda.anaconda.org). An optional token
+# bucket caps the aggregate bandwidth, and a throughput meter feeds the
+# live MB/s display
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+
+def host_of(url):
+    return urlparse(url).hostname or ""
+
+
+# per host semaphores of host_limits, held around each request so the
+# limit is kept by the host that actually serves it. run_scheduled can
+# only count an item against the host it expects, a mirror failover then
+# sends the request elsewhere
+class HostLimiter:
+    def __init__(self, host_limits=None):
+        self._semaphores = {host: threading.BoundedSemaphore(limit) for host, limit in (host_limits or {}).items()}
+
+    @contextmanager
+    def slot(self, url):
+        semaphore = self._semaphores.get(host_of(url))
+        if semaphore is None:
+            yield
+            return
+        with semaphore:
+            yield
+
+
+# shared byte budget of rate bytes per second, bursting up to one second
+# worth of bytes. consume() blocks the calling thread while in debt
+class TokenBucket:
+    def __init__(self, rate):
+        self.rate = rate
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, size):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= size
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+
+# bytes transferred by any number of threads, rate() is a smoothed
+# bytes/second since the previous call
+class ThroughputMeter:
+    def __init__(self, smoothing=0.3):
+        self.total = 0
+        self._smoothing = smoothing
+        self._rate = None
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._sampled_at = self._started
+        self._sampled_total = 0
+
+    def add(self, size):
+        with self._lock:
+            self.total += size
+
+    def rate(self) -> float:
+        now = time.monotonic()
+        total = self.total
+        elapsed = now - self._sampled_at
+        if elapsed <= 0:
+            return self._rate or 0.0
+        current = (total - self._sampled_total) / elapsed
+        self._rate = current if self._rate is None else self._smoothing * current + (1 - self._smoothing) * self._rate
+        self._sampled_at, self._sampled_total = now, total
+        return self._rate
+
+    def average(self) -> float:
+        elapsed = time.monotonic() - self._started
+        return self.total / elapsed if elapsed > 0 else 0.0
+
+
+# run work(item) on a thread pool, largest size(item) first, with at most
+# jobs items running in total and host_limits[host] per host. on_done(item,
+# result) and on_tick() are called from the calling thread, on_tick at
+# least every tick seconds. The first error cancels everything not yet
+# started and is re-raised
+def run_scheduled(items, work, jobs, size=None, host=None, host_limits=None, on_done=None, on_tick=None, tick=0.5):
+    host_limits = host_limits or {}
+    pending = sorted(items, key=lambda item: size(item) or 0, reverse=True) if size is not None else list(items)
+    running = {}
+    running_per_host = Counter()
+
+    def _has_capacity(item_host):
+        limit = host_limits.get(item_host)
+        return limit is None or running_per_host[item_host] < limit
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        try:
+            while pending or running:
+                # start the largest pending items whose host has a free slot
+                index = 0
+                while len(running) < jobs and index < len(pending):
+                    item_host = host(pending[index]) if host is not None else None
+                    if _has_capacity(item_host):
+                        item = pending.pop(index)
+                        running[executor.submit(work, item)] = (item, item_host)
+                        running_per_host[item_host] += 1
+                    else:
+                        index += 1
+
+                done, _ = wait(running, timeout=tick, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item, item_host = running.pop(future)
+                    running_per_host[item_host] -= 1
+                    # re-raises any error from the worker
+                    result = future.result()
+                    if on_done is not None:
+                        on_done(item, result)
+                if on_tick is not None:
+                    on_tick()
+        except BaseException:
+            # fail hard, don't start anything that is still queued
+            pending.clear()
+            for future in running:
+                future.cancel()
+            raise
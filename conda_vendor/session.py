@@ -0,0 +1,96 @@
+# a single long-lived, connection-pooled requests.Session shared by the
+# repodata.json fetching and the package downloads, so every request to
+# the same host reuses a kept-alive TCP+TLS connection. requests is only
+# imported once a session is needed, keeping CLI startup fast
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import requests
+    from requests.packages.urllib3.util.retry import Retry
+
+# connections kept open per host
+DEFAULT_POOL_SIZE = 10
+
+# (connect, read) timeout in seconds for a single request
+DEFAULT_TIMEOUT = (10, 60)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+# retry connect and read errors, as well as rate limiting and server errors
+def _create_retry(retries, backoff_factor) -> Retry:
+    from requests.packages.urllib3.util.retry import Retry
+
+    return Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        respect_retry_after_header=True,
+        # hand back the last response and let the caller raise_for_status()
+        raise_on_status=False,
+    )
+
+
+# build a new session, host_pool_sizes maps a hostname to its own pool size
+def create_session(pool_size=DEFAULT_POOL_SIZE, host_pool_sizes=None, retries=5, backoff_factor=0.5) -> requests.Session:
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    session.headers["Connection"] = "keep-alive"
+    retry = _create_retry(retries, backoff_factor)
+
+    adapter = HTTPAdapter(pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    # requests picks the adapter with the longest matching prefix
+    for host, host_pool_size in (host_pool_sizes or {}).items():
+        host_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=host_pool_size, max_retries=retry)
+        session.mount(f"http://{host}/", host_adapter)
+        session.mount(f"https://{host}/", host_adapter)
+    return session
+
+
+# replace the shared session, closing the pooled connections of the old one
+def configure_session(**kwargs) -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = create_session(**kwargs)
+        return _session
+
+
+# return the shared session, creating it with the defaults on first use
+def get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+
+# network errors after which a transfer can continue where it stopped
+def resumable_download_errors() -> tuple:
+    import requests
+
+    return (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.ChunkedEncodingError,
+        requests.exceptions.Timeout,
+    )
+
+
+# see https://stackoverflow.com/questions/21371809/cleanly-setting-max-retries-on-python-requests-get-or-post-method
+# session defaults to the shared session
+def improved_download(url, stream=False, headers=None, session=None):
+    session = session if session is not None else get_session()
+    return session.get(url, stream=stream, headers=headers, timeout=DEFAULT_TIMEOUT)
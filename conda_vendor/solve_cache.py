@@ -0,0 +1,87 @@
+# persistent cache of solve results. The FETCH actions of a solve are stored
+# on disk under a key made of the normalised specs, channels, platform and
+# solver plus the ETag/Last-Modified of the upstream repodata.json files, so
+# a solve is reused until the inputs change or a channel publishes new
+# repodata. Entries older than the TTL are ignored regardless
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from conda_vendor.fileutils import local_path_for_url, normalize_channel_url, write_atomic
+from conda_vendor.session import DEFAULT_TIMEOUT, get_session
+
+# one day, in seconds
+DEFAULT_SOLVE_CACHE_TTL = 24 * 60 * 60
+
+
+# base URLs behind a channel name as used in environment.yaml
+def _channel_base_urls(channel):
+    channel = normalize_channel_url(channel)
+    if "://" in channel:
+        return [channel.rstrip("/")]
+    if channel == "defaults":
+        return ["https://repo.anaconda.com/pkgs/main", "https://repo.anaconda.com/pkgs/r"]
+    return [f"https://conda.anaconda.org/{channel}"]
+
+
+def _repodata_validator(repodata_url, session):
+    local_path = local_path_for_url(repodata_url)
+    if local_path is not None:
+        try:
+            stat = local_path.stat()
+        except OSError:
+            return None
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    try:
+        response = session.head(repodata_url, allow_redirects=True, timeout=DEFAULT_TIMEOUT)
+    except OSError:
+        return None
+    if not response.ok:
+        return None
+    return response.headers.get("ETag") or response.headers.get("Last-Modified")
+
+
+# ETag or Last-Modified of every upstream repodata.json the solve reads,
+# None where the server doesn't tell. Asks over session, the shared one by default
+def repodata_freshness(channels, platform, session=None) -> dict:
+    session = session if session is not None else get_session()
+    repodata_urls = [
+        f"{base_url}/{subdir}/repodata.json"
+        for channel in channels
+        for base_url in _channel_base_urls(channel)
+        for subdir in (platform, "noarch")
+    ]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        return dict(zip(repodata_urls, executor.map(lambda url: _repodata_validator(url, session), repodata_urls)))
+
+
+def solve_cache_key(specs, channels, platform, solver, session=None) -> str:
+    key = {
+        "specs": sorted(specs),
+        "channels": list(channels),
+        "platform": platform,
+        "solver": solver,
+        "repodata": repodata_freshness(channels, platform, session=session),
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+# cached FETCH actions for key, None when missing or older than ttl seconds
+def load_solve(cache_dir, key, ttl=DEFAULT_SOLVE_CACHE_TTL):
+    try:
+        with open(Path(cache_dir) / f"{key}.json") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - entry["created"] > ttl:
+        return None
+    return entry["fetch_actions"]
+
+
+def store_solve(cache_dir, key, fetch_actions):
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    data = json.dumps({"created": time.time(), "fetch_actions": fetch_actions}).encode()
+    write_atomic(cache_dir / f"{key}.json", lambda f: f.write(data))
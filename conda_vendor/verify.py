@@ -0,0 +1,87 @@
+# re-verify a vendored channel against its own repodata.json files, e.g.
+# after carrying it across an air gap. Every subdir with a repodata.json is
+# checked for packages that are missing, files that aren't in repodata.json
+# and packages whose sha256 doesn't match. Files are hashed through mmap in
+# a process pool, so hashing runs on every core and keeps the disk busy
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from conda_vendor.fileutils import hash_file
+
+# exit code bits of `conda-vendor verify`, 1 and 2 are taken by click
+VERIFY_MISSING = 4
+VERIFY_EXTRA = 8
+VERIFY_CORRUPT = 16
+
+# index files that live next to the packages of a subdir
+INDEX_FILES = {"repodata.json", "repodata.json.bz2", "repodata.json.zst", "current_repodata.json", "repodata_from_packages.json"}
+
+
+# temporary and hidden files of interrupted runs or other tools
+def _is_ignored(path):
+    return path.name.startswith(".") or path.name.endswith((".part", ".validator")) or path.name in INDEX_FILES
+
+
+# {fn: (algorithm, expected digest)} of the packages in a subdir's
+# repodata.json, old packages only carry an md5
+def _expected_packages(repodata_file):
+    with open(repodata_file, "rb") as f:
+        repodata = json.load(f)
+    expected = {}
+    for key in ("packages", "packages.conda"):
+        for fn, entry in repodata.get(key, {}).items():
+            expected[fn] = ("sha256", entry["sha256"]) if entry.get("sha256") else ("md5", entry.get("md5"))
+    return expected
+
+
+def _subdirs(channel_dir):
+    return sorted(path.parent for path in Path(channel_dir).glob("*/repodata.json"))
+
+
+# check every subdir of channel_dir, on_result(subdir, fn, status) is
+# called for each package as it is checked, with status one of "ok",
+# "missing", "extra" or "corrupt". Returns {status: [(subdir, fn), ...]}
+def verify_channel(channel_dir, jobs=None, on_result=None) -> dict:
+    results = {"ok": [], "missing": [], "extra": [], "corrupt": []}
+
+    def _record(subdir, fn, status):
+        results[status].append((subdir, fn))
+        if on_result is not None:
+            on_result(subdir, fn, status)
+
+    to_hash = []
+    for subdir_path in _subdirs(channel_dir):
+        subdir = subdir_path.name
+        expected = _expected_packages(subdir_path / "repodata.json")
+        present = {path.name: path for path in subdir_path.iterdir() if path.is_file() and not _is_ignored(path)}
+        for fn in sorted(expected.keys() - present.keys()):
+            _record(subdir, fn, "missing")
+        for fn in sorted(present.keys() - expected.keys()):
+            _record(subdir, fn, "extra")
+        for fn in sorted(expected.keys() & present.keys()):
+            to_hash.append((present[fn].stat().st_size, subdir, fn, present[fn], expected[fn]))
+
+    # largest files first, so one big package doesn't finish last on its own
+    to_hash.sort(key=lambda item: item[0], reverse=True)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(hash_file, path, algorithm): (subdir, fn, digest)
+            for _, subdir, fn, path, (algorithm, digest) in to_hash
+        }
+        for future in as_completed(futures):
+            subdir, fn, digest = futures[future]
+            _record(subdir, fn, "ok" if future.result() == digest else "corrupt")
+    return results
+
+
+# `conda-vendor verify` exit code for the results of verify_channel
+def verify_exit_code(results) -> int:
+    code = 0
+    if results["missing"]:
+        code |= VERIFY_MISSING
+    if results["extra"]:
+        code |= VERIFY_EXTRA
+    if results["corrupt"]:
+        code |= VERIFY_CORRUPT
+    return code
@@ -22,7 +22,7 @@ setup(
     packages=find_packages(exclude=("tests",), where="."),
     url="https://github.com/MetroStar/conda-vendor",
     entry_points={"console_scripts": ["conda-vendor = conda_vendor.__main__:cli"]},
-    install_requires=["ruamel.yaml", "conda-lock", "click"],
+    install_requires=["ruamel.yaml", "conda-lock", "click", "zstandard"],
     setup_requires=["wheel"],
     python_requires=">=3.6",
     long_description=long_description,
@@ -1,8 +1,11 @@
 import struct
 import sys
 import pytest
+import hashlib
+import io
 import json
 import os
+from contextlib import contextmanager
 from typing import List
 from unittest.mock import Mock
 from ruamel.yaml import YAML
@@ -98,8 +101,44 @@ def mock_response(
         mock_resp.raise_for_status.side_effect = raise_for_status
     # set status code and content
     mock_resp.status_code = status
+    mock_resp.headers = {}
     mock_resp.content = content
+    mock_resp.iter_content = Mock(side_effect=lambda chunk_size=1: iter([content]))
     # add json data if provided
     if json_data:
         mock_resp.json = Mock(return_value=json_data)
     return mock_resp
+
+
+# a fake two package channel, for tests that vendor without network access
+FAKE_CHANNEL = "https://NOT_REAL.com/conda-forge"
+FAKE_PACKAGES = {"linux-64/a-1.tar.bz2": b"A" * 1000, "noarch/b-1.tar.bz2": b"B" * 1000}
+
+
+# FETCH actions of every package in FAKE_CHANNEL
+def fake_fetch_actions():
+    return [
+        {"channel": f"{FAKE_CHANNEL}/{path.split('/')[0]}", "subdir": path.split("/")[0], "fn": path.split("/")[1],
+         "url": f"{FAKE_CHANNEL}/{path}", "sha256": hashlib.sha256(raw).hexdigest(), "size": len(raw)}
+        for path, raw in FAKE_PACKAGES.items()
+    ]
+
+
+# stands in for improved_download against FAKE_CHANNEL
+def fake_download(url, **kwargs):
+    return mock_response(content=FAKE_PACKAGES[url[len(FAKE_CHANNEL) + 1:]])
+
+
+# stands in for conda_vendor.repodata.open_repodata, serving upstream, a
+# {repodata URL: repodata} mapping. FAKE_CHANNEL's repodata by default
+def fake_open_repodata(upstream=None):
+    if upstream is None:
+        upstream = {}
+        for pkg in fake_fetch_actions():
+            repodata = upstream.setdefault(f"{pkg['channel']}/repodata.json", {"packages": {}})
+            repodata["packages"][pkg["fn"]] = {"sha256": pkg["sha256"], "subdir": pkg["subdir"]}
+
+    @contextmanager
+    def _open_repodata(repodata_url, cache_dir=None, max_age=0, runtime=None):
+        yield io.BytesIO(json.dumps(upstream[repodata_url]).encode())
+    return _open_repodata
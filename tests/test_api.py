@@ -0,0 +1,106 @@
+import asyncio
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+
+from conda_vendor import AsyncVendorer, CondaVendorError, Vendorer
+from conda_vendor.archive import ArchiveError
+from conda_vendor.session import get_session
+
+from .conftest import FAKE_PACKAGES, fake_download, fake_fetch_actions, fake_open_repodata
+
+
+@pytest.fixture
+def environment_yaml(tmp_path):
+    environment_file = tmp_path / "environment.yaml"
+    environment_file.write_text("name: my-env\nchannels:\n- conda-forge\ndependencies:\n- a\n- b\n")
+    return environment_file
+
+
+def _patched(test):
+    test = patch("conda_vendor.conda_vendor.open_repodata", fake_open_repodata())(test)
+    test = patch("conda_vendor.conda_vendor.improved_download", side_effect=fake_download)(test)
+    test = patch("conda_vendor.api.solve_environments", side_effect=lambda *args, **kwargs: fake_fetch_actions())(test)
+    test = patch("conda_vendor.api.get_lock_spec_for_environment_file", return_value=Mock())(test)
+    return test
+
+
+@_patched
+def test_vendorer_keeps_state_across_calls(mock_download, mock_solve, mock_lock_spec, tmp_path, environment_yaml):
+    session_before = get_session()
+    with Vendorer(platforms=["linux-64"], solve_cache_dir=tmp_path / "solves") as vendorer:
+        result = vendorer.vendor(environment_yaml, dest_dir=tmp_path)
+
+        assert result.channel_dir == tmp_path / "my-env"
+        assert result.archive is None
+        assert result.packages == 2
+        assert result.downloads == {"downloaded": 2}
+        for path, raw in FAKE_PACKAGES.items():
+            assert (result.channel_dir / path).read_bytes() == raw
+        assert vendorer.verify(result.channel_dir)["ok"]
+
+        # a second call into the same channel raises instead of exiting, or resumes
+        with pytest.raises(CondaVendorError):
+            vendorer.vendor([environment_yaml], dest_dir=tmp_path)
+        assert vendorer.vendor([environment_yaml], dest_dir=tmp_path, resume=True).downloads == {"present": 2}
+
+    # the process wide session is left as it was
+    assert get_session() is session_before
+    assert mock_solve.call_args[1]["solve_cache_dir"] == tmp_path / "solves"
+    with pytest.raises(CondaVendorError):
+        vendorer.solve(environment_yaml)
+
+
+@_patched
+def test_async_vendorer_archive(mock_download, mock_solve, mock_lock_spec, tmp_path, environment_yaml):
+    async def _vendor():
+        async with AsyncVendorer(platforms=["linux-64"], solve_cache_dir=tmp_path / "solves") as vendorer:
+            return await vendorer.vendor(environment_yaml, archive=tmp_path / "channel.tar.gz")
+
+    result = asyncio.run(_vendor())
+
+    assert result.archive == tmp_path / "channel.tar.gz"
+    assert result.channel_dir is None
+    assert result.downloads == {"downloaded": 2}
+    assert result.archive.exists()
+
+
+@_patched
+def test_vendorer_checks_archive_before_solving(mock_download, mock_solve, mock_lock_spec, tmp_path, environment_yaml):
+    with Vendorer(platforms=["linux-64"], solve_cache_dir=tmp_path / "solves") as vendorer:
+        with pytest.raises(ArchiveError):
+            vendorer.vendor(environment_yaml, archive=tmp_path / "channel.zip")
+        with pytest.raises(CondaVendorError):
+            vendorer.vendor(environment_yaml, archive=tmp_path / "channel.tar.gz", resume=True)
+
+    mock_solve.assert_not_called()
+    mock_download.assert_not_called()
+
+
+@_patched
+def test_async_vendorers_run_concurrently(mock_download, mock_solve, mock_lock_spec, tmp_path, environment_yaml):
+    # one download at a time per Vendorer, so both calls must be in flight
+    # together to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+    sessions = []
+
+    def _download(url, session=None, **kwargs):
+        sessions.append(session)
+        if len(sessions) <= 2:
+            barrier.wait()
+        return fake_download(url)
+    mock_download.side_effect = _download
+
+    async def _vendor_both():
+        async with AsyncVendorer(platforms=["linux-64"], jobs=1, solve_cache_dir=tmp_path / "solves") as a, \
+                AsyncVendorer(platforms=["linux-64"], jobs=1, solve_cache_dir=tmp_path / "solves") as b:
+            results = await asyncio.gather(a.vendor(environment_yaml, dest_dir=tmp_path, channel_name="a"),
+                                           b.vendor(environment_yaml, dest_dir=tmp_path, channel_name="b"))
+            return results, {a.vendorer._session, b.vendorer._session}
+
+    results, vendorer_sessions = asyncio.run(_vendor_both())
+
+    assert [result.downloads for result in results] == [{"downloaded": 2}, {"downloaded": 2}]
+    # each call downloaded over its own Vendorer's session
+    assert set(sessions) == vendorer_sessions
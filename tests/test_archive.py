@@ -0,0 +1,101 @@
+import gc
+import hashlib
+import random
+import tarfile
+from unittest.mock import patch
+
+import pytest
+from click.testing import CliRunner
+
+from conda_vendor.archive import MANIFEST_NAME, ChannelArchiveWriter, import_archive, zstandard
+from conda_vendor.conda_vendor import archive_vendored_channel, import_command, verify
+from conda_vendor.verify import VERIFY_CORRUPT, VERIFY_MISSING
+
+from .conftest import FAKE_PACKAGES, fake_download, fake_fetch_actions, fake_open_repodata
+
+@patch("conda_vendor.conda_vendor.open_repodata", fake_open_repodata())
+@patch("conda_vendor.conda_vendor.improved_download", side_effect=fake_download)
+def test_archive_round_trip(mock, tmp_path):
+    archive = tmp_path / "channel.tar.gz"
+    assert archive_vendored_channel(fake_fetch_actions(), archive, "my-channel") == {"downloaded": 2}
+
+    # only the archive is left behind, the manifest comes first
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["channel.tar.gz"]
+    with tarfile.open(archive) as tar:
+        names = tar.getnames()
+    assert names[0] == f"my-channel/{MANIFEST_NAME}"
+    index_files = ["repodata.json", "repodata.json.bz2", "current_repodata.json"] + (["repodata.json.zst"] if zstandard else [])
+    assert sorted(names[1:]) == sorted(["my-channel/channeldata.json", "my-channel/linux-64/a-1.tar.bz2", "my-channel/noarch/b-1.tar.bz2"]
+                                       + [f"my-channel/{subdir}/{name}" for subdir in ("linux-64", "noarch") for name in index_files])
+
+    result = CliRunner().invoke(import_command, ["--archive", str(archive), "--dest", str(tmp_path / "imported")])
+    assert result.exit_code == 0, result.output
+    channel_dir = tmp_path / "imported" / "my-channel"
+    for path, raw in FAKE_PACKAGES.items():
+        assert (channel_dir / path).read_bytes() == raw
+    assert CliRunner().invoke(verify, ["--channel-dir", str(channel_dir)]).exit_code == 0
+
+
+def test_import_archive_rejects_corrupt_files(tmp_path):
+    (tmp_path / "a-1.tar.bz2").write_bytes(b"TAMPERED")
+    with ChannelArchiveWriter(tmp_path / "channel.tar", "my-channel") as writer:
+        writer.add_manifest([
+            {"path": "noarch/a-1.tar.bz2", "size": 1, "sha256": hashlib.sha256(b"A").hexdigest()},
+            {"path": "noarch/b-1.tar.bz2", "size": 1, "sha256": hashlib.sha256(b"B").hexdigest()},
+        ])
+        writer.add_file("noarch/a-1.tar.bz2", tmp_path / "a-1.tar.bz2")
+
+    channel_dir, results = import_archive(tmp_path / "channel.tar", tmp_path / "imported")
+    assert results == {"ok": [], "corrupt": ["noarch/a-1.tar.bz2"], "extra": [], "missing": ["noarch/b-1.tar.bz2"]}
+    assert not (channel_dir / "noarch" / "a-1.tar.bz2").exists()
+
+    result = CliRunner().invoke(import_command, ["--archive", str(tmp_path / "channel.tar"), "--dest", str(tmp_path / "again")])
+    assert result.exit_code == VERIFY_MISSING | VERIFY_CORRUPT
+
+
+# nothing may flush into the closed file once the writer is collected
+@pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+@pytest.mark.parametrize("suffix", [".tar", ".tar.gz", ".tar.zst"])
+def test_archive_writer_drops_incomplete_archive(tmp_path, suffix):
+    if suffix == ".tar.zst" and zstandard is None:
+        pytest.skip("needs zstandard")
+    with pytest.raises(RuntimeError):
+        with ChannelArchiveWriter(tmp_path / f"channel{suffix}", "my-channel") as writer:
+            writer.add_manifest([])
+            raise RuntimeError("download failed")
+    del writer
+    gc.collect()
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("suffix", [".tar", ".tar.gz", ".tar.zst"])
+def test_import_truncated_archive(tmp_path, suffix):
+    if suffix == ".tar.zst" and zstandard is None:
+        pytest.skip("needs zstandard")
+    # incompressible, so every format breaks off after the first file
+    rng = random.Random(0)
+    raw = {f"noarch/pkg-{n}.tar.bz2": rng.getrandbits(8 * 200_000).to_bytes(200_000, "little") for n in range(3)}
+    for path, data in raw.items():
+        (tmp_path / path.split("/")[1]).write_bytes(data)
+    archive = tmp_path / f"channel{suffix}"
+    with ChannelArchiveWriter(archive, "my-channel") as writer:
+        writer.add_manifest([{"path": path, "size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+                             for path, data in raw.items()])
+        for path in raw:
+            writer.add_file(path, tmp_path / path.split("/")[1])
+    # cut the archive in half
+    data = archive.read_bytes()
+    archive.write_bytes(data[:len(data) // 2])
+
+    result = CliRunner().invoke(import_command, ["--archive", str(archive), "--dest", str(tmp_path / "imported")])
+
+    assert result.exception is None or isinstance(result.exception, SystemExit), result.output
+    assert result.exit_code & VERIFY_MISSING
+    channel_dir = tmp_path / "imported" / "my-channel"
+    files = [path.relative_to(channel_dir).as_posix() for path in channel_dir.rglob("*") if path.is_file()]
+    # no .part files left behind, whatever was extracted is intact
+    assert not [path for path in files if path.endswith(".part")]
+    for path in files:
+        if path in raw:
+            assert (channel_dir / path).read_bytes() == raw[path]
+    assert len([path for path in files if path in raw]) < len(raw)
@@ -0,0 +1,28 @@
+import subprocess
+import sys
+import time
+
+# imported on first use only, see conda_vendor.conda_lock_wrapper and conda_vendor.session
+HEAVY_MODULES = ["conda_lock", "conda_build", "requests", "ruamel.yaml", "yaml", "pkg_resources"]
+
+
+def _run(*args):
+    start = time.perf_counter()
+    subprocess.check_call([sys.executable, *args], stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def test_import_skips_heavy_dependencies():
+    code = (
+        "import sys, conda_vendor.__main__\n"
+        f"print([name for name in {HEAVY_MODULES!r} if name in sys.modules])"
+    )
+    output = subprocess.check_output([sys.executable, "-c", code], universal_newlines=True)
+    assert output.strip() == "[]"
+
+
+def test_help_starts_fast():
+    # best of three, relative to a bare interpreter
+    interpreter = min(_run("-c", "pass") for _ in range(3))
+    help_time = min(_run("-m", "conda_vendor", "--help") for _ in range(3))
+    assert help_time - interpreter < 0.3
@@ -10,6 +10,7 @@ from requests.adapters import urldefragauth
 from yaml import safe_load
 from ruamel.yaml import YAML
 from conda_vendor.conda_vendor import improved_download
+from conda_vendor.session import configure_session, get_session
 
 from .conftest import mock_response
 
@@ -25,6 +26,21 @@ def test_improved_download(mock) -> None:
     assert isinstance(result, Response)
 
 
+def test_improved_download_reuses_session() -> None:
+    session = configure_session(pool_size=4, host_pool_sizes={"conda.anaconda.org": 32})
+    assert get_session() is session
+    assert get_session() is get_session()
+
+    default_adapter = session.get_adapter("https://repo.anaconda.com/pkgs/main/noarch/repodata.json")
+    host_adapter = session.get_adapter("https://conda.anaconda.org/conda-forge/noarch/repodata.json")
+    assert default_adapter._pool_maxsize == 4
+    assert host_adapter._pool_maxsize == 32
+
+    retry = host_adapter.max_retries
+    assert retry.read and retry.connect and retry.status
+    assert {429, 500, 503}.issubset(retry.status_forcelist)
+
+
 #@patch("conda_vendor.conda_channel.improved_download")
 #def test_CondaChannel_fetch_and_filter_repodata(mock_download, conda_channel_fixture):
 #
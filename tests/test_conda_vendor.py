@@ -2,7 +2,16 @@ from requests.adapters import urldefragauth
 from conda_vendor.conda_vendor import (
         get_conda_platform,
         reconstruct_repodata_json,
+        download_solved_pkgs,
+        stream_download,
+        create_vendored_dir,
+        hotfix_vendored_repodata_json,
+        merge_fetch_actions,
+        expand_environment_files,
+        update,
         )
+from conda_vendor.errors import CondaVendorError
+from conda_vendor.mirrors import MirrorMap, configure_mirrors
 import pytest
 from requests import Response
 import hashlib
@@ -11,9 +20,17 @@ from ruamel.yaml import YAML
 from requests import Response
 from unittest import TestCase
 from unittest.mock import Mock, patch, call, mock_open
+from requests.exceptions import ChunkedEncodingError
 from yaml import safe_load
 from yaml.loader import SafeLoader
 import os
+import threading
+import time
+import requests
+from collections import Counter
+from click.testing import CliRunner
+
+from .conftest import fake_open_repodata, mock_response
 
 
 @patch("struct.calcsize")
@@ -34,4 +51,307 @@ def test_get_conda_platform_custom():
     assert set(actual_returns) == set(expected_returns)
 
 
-    
+@patch("conda_vendor.conda_vendor.improved_download")
+def test_download_solved_pkgs_parallel(mock, tmp_path) -> None:
+    (tmp_path / "linux-64").mkdir()
+    (tmp_path / "noarch").mkdir()
+    raw = b"DUMMY_DATA"
+    fetch_actions = [
+        {"fn": f"pkg-{i}.tar.bz2", "url": f"https://NOT_REAL.com/pkg-{i}.tar.bz2",
+         "sha256": hashlib.sha256(raw).hexdigest(),
+         "subdir": "noarch" if i % 2 else "linux-64"}
+        for i in range(10)
+    ]
+    mock.return_value = mock_response(content=raw)
+    download_solved_pkgs(fetch_actions, tmp_path, "linux-64", jobs=4)
+    assert mock.call_count == 10
+    for pkg in fetch_actions:
+        assert (tmp_path / pkg["subdir"] / pkg["fn"]).read_bytes() == raw
+
+
+@patch("conda_vendor.conda_vendor.improved_download")
+def test_download_solved_pkgs_host_limit_applies_to_mirror(mock, tmp_path) -> None:
+    (tmp_path / "noarch").mkdir()
+    raw = b"DUMMY_DATA"
+    fetch_actions = [
+        {"fn": f"pkg-{i}.tar.bz2", "url": f"https://NOT_REAL.com/conda-forge/noarch/pkg-{i}.tar.bz2",
+         "sha256": hashlib.sha256(raw).hexdigest(), "subdir": "noarch"}
+        for i in range(8)
+    ]
+    lock = threading.Lock()
+    running = Counter()
+    peak = Counter()
+
+    # the channel itself is down, every package fails over to the mirror
+    def _download(url, **kwargs):
+        if url.startswith("https://NOT_REAL.com/"):
+            return mock_response(status=404, raise_for_status=requests.exceptions.HTTPError(url))
+        with lock:
+            running[url] += 1
+            peak["mirror"] = max(peak["mirror"], sum(running.values()))
+        time.sleep(0.01)
+        with lock:
+            running[url] -= 1
+        return mock_response(content=raw)
+
+    mock.side_effect = _download
+    configure_mirrors(MirrorMap({"https://NOT_REAL.com/conda-forge": ["https://artifactory.internal/conda-forge"]}))
+    try:
+        with patch.object(MirrorMap, "_probe"):
+            download_solved_pkgs(fetch_actions, tmp_path, "noarch", jobs=4, host_limits={"artifactory.internal": 1})
+    finally:
+        configure_mirrors(None)
+
+    assert peak["mirror"] == 1
+    for pkg in fetch_actions:
+        assert (tmp_path / "noarch" / pkg["fn"]).read_bytes() == raw
+
+
+@patch("conda_vendor.conda_vendor.improved_download")
+def test_download_solved_pkgs_sha256_mismatch(mock, tmp_path) -> None:
+    (tmp_path / "linux-64").mkdir()
+    fetch_actions = [
+        {"fn": "pkg.tar.bz2", "url": "https://NOT_REAL.com/pkg.tar.bz2",
+         "sha256": hashlib.sha256(b"EXPECTED").hexdigest(), "subdir": "linux-64"}
+    ]
+    mock.return_value = mock_response(content=b"CORRUPT")
+    with pytest.raises(RuntimeError):
+        download_solved_pkgs(fetch_actions, tmp_path, "linux-64", jobs=2)
+    # no truncated package or temporary file is left behind
+    assert os.listdir(tmp_path / "linux-64") == []
+
+
+@patch("conda_vendor.conda_vendor.improved_download")
+def test_stream_download(mock, tmp_path) -> None:
+    chunks = [b"CHUNK1", b"CHUNK2", b"CHUNK3"]
+    expected_raw = b"".join(chunks)
+    response = mock_response()
+    response.iter_content = Mock(return_value=iter(chunks))
+    mock.return_value = response
+    dest_file = tmp_path / "pkg.conda"
+    stream_download("https://NOT_REAL.com/pkg.conda", dest_file, hashlib.sha256(expected_raw).hexdigest())
+    assert mock.call_args == call("https://NOT_REAL.com/pkg.conda", stream=True, headers={}, session=None)
+    assert dest_file.read_bytes() == expected_raw
+    assert os.listdir(tmp_path) == ["pkg.conda"]
+
+
+@patch("conda_vendor.conda_vendor.improved_download")
+def test_download_solved_pkgs_skip_existing(mock, tmp_path) -> None:
+    (tmp_path / "noarch").mkdir()
+    raw = b"DUMMY_DATA"
+    fetch_actions = [
+        {"fn": f"pkg-{i}.tar.bz2", "url": f"https://NOT_REAL.com/pkg-{i}.tar.bz2",
+         "sha256": hashlib.sha256(raw).hexdigest(), "subdir": "noarch"}
+        for i in range(3)
+    ]
+    # pkg-0 survived the interrupted run, pkg-1 was left corrupt
+    (tmp_path / "noarch" / "pkg-0.tar.bz2").write_bytes(raw)
+    (tmp_path / "noarch" / "pkg-1.tar.bz2").write_bytes(b"CORRUPT")
+    (tmp_path / "noarch" / ".pkg-2.tar.bz2.abc.part").write_bytes(b"DUMMY")
+    mock.return_value = mock_response(content=raw)
+
+    results = download_solved_pkgs(fetch_actions, tmp_path, "linux-64", skip_existing=True)
+    assert results == {"present": 1, "downloaded": 2}
+    assert mock.call_count == 2
+    assert sorted(os.listdir(tmp_path / "noarch")) == [pkg["fn"] for pkg in fetch_actions]
+    for pkg in fetch_actions:
+        assert (tmp_path / "noarch" / pkg["fn"]).read_bytes() == raw
+
+
+@patch("conda_vendor.conda_vendor.improved_download")
+def test_download_solved_pkgs_links_local_channel(mock, tmp_path) -> None:
+    mirror = tmp_path / "mirror" / "noarch"
+    mirror.mkdir(parents=True)
+    (tmp_path / "vendored" / "noarch").mkdir(parents=True)
+    raw = b"DUMMY_DATA"
+    (mirror / "a-1.tar.bz2").write_bytes(raw)
+    (mirror / "b-1.tar.bz2").write_bytes(raw)
+    fetch_actions = [
+        {"fn": "a-1.tar.bz2", "url": (mirror / "a-1.tar.bz2").as_uri(), "sha256": hashlib.sha256(raw).hexdigest(), "subdir": "noarch"},
+        {"fn": "b-1.tar.bz2", "url": str(mirror / "b-1.tar.bz2"), "sha256": hashlib.sha256(raw).hexdigest(), "subdir": "noarch"},
+    ]
+
+    results = download_solved_pkgs(fetch_actions, tmp_path / "vendored", "linux-64")
+    assert results == {"linked": 2}
+    mock.assert_not_called()
+    for pkg in fetch_actions:
+        assert os.path.samefile(tmp_path / "vendored" / "noarch" / pkg["fn"], mirror / pkg["fn"])
+
+    (mirror / "a-1.tar.bz2").write_bytes(b"CORRUPT")
+    with pytest.raises(RuntimeError):
+        download_solved_pkgs(fetch_actions[:1], tmp_path / "vendored", "linux-64")
+
+
+def test_create_vendored_dir_exist_ok(tmp_path) -> None:
+    env_file = tmp_path / "env.yml"
+    env_file.write_text("name: minimal_env\n")
+    path = create_vendored_dir(env_file, "linux-64", tmp_path)
+    (path / "linux-64" / "pkg.tar.bz2").write_bytes(b"DUMMY")
+    with pytest.raises(CondaVendorError):
+        create_vendored_dir(env_file, "linux-64", tmp_path)
+    assert create_vendored_dir(env_file, "linux-64", tmp_path, exist_ok=True) == path
+    assert (path / "linux-64" / "pkg.tar.bz2").exists()
+
+
+def _broken_iter_content(chunks):
+    def _iter_content(chunk_size=1):
+        yield from chunks
+        raise ChunkedEncodingError("Connection reset by peer")
+    return _iter_content
+
+
+@patch("time.sleep")
+@patch("conda_vendor.conda_vendor.improved_download")
+def test_stream_download_resumes_with_range(mock, mock_sleep, tmp_path) -> None:
+    expected_raw = b"CHUNK1CHUNK2CHUNK3"
+    first = mock_response()
+    first.headers = {"ETag": '"abc"'}
+    first.iter_content = Mock(side_effect=_broken_iter_content([b"CHUNK1", b"CHUNK2"]))
+    second = mock_response(status=206)
+    second.headers = {"ETag": '"abc"', "Content-Range": "bytes 12-17/18"}
+    second.iter_content = Mock(return_value=iter([b"CHUNK3"]))
+    mock.side_effect = [first, second]
+
+    dest_file = tmp_path / "pkg.conda"
+    stream_download("https://NOT_REAL.com/pkg.conda", dest_file, hashlib.sha256(expected_raw).hexdigest())
+    assert mock.call_args_list[1][1]["headers"] == {"Range": "bytes=12-", "If-Range": '"abc"'}
+    assert dest_file.read_bytes() == expected_raw
+    assert os.listdir(tmp_path) == ["pkg.conda"]
+
+
+@patch("conda_vendor.conda_vendor.improved_download")
+def test_stream_download_refetches_changed_artifact(mock, tmp_path) -> None:
+    expected_raw = b"NEW_ARTIFACT"
+    # left behind by a previous run against an older upstream artifact
+    (tmp_path / "pkg.conda.part").write_bytes(b"OLD_")
+    (tmp_path / "pkg.conda.part.validator").write_text('"old"')
+    # If-Range didn't match, so the server sends the full artifact
+    response = mock_response(content=expected_raw)
+    response.headers = {"ETag": '"new"'}
+    mock.return_value = response
+
+    dest_file = tmp_path / "pkg.conda"
+    stream_download("https://NOT_REAL.com/pkg.conda", dest_file, hashlib.sha256(expected_raw).hexdigest())
+    assert mock.call_args[1]["headers"] == {"Range": "bytes=4-", "If-Range": '"old"'}
+    assert dest_file.read_bytes() == expected_raw
+    assert os.listdir(tmp_path) == ["pkg.conda"]
+
+
+def test_hotfix_vendored_repodata_json_merges_channels(tmp_path) -> None:
+    main, forge = "https://NOT_REAL.com/main/linux-64", "https://NOT_REAL.com/conda-forge/linux-64"
+    forge_noarch = "https://NOT_REAL.com/conda-forge/noarch"
+    upstream = {
+        f"{main}/repodata.json": {"packages": {"a-1.tar.bz2": {"id": 1}, "x-1.tar.bz2": {"id": 2}},
+                                  "packages.conda": {"b-1.conda": {"id": 3}}},
+        f"{forge}/repodata.json": {"packages": {"c-1.tar.bz2": {"id": 4}}, "packages.conda": {}},
+        f"{forge_noarch}/repodata.json": {"packages": {}, "packages.conda": {"d-1.conda": {"id": 5}}},
+    }
+    fetch_actions = [
+        {"channel": channel, "subdir": channel.rsplit("/", 1)[1], "fn": fn,
+         "url": f"{channel}/{fn}", "sha256": "0" * 64, "timestamp": 0}
+        for channel, fn in [(main, "a-1.tar.bz2"), (main, "b-1.conda"), (forge, "c-1.tar.bz2"), (forge_noarch, "d-1.conda")]
+    ]
+    (tmp_path / "linux-64").mkdir()
+    (tmp_path / "noarch").mkdir()
+
+    with patch("conda_vendor.conda_vendor.open_repodata", fake_open_repodata(upstream)):
+        hotfix_vendored_repodata_json(fetch_actions, tmp_path)
+
+    linux_64 = json.loads((tmp_path / "linux-64" / "repodata.json").read_text())
+    noarch = json.loads((tmp_path / "noarch" / "repodata.json").read_text())
+    assert linux_64 == {
+        "info": {"subdir": "linux-64"},
+        "packages": {"a-1.tar.bz2": {"id": 1}, "c-1.tar.bz2": {"id": 4}},
+        "packages.conda": {"b-1.conda": {"id": 3}},
+    }
+    assert noarch == {"info": {"subdir": "noarch"}, "packages": {}, "packages.conda": {"d-1.conda": {"id": 5}}}
+
+
+def test_merge_fetch_actions_shares_noarch(tmp_path) -> None:
+    linux_64 = [{"subdir": "linux-64", "fn": "python-3.9.tar.bz2"}, {"subdir": "noarch", "fn": "pip-22.tar.bz2"}]
+    linux_aarch64 = [{"subdir": "linux-aarch64", "fn": "python-3.9.tar.bz2"}, {"subdir": "noarch", "fn": "pip-22.tar.bz2"}]
+    merged = merge_fetch_actions(linux_64, linux_aarch64)
+    assert sorted((pkg["subdir"], pkg["fn"]) for pkg in merged) == [
+        ("linux-64", "python-3.9.tar.bz2"),
+        ("linux-aarch64", "python-3.9.tar.bz2"),
+        ("noarch", "pip-22.tar.bz2"),
+    ]
+
+    env_file = tmp_path / "env.yml"
+    env_file.write_text("name: minimal_env\n")
+    path = create_vendored_dir(env_file, ["linux-64", "linux-aarch64", "osx-arm64"], tmp_path)
+    assert sorted(os.listdir(path)) == ["linux-64", "linux-aarch64", "noarch", "osx-arm64"]
+
+
+def test_merge_fetch_actions_deduplicates_by_sha256() -> None:
+    env_a = [{"subdir": "linux-64", "fn": "openssl-3.0.tar.bz2", "sha256": "a" * 64, "channel": "main"},
+             {"subdir": "linux-64", "fn": "numpy-1.24.tar.bz2", "sha256": "b" * 64, "channel": "main"}]
+    env_b = [{"subdir": "linux-64", "fn": "openssl-3.0.tar.bz2", "sha256": "a" * 64, "channel": "main"},
+             {"subdir": "linux-64", "fn": "numpy-1.24.tar.bz2", "sha256": "c" * 64, "channel": "conda-forge"}]
+    merged = merge_fetch_actions(env_a, env_b)
+    assert merged == env_a
+
+
+def test_expand_environment_files(tmp_path) -> None:
+    for name in ["a.yaml", "b.yml", "notes.txt"]:
+        (tmp_path / "envs" / name).parent.mkdir(exist_ok=True)
+        (tmp_path / "envs" / name).write_text("name: env\n")
+    single = tmp_path / "single.yaml"
+    single.write_text("name: single\n")
+
+    assert expand_environment_files([str(tmp_path / "envs")]) == [tmp_path / "envs" / "a.yaml", tmp_path / "envs" / "b.yml"]
+    assert expand_environment_files([str(single), str(tmp_path / "envs" / "*.yaml"), str(single)]) == [single, tmp_path / "envs" / "a.yaml"]
+    with pytest.raises(CondaVendorError):
+        expand_environment_files([str(tmp_path / "missing-*.yaml")])
+
+
+def test_cli_reports_conda_vendor_error(tmp_path) -> None:
+    result = CliRunner().invoke(update, ["--file", str(tmp_path / "missing-*.yaml"), "--channel-dir", str(tmp_path)])
+    assert result.exit_code == 1
+    assert "No environment files found" in result.output
+
+
+@pytest.mark.parametrize("prune", [False, True])
+def test_update_downloads_only_changes(tmp_path, prune) -> None:
+    channel = "https://NOT_REAL.com/conda-forge/linux-64"
+    raw = {"a-1.tar.bz2": b"A", "b-1.tar.bz2": b"B", "c-1.tar.bz2": b"C2", "d-1.tar.bz2": b"D"}
+    entry = {fn: {"sha256": hashlib.sha256(content).hexdigest(), "size": len(content)} for fn, content in raw.items()}
+
+    # vendored last week: a-1, b-1 and an older build of c-1
+    channel_dir = tmp_path / "vendored"
+    (channel_dir / "linux-64").mkdir(parents=True)
+    for fn, content in [("a-1.tar.bz2", b"A"), ("b-1.tar.bz2", b"B"), ("c-1.tar.bz2", b"C1")]:
+        (channel_dir / "linux-64" / fn).write_bytes(content)
+    old_entries = {"a-1.tar.bz2": entry["a-1.tar.bz2"], "b-1.tar.bz2": entry["b-1.tar.bz2"],
+                   "c-1.tar.bz2": {"sha256": hashlib.sha256(b"C1").hexdigest()}}
+    (channel_dir / "linux-64" / "repodata.json").write_text(json.dumps({"packages": old_entries, "packages.conda": {}}))
+
+    # this week's solve drops b-1, rebuilds c-1 and adds d-1
+    fetch_actions = [{"channel": channel, "subdir": "linux-64", "fn": fn, "url": f"{channel}/{fn}", **entry[fn]}
+                     for fn in ("a-1.tar.bz2", "c-1.tar.bz2", "d-1.tar.bz2")]
+    upstream = {f"{channel}/repodata.json": {"packages": entry, "packages.conda": {}}}
+    env_file = tmp_path / "env.yml"
+    env_file.write_text("name: minimal_env\n")
+
+    with patch("conda_vendor.conda_vendor.get_lock_spec_for_environment_file", Mock()), \
+            patch("conda_vendor.conda_vendor.solve_environments", Mock(return_value=fetch_actions)), \
+            patch("conda_vendor.conda_vendor.open_repodata", fake_open_repodata(upstream)), \
+            patch("conda_vendor.conda_vendor.improved_download",
+                  side_effect=lambda url, **kwargs: mock_response(content=raw[url.rsplit("/", 1)[1]])) as download:
+        result = CliRunner().invoke(update, ["--file", str(env_file), "--channel-dir", str(channel_dir), "--no-solve-cache",
+                                             *(["--prune"] if prune else [])])
+
+    assert result.exit_code == 0, result.output
+    assert sorted(call[0][0] for call in download.call_args_list) == [f"{channel}/c-1.tar.bz2", f"{channel}/d-1.tar.bz2"]
+    assert (channel_dir / "linux-64" / "c-1.tar.bz2").read_bytes() == b"C2"
+    assert (channel_dir / "linux-64" / "b-1.tar.bz2").exists() != prune
+
+    repodata = json.loads((channel_dir / "linux-64" / "repodata.json").read_text())
+    expected_fns = ["a-1.tar.bz2", "c-1.tar.bz2", "d-1.tar.bz2"] + ([] if prune else ["b-1.tar.bz2"])
+    assert sorted(repodata["packages"]) == sorted(expected_fns)
+
+    report = json.loads((channel_dir / "update-report.json").read_text())
+    assert [pkg["fn"] for pkg in report["added"]] == ["d-1.tar.bz2"]
+    assert [pkg["fn"] for pkg in report["changed"]] == ["c-1.tar.bz2"]
+    assert report["removed"] == [{"subdir": "linux-64", "fn": "b-1.tar.bz2"}]
+    assert report["unchanged"] == 1
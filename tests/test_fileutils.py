@@ -0,0 +1,42 @@
+import errno
+import hashlib
+from pathlib import Path
+from unittest.mock import patch
+
+from conda_vendor.fileutils import file_hasher, hash_file, link_or_copy, local_path_for_url, normalize_channel_url
+
+
+def test_local_path_for_url(tmp_path):
+    assert local_path_for_url((tmp_path / "linux-64" / "repodata.json").as_uri()) == tmp_path / "linux-64" / "repodata.json"
+    assert local_path_for_url("/srv/mirror/conda-forge") == Path("/srv/mirror/conda-forge")
+    assert local_path_for_url("https://conda.anaconda.org/conda-forge") is None
+    assert local_path_for_url("conda-forge") is None
+    assert normalize_channel_url(str(tmp_path)) == tmp_path.resolve().as_uri()
+    assert normalize_channel_url("conda-forge") == "conda-forge"
+
+
+def test_hash_file(tmp_path):
+    (tmp_path / "pkg.tar.bz2").write_bytes(b"DUMMY_DATA" * 1000)
+    (tmp_path / "empty.tar.bz2").write_bytes(b"")
+    assert hash_file(tmp_path / "pkg.tar.bz2", chunk_size=4096) == hashlib.sha256(b"DUMMY_DATA" * 1000).hexdigest()
+    assert hash_file(tmp_path / "pkg.tar.bz2", "md5") == hashlib.md5(b"DUMMY_DATA" * 1000).hexdigest()
+    assert hash_file(tmp_path / "empty.tar.bz2") == hashlib.sha256().hexdigest()
+
+    # the hasher keeps going, as a resumed download does
+    hasher = file_hasher(tmp_path / "pkg.tar.bz2")
+    hasher.update(b"MORE")
+    assert hasher.hexdigest() == hashlib.sha256(b"DUMMY_DATA" * 1000 + b"MORE").hexdigest()
+
+
+def test_link_or_copy_falls_back_to_copy(tmp_path):
+    src = tmp_path / "src.tar.bz2"
+    src.write_bytes(b"DUMMY_DATA")
+    unsupported = OSError(errno.EXDEV, "Invalid cross-device link")
+
+    assert link_or_copy(src, tmp_path / "linked.tar.bz2") == "hardlink"
+    with patch("os.link", side_effect=unsupported), \
+            patch("conda_vendor.fileutils._reflink", side_effect=OSError(errno.EOPNOTSUPP, "Not supported")), \
+            patch("conda_vendor.fileutils._copy_file_range", side_effect=unsupported):
+        assert link_or_copy(src, tmp_path / "copied.tar.bz2") == "copy"
+    assert (tmp_path / "copied.tar.bz2").read_bytes() == b"DUMMY_DATA"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["copied.tar.bz2", "linked.tar.bz2", "src.tar.bz2"]
@@ -0,0 +1,112 @@
+import bz2
+import json
+from unittest.mock import patch
+
+from conda_vendor.index import current_repodata, version_key, version_matches, write_channel_index, zstandard
+
+
+def _record(name, version, build_number=0, **fields):
+    return {"name": name, "version": version, "build": f"h_{build_number}", "build_number": build_number, **fields}
+
+
+def test_version_key():
+    versions = ["1.0.dev1", "1.0a1", "1.0", "1.0.post1", "1.1", "1.10", "2"]
+    assert sorted(reversed(versions), key=version_key) == versions
+
+
+def test_version_key_epoch_and_local_version():
+    versions = ["1.0", "1.0+1", "1.0+2", "1.1", "1!0.9", "2!0.1"]
+    assert sorted(reversed(versions), key=version_key) == versions
+    assert version_key("0!1.0") == version_key("1.0")
+
+
+def test_version_matches():
+    assert version_matches("3.8.10", ">=3.8,<3.9.0a0")
+    assert not version_matches("3.9.0", ">=3.8,<3.9.0a0")
+    assert version_matches("1.2.3", "1.2.*")
+    assert version_matches("1.2.3", "1.2")
+    assert not version_matches("1.20", "1.2")
+    assert version_matches("1.3.1", "1.2.*|1.3.*")
+    assert version_matches("2.5", "~=2.3")
+    assert not version_matches("3.0", "~=2.3")
+    assert version_matches("1.0", "*")
+
+
+def test_current_repodata_keeps_newest_version():
+    repodata = {
+        "info": {"subdir": "linux-64"},
+        "packages": {
+            "python-3.9.5-h_0.tar.bz2": _record("python", "3.9.5"),
+            "python-3.10.1-h_0.tar.bz2": _record("python", "3.10.1"),
+        },
+        "packages.conda": {
+            "python-3.10.1-h_1.conda": _record("python", "3.10.1", 1),
+            "zlib-1.2.11-h_0.conda": _record("zlib", "1.2.11"),
+        },
+    }
+
+    current = current_repodata(repodata)
+
+    assert current["info"] == {"subdir": "linux-64"}
+    assert list(current["packages"]) == ["python-3.10.1-h_0.tar.bz2"]
+    assert list(current["packages.conda"]) == ["python-3.10.1-h_1.conda", "zlib-1.2.11-h_0.conda"]
+
+
+def test_current_repodata_keeps_dependencies():
+    repodata = {
+        "info": {"subdir": "linux-64"},
+        "packages": {
+            "app-2.0-h_0.tar.bz2": _record("app", "2.0", depends=["lib >=1.0,<2", "__glibc >=2.17"]),
+            "lib-1.5-h_0.tar.bz2": _record("lib", "1.5", depends=["zlib 1.2.*"]),
+            "lib-2.1-h_0.tar.bz2": _record("lib", "2.1"),
+            "zlib-1.2.11-h_0.tar.bz2": _record("zlib", "1.2.11"),
+            "zlib-1.3-h_0.tar.bz2": _record("zlib", "1.3"),
+            "old-1.0-h_0.tar.bz2": _record("old", "1.0"),
+            "old-1!0.5-h_0.tar.bz2": _record("old", "1!0.5"),
+        },
+        "packages.conda": {},
+    }
+
+    # lib 2.1 doesn't satisfy app, so lib 1.5 stays and with it zlib 1.2.11
+    assert sorted(current_repodata(repodata)["packages"]) == [
+        "app-2.0-h_0.tar.bz2", "lib-1.5-h_0.tar.bz2", "lib-2.1-h_0.tar.bz2",
+        "old-1!0.5-h_0.tar.bz2", "zlib-1.2.11-h_0.tar.bz2", "zlib-1.3-h_0.tar.bz2",
+    ]
+
+
+def test_write_channel_index(tmp_path):
+    (tmp_path / "linux-64").mkdir()
+    repodata = {
+        "info": {"subdir": "linux-64"},
+        "packages": {"zlib-1.2.11-h_0.tar.bz2": _record("zlib", "1.2.11", license="Zlib", timestamp=1600000000000)},
+        "packages.conda": {},
+    }
+    (tmp_path / "linux-64" / "repodata.json").write_text(json.dumps(repodata))
+
+    assert write_channel_index(tmp_path) == ["linux-64", "noarch"]
+
+    # conda needs noarch/repodata.json even without noarch packages
+    assert json.loads((tmp_path / "noarch" / "repodata.json").read_text()) == \
+        {"info": {"subdir": "noarch"}, "packages": {}, "packages.conda": {}}
+    for subdir in ("linux-64", "noarch"):
+        raw = (tmp_path / subdir / "repodata.json").read_bytes()
+        assert bz2.decompress((tmp_path / subdir / "repodata.json.bz2").read_bytes()) == raw
+        if zstandard is not None:
+            assert zstandard.ZstdDecompressor().decompress((tmp_path / subdir / "repodata.json.zst").read_bytes()) == raw
+        assert (tmp_path / subdir / "current_repodata.json").exists()
+
+    assert json.loads((tmp_path / "channeldata.json").read_text()) == {
+        "channeldata_version": 1,
+        "subdirs": ["linux-64", "noarch"],
+        "packages": {"zlib": {"subdirs": ["linux-64"], "version": "1.2.11", "license": "Zlib", "timestamp": 1600000000000}},
+    }
+
+
+def test_write_channel_index_drops_stale_zst(tmp_path):
+    (tmp_path / "noarch").mkdir()
+    (tmp_path / "noarch" / "repodata.json.zst").write_bytes(b"stale")
+
+    with patch("conda_vendor.index.zstandard", None):
+        write_channel_index(tmp_path)
+
+    assert not (tmp_path / "noarch" / "repodata.json.zst").exists()
@@ -0,0 +1,117 @@
+import json
+from unittest.mock import patch
+
+import pytest
+import yaml
+from click.testing import CliRunner
+
+from conda_vendor.conda_vendor import ironbank_gen
+from conda_vendor.iron_bank_generator import (
+    iter_channel_resources,
+    iter_dry_run_resources,
+    iter_lockfile_resources,
+    yaml_dump_ironbank_manifest,
+)
+
+CHANNEL = "https://conda.anaconda.org/conda-forge"
+
+
+def _fetch_action(subdir, fn, sha256):
+    return {"url": f"{CHANNEL}/{subdir}/{fn}", "fn": fn, "sha256": sha256, "subdir": subdir,
+            "channel": f"{CHANNEL}/{subdir}"}
+
+
+def _write_channel(channel_dir, packages):
+    for subdir in {subdir for subdir, _, _ in packages}:
+        (channel_dir / subdir).mkdir(parents=True)
+        repodata = {"info": {"subdir": subdir}, "packages": {}, "packages.conda": {}}
+        for pkg_subdir, fn, sha256 in packages:
+            if pkg_subdir == subdir:
+                repodata["packages.conda" if fn.endswith(".conda") else "packages"][fn] = {"sha256": sha256}
+        (channel_dir / subdir / "repodata.json").write_text(json.dumps(repodata))
+
+
+def test_yaml_dump_ironbank_manifest(tmp_path):
+    fetch_actions = [
+        _fetch_action("linux-64", "python-3.9.5-h_0.tar.bz2", "3988e45e"),
+        # digits only, must stay a string
+        _fetch_action("noarch", "tzdata-2021e-he74cb21_0.tar.bz2", "1234"),
+        _fetch_action("noarch", "tzdata-2021e-he74cb21_0.tar.bz2", "1234"),
+    ]
+    manifest_file = tmp_path / "ib_manifest.yaml"
+
+    assert yaml_dump_ironbank_manifest(iter(fetch_actions), manifest_file) == 2
+
+    assert yaml.safe_load(manifest_file.read_text()) == {"resources": [
+        {"url": pkg["url"], "filename": pkg["fn"], "validation": {"type": "sha256", "value": pkg["sha256"]}}
+        for pkg in fetch_actions[:2]
+    ]}
+
+
+def test_iter_channel_resources(tmp_path):
+    _write_channel(tmp_path, [("linux-64", "a-1-0.conda", "aa"), ("noarch", "b-1-0.tar.bz2", "bb")])
+
+    assert list(iter_channel_resources(tmp_path, CHANNEL + "/")) == [
+        {"url": f"{CHANNEL}/linux-64/a-1-0.conda", "fn": "a-1-0.conda", "sha256": "aa"},
+        {"url": f"{CHANNEL}/noarch/b-1-0.tar.bz2", "fn": "b-1-0.tar.bz2", "sha256": "bb"},
+    ]
+
+
+@pytest.mark.parametrize("output", ["text", "quiet", "ndjson"])
+def test_iter_dry_run_resources(tmp_path, output):
+    fetch_actions = [_fetch_action("linux-64", "a-1-0.conda", "aa"), _fetch_action("noarch", "b-1-0.tar.bz2", "bb")]
+    if output == "ndjson":
+        text = "\n".join(json.dumps({"event": "fetch_action", **pkg}) for pkg in fetch_actions) + '\n{"event":"done"}\n'
+    else:
+        text = json.dumps(fetch_actions, indent=4) + "\n"
+        if output == "text":
+            text = "Dry Run - Will Not Download Files\nDry Run Complete!\n" + text
+    dry_run_file = tmp_path / "dry-run.json"
+    dry_run_file.write_text(text)
+
+    assert [(pkg["url"], pkg["sha256"]) for pkg in iter_dry_run_resources(dry_run_file)] == \
+        [(pkg["url"], pkg["sha256"]) for pkg in fetch_actions]
+
+
+def test_iter_lockfile_resources(tmp_path):
+    lockfile = tmp_path / "conda-lock.yml"
+    lockfile.write_text(yaml.safe_dump({"version": 1, "package": [
+        {"name": "a", "manager": "conda", "platform": "linux-64", "url": f"{CHANNEL}/linux-64/a-1-0.conda",
+         "hash": {"md5": "00", "sha256": "aa"}},
+        {"name": "requests", "manager": "pip", "platform": "linux-64", "url": "https://files.pythonhosted.org/r.whl",
+         "hash": {"sha256": "cc"}},
+    ]}))
+
+    assert list(iter_lockfile_resources(lockfile)) == [
+        {"url": f"{CHANNEL}/linux-64/a-1-0.conda", "fn": "a-1-0.conda", "sha256": "aa"},
+    ]
+
+
+def test_ironbank_gen_from_channel_without_solving(tmp_path, monkeypatch):
+    packages = [("linux-64", f"pkg{n}-1.0-0.conda", f"{n:064x}") for n in range(2500)]
+    _write_channel(tmp_path / "channel", packages)
+    monkeypatch.chdir(tmp_path)
+
+    with patch("conda_vendor.conda_vendor.solve_fetch_actions", side_effect=AssertionError("solved")) as solve:
+        result = CliRunner().invoke(ironbank_gen, ["--channel-dir", str(tmp_path / "channel"), "--channel-url", CHANNEL])
+
+    assert result.exit_code == 0, result.output
+    assert not solve.called
+    # more than one dump of RESOURCES_PER_DUMP entries
+    resources = yaml.safe_load((tmp_path / "ib_manifest.yaml").read_text())["resources"]
+    assert [resource["filename"] for resource in resources] == [fn for _, fn, _ in packages]
+
+    result = CliRunner().invoke(ironbank_gen, ["--channel-dir", str(tmp_path / "channel")])
+    assert result.exit_code == 2
+
+
+def test_ironbank_gen_malformed_lockfile(tmp_path, monkeypatch):
+    lockfile = tmp_path / "conda-lock.yml"
+    lockfile.write_text("package: [unclosed\n")
+    monkeypatch.chdir(tmp_path)
+
+    result = CliRunner().invoke(ironbank_gen, ["--lockfile", str(lockfile)])
+
+    assert result.exit_code == 2
+    assert "--lockfile" in result.output
+    assert not (tmp_path / "ib_manifest.yaml").exists()
@@ -0,0 +1,85 @@
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+
+from conda_vendor.errors import ChecksumError
+from conda_vendor.mirrors import MirrorMap, load_mirror_map
+
+CHANNEL = "https://conda.anaconda.org/conda-forge"
+PROXY_A = "https://proxy-a.example.com/conda-forge"
+PROXY_B = "https://proxy-b.example.com/conda-forge"
+PKG_PATH = "/linux-64/python-3.9.5-h49503c6_0_cpython.tar.bz2"
+
+
+def _head_with_latency(latencies, clock):
+    def _head(url, **kwargs):
+        base = url[:-len("/noarch/repodata.json")]
+        if latencies[base] is None:
+            raise requests.exceptions.ConnectTimeout(url)
+        clock.append(latencies[base])
+        return Mock(ok=True)
+    return _head
+
+
+def test_candidates_without_mirrors():
+    assert MirrorMap().candidates(CHANNEL + PKG_PATH) == [CHANNEL + PKG_PATH]
+
+
+@patch("conda_vendor.mirrors.time.monotonic")
+@patch("conda_vendor.mirrors.get_session")
+def test_candidates_fastest_healthy_first(mock_get_session, mock_monotonic):
+    # each probe advances the clock by its latency, probes run one at a time here
+    clock = [0.0]
+    mock_monotonic.side_effect = lambda: sum(clock)
+    mock_head = mock_get_session.return_value.head
+    mock_head.side_effect = _head_with_latency({CHANNEL: 0.3, PROXY_A: 0.01, PROXY_B: None}, clock)
+    mirrors = MirrorMap({CHANNEL: [PROXY_A, PROXY_B]})
+
+    with patch("conda_vendor.mirrors.ThreadPoolExecutor") as mock_executor:
+        mock_executor.return_value.__enter__.return_value.map = map
+        candidates = mirrors.candidates(CHANNEL + PKG_PATH)
+
+    assert candidates == [PROXY_A + PKG_PATH, CHANNEL + PKG_PATH, PROXY_B + PKG_PATH]
+    # probed once per channel, mirror URLs resolve to the same group
+    assert mirrors.candidates(PROXY_B + "/noarch/repodata.json")[0] == PROXY_A + "/noarch/repodata.json"
+    assert mock_head.call_count == 3
+
+
+def test_failover_to_next_mirror():
+    mirrors = MirrorMap({CHANNEL: [PROXY_A]})
+    fetched = []
+
+    def _fetch(url):
+        fetched.append(url)
+        if url.startswith(CHANNEL):
+            raise requests.exceptions.ConnectionError(url)
+        return "ok"
+
+    with patch.object(MirrorMap, "_probe"):
+        assert mirrors.failover(CHANNEL + PKG_PATH, _fetch) == "ok"
+        # the failed mirror goes last until its cooldown is over
+        assert mirrors.candidates(CHANNEL + PKG_PATH) == [PROXY_A + PKG_PATH, CHANNEL + PKG_PATH]
+
+    assert fetched == [CHANNEL + PKG_PATH, PROXY_A + PKG_PATH]
+
+
+def test_failover_reraises_when_every_mirror_fails():
+    mirrors = MirrorMap({CHANNEL: [PROXY_A]})
+
+    def _fetch(url):
+        raise ChecksumError("SHA256 Checksum Validation Failed")
+
+    with patch.object(MirrorMap, "_probe"), pytest.raises(ChecksumError):
+        mirrors.failover(CHANNEL + PKG_PATH, _fetch)
+
+
+def test_load_mirror_map(tmp_path):
+    mirrors_file = tmp_path / "mirrors.yaml"
+    mirrors_file.write_text(f"{CHANNEL}/:\n  - {PROXY_A}\n")
+    with patch.object(MirrorMap, "_probe"):
+        assert load_mirror_map(mirrors_file).candidates(PROXY_A + PKG_PATH) == [CHANNEL + PKG_PATH, PROXY_A + PKG_PATH]
+
+    mirrors_file.write_text(f"{CHANNEL}: {PROXY_A}\n")
+    with pytest.raises(ValueError):
+        load_mirror_map(mirrors_file)
@@ -0,0 +1,44 @@
+import json
+from unittest.mock import Mock, patch
+
+from click.testing import CliRunner
+
+from conda_vendor.conda_vendor import vendor
+
+FETCH_ACTIONS = [
+    {"name": "python", "fn": "python-3.9.5-h12debd9_4.tar.bz2", "subdir": "linux-64", "sha256": "0" * 64},
+    {"name": "pip", "fn": "pip-21.1.3-pyhd3eb1b0_0.tar.bz2", "subdir": "noarch", "sha256": "1" * 64},
+]
+
+
+def _runner():
+    # click >= 8.2 always keeps stderr apart and dropped mix_stderr
+    try:
+        return CliRunner(mix_stderr=False)
+    except TypeError:
+        return CliRunner()
+
+
+def _dry_run(tmp_path, *options):
+    env_file = tmp_path / "env.yml"
+    env_file.write_text("name: minimal_env\n")
+    with patch("conda_vendor.conda_vendor.get_lock_spec_for_environment_file", Mock()), \
+            patch("conda_vendor.conda_vendor.solve_environments", Mock(return_value=FETCH_ACTIONS)):
+        return _runner().invoke(
+            vendor, ["--file", str(env_file), "--platform", "linux-64", "--dry-run", "True", "--no-solve-cache", *options])
+
+
+def test_vendor_dry_run_ndjson(tmp_path):
+    result = _dry_run(tmp_path, "--output", "ndjson")
+    assert result.exit_code == 0
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [record.pop("event") for record in records] == ["fetch_action", "fetch_action", "done"]
+    assert records[:2] == FETCH_ACTIONS
+    assert "Dry Run Complete!" in result.stderr
+
+
+def test_vendor_dry_run_quiet(tmp_path):
+    result = _dry_run(tmp_path, "--quiet")
+    assert result.exit_code == 0
+    assert json.loads(result.stdout) == FETCH_ACTIONS
+    assert result.stderr == ""
@@ -0,0 +1,85 @@
+import hashlib
+import os
+from unittest.mock import patch
+
+from conda_vendor.conda_vendor import ByteSize, download_solved_pkgs
+from conda_vendor.package_cache import (
+        add_to_cache,
+        cache_entry_path,
+        cache_stats,
+        fetch_from_cache,
+        prune_cache,
+        )
+
+from .conftest import mock_response
+
+
+def _fill_cache(cache_dir, tmp_path, count, size):
+    shas = []
+    for i in range(count):
+        raw = bytes([i]) * size
+        sha256 = hashlib.sha256(raw).hexdigest()
+        src = tmp_path / f"src-{i}"
+        src.write_bytes(raw)
+        add_to_cache(cache_dir, sha256, src)
+        # oldest first
+        os.utime(cache_entry_path(cache_dir, sha256), (1000 + i, 1000 + i))
+        shas.append(sha256)
+    return shas
+
+
+def test_fetch_from_cache(tmp_path):
+    cache_dir = tmp_path / "cache"
+    shas = _fill_cache(cache_dir, tmp_path, 1, 10)
+    dest = tmp_path / "pkg.tar.bz2"
+    assert fetch_from_cache(cache_dir, shas[0], dest)
+    assert dest.read_bytes() == bytes([0]) * 10
+    assert not fetch_from_cache(cache_dir, "0" * 64, tmp_path / "missing.tar.bz2")
+    assert not (tmp_path / "missing.tar.bz2").exists()
+
+
+def test_fetch_from_cache_evicts_changed_entry(tmp_path):
+    cache_dir = tmp_path / "cache"
+    shas = _fill_cache(cache_dir, tmp_path, 2, 10)
+    # same size, different bytes
+    cache_entry_path(cache_dir, shas[0]).write_bytes(bytes([9]) * 10)
+
+    assert not fetch_from_cache(cache_dir, shas[0], tmp_path / "pkg-0.tar.bz2")
+    assert not cache_entry_path(cache_dir, shas[0]).exists()
+    assert not (tmp_path / "pkg-0.tar.bz2").exists()
+    # a size mismatch is caught before hashing
+    assert not fetch_from_cache(cache_dir, shas[1], tmp_path / "pkg-1.tar.bz2", size=11)
+    assert not cache_entry_path(cache_dir, shas[1]).exists()
+
+
+def test_prune_cache_evicts_least_recently_used(tmp_path):
+    cache_dir = tmp_path / "cache"
+    shas = _fill_cache(cache_dir, tmp_path, 4, 100)
+    # using the oldest entry makes it the most recently used
+    fetch_from_cache(cache_dir, shas[0], tmp_path / "pkg.tar.bz2")
+
+    removed, freed = prune_cache(cache_dir, 250)
+    assert (removed, freed) == (2, 200)
+    remaining = {path.name for path in cache_dir.glob("??/*")}
+    assert remaining == {shas[0], shas[3]}
+    assert cache_stats(cache_dir)["size"] == 200
+
+
+@patch("conda_vendor.conda_vendor.improved_download")
+def test_download_solved_pkgs_uses_cache(mock, tmp_path):
+    raw = b"DUMMY_DATA"
+    fetch_actions = [{"fn": "pkg.tar.bz2", "url": "https://NOT_REAL.com/pkg.tar.bz2",
+                      "sha256": hashlib.sha256(raw).hexdigest(), "subdir": "noarch"}]
+    mock.return_value = mock_response(content=raw)
+    cache_dir = tmp_path / "cache"
+    for run in ["first", "second"]:
+        (tmp_path / run / "noarch").mkdir(parents=True)
+        download_solved_pkgs(fetch_actions, tmp_path / run, "linux-64", cache_dir=cache_dir)
+        assert (tmp_path / run / "noarch" / "pkg.tar.bz2").read_bytes() == raw
+    assert mock.call_count == 1
+
+
+def test_byte_size():
+    assert ByteSize().convert("512", None, None) == 512
+    assert ByteSize().convert("2K", None, None) == 2048
+    assert ByteSize().convert("1.5GiB", None, None) == int(1.5 * 1024 ** 3)
@@ -0,0 +1,53 @@
+import json
+from unittest.mock import patch
+
+import click
+from click.testing import CliRunner
+
+from conda_vendor.conda_vendor import profile_options
+from conda_vendor.profiling import disable_profiling, enable_profiling, span, summarize, write_chrome_trace
+
+
+def test_span_is_a_noop_without_profiling():
+    disable_profiling()
+    with span("download_package", bytes=10) as span_args:
+        span_args["source"] = "downloaded"
+    assert span_args == {"bytes": 10, "source": "downloaded"}
+
+
+def test_span_records_chrome_trace_events(tmp_path):
+    tracer = enable_profiling()
+    try:
+        for size in (1024, 3072):
+            with patch("conda_vendor.profiling.time.perf_counter", side_effect=[0.0, 0.5]):
+                with span("download_package", fn="a.tar.bz2") as span_args:
+                    span_args["bytes"] = size
+    finally:
+        disable_profiling()
+
+    events = tracer.events
+    assert [event["ph"] for event in events] == ["X", "X"]
+    assert events[0]["dur"] == 500000
+    assert events[0]["args"] == {"fn": "a.tar.bz2", "bytes": 1024, "mb_per_s": 0.0}
+
+    trace_file = tmp_path / "trace.json"
+    write_chrome_trace(events, trace_file)
+    assert json.loads(trace_file.read_text())["traceEvents"] == events
+
+    [row] = summarize(events)
+    assert (row["name"], row["count"], row["seconds"], row["bytes"]) == ("download_package", 2, 1.0, 4096)
+
+
+def test_profile_options_write_trace(tmp_path):
+    @click.command()
+    @profile_options
+    def command():
+        with span("solve_environment"):
+            pass
+
+    trace_file = tmp_path / "trace.json"
+    result = CliRunner().invoke(command, ["--trace-file", str(trace_file)])
+    assert result.exit_code == 0
+    assert "solve_environment" in result.output
+    names = [event["name"] for event in json.loads(trace_file.read_text())["traceEvents"]]
+    assert sorted(names) == ["command", "solve_environment"]
@@ -0,0 +1,103 @@
+import bz2
+import io
+import json
+from unittest.mock import patch
+
+from conda_vendor.repodata import fetch_repodata, filter_repodata, open_repodata
+
+from .conftest import mock_response
+
+
+REPODATA_URL = "https://NOT_REAL.com/conda-forge/linux-64/repodata.json"
+REPODATA = {"info": {"subdir": "linux-64"}, "packages": {"file1": {"id": 1}}, "packages.conda": {}}
+
+
+def _fake_channel(served):
+    # serves repodata.json.bz2 with an ETag, answers 304 when it matches
+    def _download(url, stream=False, headers=None, session=None):
+        served.append((url, headers))
+        if url.endswith(".bz2"):
+            if headers.get("If-None-Match") == '"v1"':
+                return mock_response(status=304)
+            response = mock_response(content=bz2.compress(json.dumps(REPODATA).encode()))
+            response.headers = {"ETag": '"v1"'}
+            return response
+        return mock_response(status=404)
+    return _download
+
+
+@patch("conda_vendor.repodata.zstandard", None)
+@patch("conda_vendor.repodata.improved_download")
+def test_fetch_repodata_prefers_compressed_and_revalidates(mock, tmp_path):
+    served = []
+    mock.side_effect = _fake_channel(served)
+
+    data_file = fetch_repodata(REPODATA_URL, tmp_path)
+    assert json.loads(data_file.read_text()) == REPODATA
+    assert served == [(REPODATA_URL + ".bz2", {})]
+
+    # a second run only sends a conditional request and reuses the cached copy
+    assert fetch_repodata(REPODATA_URL, tmp_path) == data_file
+    assert served[1] == (REPODATA_URL + ".bz2", {"If-None-Match": '"v1"'})
+    assert json.loads(data_file.read_text()) == REPODATA
+
+    # within max_age the network isn't touched at all
+    fetch_repodata(REPODATA_URL, tmp_path, max_age=3600)
+    assert len(served) == 2
+
+
+@patch("conda_vendor.repodata.zstandard", None)
+@patch("conda_vendor.repodata.improved_download")
+def test_open_repodata_falls_back_to_plain_json(mock):
+    def _download(url, stream=False, headers=None, session=None):
+        if url == REPODATA_URL:
+            return mock_response(content=json.dumps(REPODATA).encode())
+        return mock_response(status=404)
+    mock.side_effect = _download
+
+    with open_repodata(REPODATA_URL) as f:
+        assert json.load(f) == REPODATA
+    assert [args[0][0] for args in mock.call_args_list] == [REPODATA_URL + ".bz2", REPODATA_URL]
+
+
+def test_filter_repodata_numbers_across_chunks():
+    # numbers cut right after "." or "e" decode to a prefix of themselves
+    document = {"packages": {"a": 0.1, "b": -12.5e-3, "c": 1E+20, "d": 7}, "packages.conda": {"e": 3.25}, "repodata_version": 1}
+    raw = json.dumps(document).encode()
+
+    for chunk_size in range(1, len(raw) + 1):
+        result = filter_repodata(io.BytesIO(raw), {"a", "b", "c", "d", "e"}, chunk_size=chunk_size)
+        assert result == document, chunk_size
+
+
+def test_filter_repodata_keeps_wanted_entries():
+    fake_live_repo_data_json = {
+        "info": {"subdir": "fake_subdir"},
+        "packages": {
+            "file1": {"id": 1, "depends": ["a >=1.0", "b"]},
+            "badfile1": {"id": 2},
+            "file2": {"id": 3, "size": 12345678901234},
+            "badfile2": {"id": 4},
+        },
+        "packages.conda": {
+            "file3": {"id": 5, "license": "BSD éè"},
+            "badfile3": {"id": 6},
+            "file4": {"id": 7},
+        },
+        "removed": ["old"],
+        "repodata_version": 1,
+    }
+    raw = json.dumps(fake_live_repo_data_json, indent=2).encode()
+    wanted = {"file1", "file2", "file3"}
+
+    # a tiny chunk size puts every value across chunk boundaries
+    for chunk_size in [1, 7, 1024]:
+        result = filter_repodata(io.BytesIO(raw), wanted, chunk_size=chunk_size)
+        assert result == {
+            "info": {"subdir": "fake_subdir"},
+            "packages": {"file1": fake_live_repo_data_json["packages"]["file1"],
+                         "file2": fake_live_repo_data_json["packages"]["file2"]},
+            "packages.conda": {"file3": fake_live_repo_data_json["packages.conda"]["file3"]},
+            "removed": ["old"],
+            "repodata_version": 1,
+        }
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import Counter
+from unittest.mock import patch
+
+import pytest
+
+from conda_vendor.scheduler import ThroughputMeter, TokenBucket, host_of, run_scheduled
+
+
+def test_host_of():
+    assert host_of("https://conda.anaconda.org/conda-forge/linux-64/a.conda") == "conda.anaconda.org"
+    assert host_of("file:///srv/channel/noarch/a.conda") == ""
+
+
+def test_run_scheduled_largest_first():
+    items = [{"fn": "small", "size": 1}, {"fn": "large", "size": 300}, {"fn": "unknown", "size": None}, {"fn": "medium", "size": 20}]
+    started = []
+
+    run_scheduled(items, lambda item: started.append(item["fn"]), jobs=1, size=lambda item: item["size"])
+
+    assert started == ["large", "medium", "small", "unknown"]
+
+
+def test_run_scheduled_respects_host_limits():
+    items = [{"host": "slow.example.com", "n": n} for n in range(6)] + [{"host": "fast.example.com", "n": n} for n in range(6)]
+    lock = threading.Lock()
+    running = Counter()
+    peak = Counter()
+
+    def _work(item):
+        with lock:
+            running[item["host"]] += 1
+            peak[item["host"]] = max(peak[item["host"]], running[item["host"]])
+        time.sleep(0.01)
+        with lock:
+            running[item["host"]] -= 1
+        return item["n"]
+
+    done = []
+    run_scheduled(items, _work, jobs=4, host=lambda item: item["host"], host_limits={"slow.example.com": 1},
+                  on_done=lambda item, result: done.append((item["host"], result)))
+
+    assert peak["slow.example.com"] == 1
+    assert peak["fast.example.com"] > 1
+    assert sorted(done) == sorted((item["host"], item["n"]) for item in items)
+
+
+def test_run_scheduled_reraises_and_stops():
+    started = []
+
+    def _work(item):
+        started.append(item)
+        if item == 0:
+            raise ValueError("sha256 mismatch")
+
+    with pytest.raises(ValueError):
+        run_scheduled(list(range(10)), _work, jobs=1)
+
+    assert started == [0]
+
+
+@patch("conda_vendor.scheduler.time.sleep")
+@patch("conda_vendor.scheduler.time.monotonic")
+def test_token_bucket_throttles(mock_monotonic, mock_sleep):
+    mock_monotonic.return_value = 100.0
+    bucket = TokenBucket(rate=1000)
+
+    # the first second worth of bytes is a burst
+    bucket.consume(1000)
+    mock_sleep.assert_not_called()
+
+    # 500 bytes in debt at 1000 bytes/second
+    bucket.consume(500)
+    mock_sleep.assert_called_once_with(0.5)
+
+
+@patch("conda_vendor.scheduler.time.monotonic")
+def test_throughput_meter(mock_monotonic):
+    mock_monotonic.return_value = 10.0
+    meter = ThroughputMeter()
+
+    meter.add(2048)
+    meter.add(2048)
+    mock_monotonic.return_value = 12.0
+
+    assert meter.total == 4096
+    assert meter.rate() == 2048
+    assert meter.average() == 2048
@@ -0,0 +1,58 @@
+import time
+from unittest.mock import Mock, patch
+
+from conda_vendor.conda_vendor import solve_fetch_actions
+from conda_vendor.solve_cache import load_solve, repodata_freshness, solve_cache_key, store_solve
+
+
+FETCH_ACTIONS = [{"name": "python", "fn": "python-3.9.5-h12debd9_4.tar.bz2", "sha256": "0" * 64}]
+
+
+@patch("conda_vendor.solve_cache.repodata_freshness", Mock(return_value={}))
+def test_solve_cache_key_normalises_specs():
+    key = solve_cache_key(["python==3.9.5", "pip"], ["conda-forge"], "linux-64", "conda")
+    assert key == solve_cache_key(["pip", "python==3.9.5"], ["conda-forge"], "linux-64", "conda")
+    assert key != solve_cache_key(["pip", "python==3.9.5"], ["conda-forge"], "linux-64", "mamba")
+    assert key != solve_cache_key(["pip", "python==3.9.5"], ["conda-forge"], "osx-arm64", "conda")
+
+
+def test_solve_cache_key_follows_repodata_freshness():
+    with patch("conda_vendor.solve_cache.repodata_freshness", Mock(return_value={"url": '"v1"'})):
+        old_key = solve_cache_key(["python"], ["conda-forge"], "linux-64", "conda")
+    with patch("conda_vendor.solve_cache.repodata_freshness", Mock(return_value={"url": '"v2"'})):
+        assert solve_cache_key(["python"], ["conda-forge"], "linux-64", "conda") != old_key
+
+
+@patch("conda_vendor.solve_cache._repodata_validator", Mock(return_value='"v1"'))
+def test_repodata_freshness_urls():
+    freshness = repodata_freshness(["conda-forge", "https://my.mirror/internal/"], "linux-64")
+    assert sorted(freshness) == [
+        "https://conda.anaconda.org/conda-forge/linux-64/repodata.json",
+        "https://conda.anaconda.org/conda-forge/noarch/repodata.json",
+        "https://my.mirror/internal/linux-64/repodata.json",
+        "https://my.mirror/internal/noarch/repodata.json",
+    ]
+
+
+def test_load_solve_ttl(tmp_path):
+    store_solve(tmp_path, "key", FETCH_ACTIONS)
+    assert load_solve(tmp_path, "key", ttl=60) == FETCH_ACTIONS
+    assert load_solve(tmp_path, "missing", ttl=60) is None
+    with patch("time.time", Mock(return_value=time.time() + 120)):
+        assert load_solve(tmp_path, "key", ttl=60) is None
+
+
+@patch("conda_vendor.solve_cache.repodata_freshness", Mock(return_value={}))
+@patch("conda_vendor.conda_vendor.get_fetch_actions")
+@patch("conda_vendor.conda_vendor.solve_environment")
+def test_solve_fetch_actions_skips_solver_on_cache_hit(mock_solve, mock_fetch_actions, tmp_path):
+    mock_fetch_actions.return_value = FETCH_ACTIONS
+    lock_spec = Mock(channels=["conda-forge"], dependencies=[Mock(version="3.9.5")])
+    lock_spec.dependencies[0].name = "python"
+
+    for _ in range(3):
+        assert solve_fetch_actions(lock_spec, "conda", "linux-64", solve_cache_dir=tmp_path) == FETCH_ACTIONS
+    assert mock_solve.call_count == 1
+
+    solve_fetch_actions(lock_spec, "conda", "linux-64", solve_cache_dir=None)
+    assert mock_solve.call_count == 2
@@ -0,0 +1,48 @@
+import hashlib
+import json
+
+from click.testing import CliRunner
+
+from conda_vendor.conda_vendor import verify
+from conda_vendor.verify import VERIFY_CORRUPT, VERIFY_EXTRA, VERIFY_MISSING, verify_channel
+
+
+def _vendored_channel(tmp_path):
+    packages = {"ok-1.tar.bz2": b"OK", "corrupt-1.tar.bz2": b"CORRUPT", "missing-1.tar.bz2": b"MISSING", "empty-1.conda": b""}
+    for subdir in ("linux-64", "noarch"):
+        (tmp_path / subdir).mkdir()
+        repodata = {"info": {"subdir": subdir}, "packages": {}, "packages.conda": {}}
+        for fn, raw in packages.items():
+            key = "packages.conda" if fn.endswith(".conda") else "packages"
+            repodata[key][fn] = {"sha256": hashlib.sha256(raw).hexdigest()}
+            if fn != "missing-1.tar.bz2":
+                (tmp_path / subdir / fn).write_bytes(b"TAMPERED" if fn == "corrupt-1.tar.bz2" else raw)
+        (tmp_path / subdir / "repodata.json").write_text(json.dumps(repodata))
+    (tmp_path / "noarch" / "extra-1.tar.bz2").write_bytes(b"EXTRA")
+    # leftovers of an interrupted run are not extra packages
+    (tmp_path / "noarch" / "pkg-1.tar.bz2.part").write_bytes(b"PART")
+    (tmp_path / "noarch" / "pkg-1.tar.bz2.part.validator").write_bytes(b"ETAG")
+    return tmp_path
+
+
+def test_verify_channel(tmp_path):
+    results = verify_channel(_vendored_channel(tmp_path), jobs=2)
+    assert sorted(results["ok"]) == [("linux-64", "empty-1.conda"), ("linux-64", "ok-1.tar.bz2"),
+                                     ("noarch", "empty-1.conda"), ("noarch", "ok-1.tar.bz2")]
+    assert sorted(results["corrupt"]) == [("linux-64", "corrupt-1.tar.bz2"), ("noarch", "corrupt-1.tar.bz2")]
+    assert sorted(results["missing"]) == [("linux-64", "missing-1.tar.bz2"), ("noarch", "missing-1.tar.bz2")]
+    assert results["extra"] == [("noarch", "extra-1.tar.bz2")]
+
+
+def test_verify_exit_code(tmp_path):
+    channel = _vendored_channel(tmp_path)
+    result = CliRunner().invoke(verify, ["--channel-dir", str(channel)])
+    assert result.exit_code == VERIFY_MISSING | VERIFY_EXTRA | VERIFY_CORRUPT
+
+    for subdir in ("linux-64", "noarch"):
+        (channel / subdir / "corrupt-1.tar.bz2").write_bytes(b"CORRUPT")
+        (channel / subdir / "missing-1.tar.bz2").write_bytes(b"MISSING")
+    (channel / "noarch" / "extra-1.tar.bz2").unlink()
+    result = CliRunner().invoke(verify, ["--channel-dir", str(channel), "--quiet"])
+    assert result.exit_code == 0
+    assert result.output == ""